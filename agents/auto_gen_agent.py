@@ -5,12 +5,21 @@ import re
 from agents.base_agent import BaseAgent
 from aiogram.types import Message
 
+# Папка, из которой бот загружает созданных агентов (см. CUSTOM_AGENTS_FOLDER в main.py)
+CUSTOM_FOLDER = os.getenv(
+    "CUSTOM_AGENTS_FOLDER", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "custom")
+)
+
 class AutoGenAgent(BaseAgent):
     """
     Агент, умеющий генерировать файлы (например, новые агенты)
     и сохранять их в папку 'custom/'.
     """
 
+    # Создаёт файлы — план нельзя брать из кэша
+    cacheable = False
+    stateful = True
+
     def get_name(self) -> str:
         return "autogen"
 
@@ -43,6 +52,9 @@ class AutoGenAgent(BaseAgent):
 from aiogram.types import Message
 
 class {class_name}(BaseAgent):
+    # Сгенерированный код выполняется в отдельном процессе с таймаутом и лимитами
+    execution = "process"
+
     def get_name(self) -> str:
         return "{filename[:-3]}"
 
@@ -91,7 +103,7 @@ class {class_name}(BaseAgent):
         # Например, уберём ../ и т.п.
         sanitized_filename = os.path.basename(filename_part)
         # Собираем полный путь
-        file_path = os.path.join("custom", sanitized_filename)
+        file_path = os.path.join(CUSTOM_FOLDER, sanitized_filename)
 
         formatted_code = self._format_agent_code(sanitized_filename, content_part)
         is_valid, error_msg = self._validate_agent_code(formatted_code)
@@ -100,13 +112,14 @@ class {class_name}(BaseAgent):
             return f"Ошибка валидации кода: {error_msg}"
 
         # Создаём папку custom, если её нет
-        os.makedirs("custom", exist_ok=True)
+        os.makedirs(CUSTOM_FOLDER, exist_ok=True)
 
         try:
             # Записываем файл
             with open(file_path, "w", encoding="utf-8") as f:
                 f.write(formatted_code)
 
+            # Агент подхватывается без перезапуска бота (AGENT_HOT_RELOAD)
             return f"Файл '{sanitized_filename}' успешно сохранён в папке 'custom/'."
         except Exception as e:
             return f"Ошибка при сохранении файла: {e}"
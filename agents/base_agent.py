@@ -2,13 +2,37 @@
 
 from abc import ABC, abstractmethod
 from aiogram.types import Message
-from typing import Dict, Any
+from typing import Dict, Any, Hashable, Optional
 
 class BaseAgent(ABC):
     """
     Абстрактный базовый класс для всех агентов.
     """
 
+    # Максимум одновременных вызовов агента (None — значение AGENT_MAX_CONCURRENCY)
+    max_concurrency: Optional[int] = None
+
+    # Можно ли отдавать из кэша ответ LLM с планом, где вызывается этот агент
+    # (False для агентов, зависящих от времени, текста запроса или меняющих состояние)
+    cacheable: bool = True
+
+    # Меняет ли агент состояние (память, напоминания, файлы). Повторный вызов с теми же
+    # аргументами в рамках одного запроса не выполняется, а вызов с другими аргументами
+    # сбрасывает запомненные результаты остальных вызовов агента
+    stateful: bool = False
+
+    # Где выполняется handle: "inline" — в цикле событий бота, "thread" — в отдельном потоке
+    # (блокирующий код), "process" — в пуле процессов (тяжёлые вычисления, непроверенный код).
+    # В процессе агенту недоступны инструменты бота, а message — копия без привязки к боту
+    execution: str = "inline"
+    # Таймаут вызова для "thread" и "process", в секундах (None — AGENT_PROCESS_TIMEOUT)
+    timeout: Optional[float] = None
+
+    # Время жизни результата в кэше AgentManager, в секундах (0 — результат не кэшируется)
+    cache_ttl: float = 0
+    # Учитывать ли пользователя в ключе кэша результата
+    cache_per_user: bool = False
+
     def __init__(self, tools: Dict[str, Any]):
         """
         Инициализация агента с доступом к инструментам.
@@ -34,4 +58,22 @@ class BaseAgent(ABC):
         """
         Обрабатывает запрос и возвращает ответ.
         """
-        pass
\ No newline at end of file
+        pass
+
+    def cache_key(self, args: str, message: Message) -> Optional[Hashable]:
+        """
+        Возвращает ключ кэша результата для аргументов (None — не кэшировать вызов).
+        По умолчанию — аргументы без учёта регистра и лишних пробелов,
+        плюс id пользователя, если cache_per_user.
+        """
+        key = " ".join(args.lower().split())
+        if self.cache_per_user:
+            user = getattr(message, "from_user", None)
+            return (user.id if user else None, key)
+        return key
+
+    def should_cache_result(self, result: str) -> bool:
+        """
+        Проверяет, можно ли сохранить результат в кэш (ошибки не кэшируются).
+        """
+        return isinstance(result, str) and not result.startswith("❌")
@@ -7,6 +7,9 @@ class DateTimeAgent(BaseAgent):
     Агент для решения задач, связанных с датой и временем.
     """
 
+    # Ответ зависит от текущего времени — план нельзя брать из кэша
+    cacheable = False
+
     def get_name(self) -> str:
         """
         Возвращает уникальное имя агента.
@@ -3,13 +3,21 @@
 from agents.base_agent import BaseAgent
 from aiogram.types import Message
 import logging
+import re
+
+# Записей на странице результатов поиска
+SEARCH_PAGE_SIZE = 5
 
 class MemoryAgent(BaseAgent):
     """
     Агент для управления памятью бота.
-    Команды передаются в формате: 'command [text]', где command - это save/get/clear
+    Команды передаются в формате: 'command [text]', где command - это save/get/search/clear
     """
 
+    # Работает с личными данными и меняет их — план нельзя брать из кэша
+    cacheable = False
+    stateful = True
+
     def get_name(self) -> str:
         return "memory"
 
@@ -17,6 +25,7 @@ class MemoryAgent(BaseAgent):
         return (
             "Управление памятью бота. Вызов через аргументы:\n"
             "• get - получить сохраненные данные\n"
+            "• search <запрос> [--page N] - найти сохраненное по словам (самое подходящее первым)\n"
             "• save <текст> - сохранить новый текст\n"
             "• clear - очистить всю память"
         )
@@ -25,7 +34,7 @@ class MemoryAgent(BaseAgent):
         user_id = message.from_user.id
         
         if not args:
-            return "Пожалуйста, укажите команду (save/get/clear). Например: memory save <текст>"
+            return "Пожалуйста, укажите команду (save/get/search/clear). Например: memory save <текст>"
         
         # Parse command and arguments
         parts = args.strip().split(maxsplit=1)
@@ -39,18 +48,21 @@ class MemoryAgent(BaseAgent):
             if command == "save":
                 if not context:
                     return "Пожалуйста, укажите текст для сохранения. Например: memory save <текст>"
-                if self.tools['database'].save_memory(user_id, context):
+                if await self.tools['database'].save_memory(user_id, context):
                     return "✅ Контекст успешно сохранен"
                 return "❌ Ошибка при сохранении контекста"
                 
             elif command == "get":
-                memories = self.tools['database'].get_memory(user_id)
+                memories = await self.tools['database'].get_memory(user_id)
                 if memories:
                     return "📋 Последние воспоминания:\n" + "\n---\n".join(memories)
                 return "📭 Память пуста"
                 
+            elif command == "search":
+                return await self._search(user_id, context)
+
             elif command == "clear":
-                if self.tools['database'].clear_memory(user_id):
+                if await self.tools['database'].clear_memory(user_id):
                     return "🗑 Память очищена"
                 return "❌ Произошла ошибка при очистке памяти"
             
@@ -58,9 +70,32 @@ class MemoryAgent(BaseAgent):
                 "❓ Неизвестная команда. Используйте:\n"
                 "• memory save <текст> - сохранить текст\n"
                 "• memory get - показать сохраненное\n"
+                "• memory search <запрос> - найти сохраненное\n"
                 "• memory clear - очистить память"
             )
             
         except Exception as e:
             logging.error(f"Ошибка в memory агенте: {str(e)}")
             return f"❌ Произошла ошибка: {str(e)}"
+
+    async def _search(self, user_id: int, context: str) -> str:
+        page = 1
+        match = re.search(r"\s*--page\s+(\d+)\s*$", context)
+        if match:
+            page = max(1, int(match.group(1)))
+            context = context[:match.start()]
+        query = context.strip()
+        if not query:
+            return "Пожалуйста, укажите, что искать. Например: memory search <запрос>"
+
+        # Запрашиваем на одну запись больше, чтобы узнать, есть ли следующая страница
+        hits = await self.tools['database'].search_memory(
+            user_id, query, limit=SEARCH_PAGE_SIZE + 1, offset=(page - 1) * SEARCH_PAGE_SIZE
+        )
+        if not hits:
+            return "📭 Ничего не найдено" if page == 1 else "📭 Больше результатов нет"
+        lines = [f"[{timestamp}] {text}" for text, timestamp in hits[:SEARCH_PAGE_SIZE]]
+        result = f"🔎 Найдено по запросу «{query}» (стр. {page}):\n" + "\n---\n".join(lines)
+        if len(hits) > SEARCH_PAGE_SIZE:
+            result += f"\n\nСледующая страница: memory search {query} --page {page + 1}"
+        return result
@@ -10,6 +10,11 @@ class TranslateAgent(BaseAgent):
     Агент для обработки команды /translate и перевода текста.
     """
 
+    # Аргументы — дословный текст запроса: похожее сообщение требует другого перевода
+    cacheable = False
+    # Перевод одинакового текста не меняется
+    cache_ttl = 24 * 3600
+
     def __init__(self, tools: Dict[str, Any]):
         super().__init__(tools)
         self.api_key = os.getenv("TRANSLATE_API_KEY")
@@ -22,6 +27,15 @@ class TranslateAgent(BaseAgent):
     def get_description(self) -> str:
         return "Переводит заданный текст на указанный язык. Пример использования: /translate en Привет мир"
 
+    def cache_key(self, args: str, message: Message):
+        # Регистр текста влияет на перевод, поэтому нормализуем только пробелы
+        return " ".join(args.split())
+
+    def should_cache_result(self, result: str) -> bool:
+        return not result.startswith((
+            "Пожалуйста, укажите", "Произошла ошибка", "Не удалось перевести", "Внутренняя ошибка"
+        ))
+
     async def handle(self, args: str, message: Message) -> str:
         if not args:
             return "Пожалуйста, укажите язык и текст для перевода. Пример: /translate en Привет мир"
@@ -54,7 +68,8 @@ class TranslateAgent(BaseAgent):
         }
 
         try:
-            response = await http_client.post(url, data=data)
+            # Перевод идемпотентен — одинаковые одновременные запросы объединяются
+            response = await http_client.post(url, data=data, coalesce=True)
             translated_text = response['translations'][0]['text']
             return translated_text
         except Exception as e:
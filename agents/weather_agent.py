@@ -11,6 +11,9 @@ class WeatherAgent(BaseAgent):
     Агент для обработки команды /weather и предоставления информации о погоде.
     """
 
+    # Погода меняется медленно: повторные запросы по городу обслуживаются из кэша
+    cache_ttl = 300
+
     def __init__(self, tools: Dict[str, Any]):
         super().__init__(tools)
         self.api_key = os.getenv("WEATHER_API_KEY")
@@ -24,6 +27,10 @@ class WeatherAgent(BaseAgent):
     def get_description(self) -> str:
         return "Предоставляет информацию о текущей погоде в указанном городе. Пример использования: /weather Москва"
 
+    def should_cache_result(self, result: str) -> bool:
+        # Кэшируем только успешно полученную погоду, но не тексты ошибок
+        return result.startswith("Погода в ")
+
     async def handle(self, args: str, message: Message) -> str:
         if not args:
             return "Пожалуйста, укажите город. Пример: /weather Москва"
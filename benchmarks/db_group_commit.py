@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк групповой фиксации: сколько сохранений памяти в секунду выдерживает
+AsyncDatabase без пакетов (DATABASE_BATCH_SIZE=1 — commit на каждую запись)
+и с пакетами, в режимах надёжности commit и fsync.
+
+    python benchmarks/db_group_commit.py --users 200 --ops 10
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.database import AsyncDatabase  # noqa: E402
+
+
+async def measure(durability: str, batch_size: int, users: int, ops: int):
+    os.environ["DATABASE_DURABILITY"] = durability
+    with tempfile.TemporaryDirectory() as tmp:
+        db = AsyncDatabase(os.path.join(tmp, "bench.db"))
+        db.batch_size = batch_size
+        await db.connect()
+
+        async def user(user_id):
+            for i in range(ops):
+                await db.save_memory(user_id, f"заметка {i}")
+
+        started = time.perf_counter()
+        await asyncio.gather(*(user(u) for u in range(users)))
+        elapsed = time.perf_counter() - started
+        await db.close()
+
+    batches = db.stats["batches"]
+    print(
+        f"{durability:<8} {batch_size:>6} {users * ops / elapsed:>12.0f} {batches:>8} "
+        f"{users * ops / max(batches, 1):>10.1f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=10)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'режим':<8} {'пакет':>6} {'записей/с':>12} {'пакетов':>8} {'в пакете':>10}")
+    for durability in ("commit", "fsync"):
+        for batch_size in (1, 100):
+            await measure(durability, batch_size, args.users, args.ops)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк: насколько запросы к базе блокируют цикл событий.
+
+Параллельно с нагрузкой (пользователи сохраняют и читают память) работает
+«пульс» — корутина, которая каждую миллисекунду засыпает и меряет опоздание
+пробуждения. Сравниваются синхронный Database с прежними настройками
+(без WAL, synchronous=FULL), вызываемый прямо из корутин, как раньше делали
+агенты, и AsyncDatabase. Чем меньше «пульсов» успело сработать, тем дольше
+цикл событий был занят.
+
+    python benchmarks/db_loop_blocking.py --users 50 --ops 40
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.database import AsyncDatabase, Database  # noqa: E402
+
+
+async def heartbeat(lags, stop: asyncio.Event, interval: float = 0.001):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def run_sync(path: str, users: int, ops: int):
+    db = Database(path)
+    db.connect()
+    # Настройки подключения до перехода на AsyncDatabase
+    db.cursor.execute("PRAGMA journal_mode=DELETE")
+    db.cursor.execute("PRAGMA synchronous=FULL")
+
+    async def user(user_id):
+        for i in range(ops):
+            db.save_memory(user_id, f"заметка {i}")
+            db.get_memory(user_id)
+            await asyncio.sleep(0)
+
+    try:
+        await asyncio.gather(*(user(u) for u in range(users)))
+    finally:
+        db.close()
+
+
+async def run_async(path: str, users: int, ops: int):
+    db = AsyncDatabase(path)
+    await db.connect()
+
+    async def user(user_id):
+        for i in range(ops):
+            await db.save_memory(user_id, f"заметка {i}")
+            await db.get_memory(user_id)
+
+    try:
+        await asyncio.gather(*(user(u) for u in range(users)))
+    finally:
+        await db.close()
+
+
+async def measure(name: str, workload, users: int, ops: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        lags = []
+        stop = asyncio.Event()
+        pulse = asyncio.ensure_future(heartbeat(lags, stop))
+        started = time.perf_counter()
+        await workload(os.path.join(tmp, "bench.db"), users, ops)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await pulse
+
+    lags_ms = sorted(lag * 1000 for lag in lags) or [0.0]
+    p99 = lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))]
+    print(
+        f"{name:<14} {users * ops * 2 / elapsed:>10.0f} {len(lags) / elapsed:>10.0f} "
+        f"{statistics.mean(lags_ms):>10.2f} {p99:>10.2f} {lags_ms[-1]:>10.2f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--ops", type=int, default=40, help="пар запись+чтение на пользователя")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    print(f"{'режим':<14} {'запросов/с':>10} {'пульсов/с':>10} {'лаг ср,мс':>10} {'лаг p99':>10} {'лаг макс':>10}")
+    await measure("sync (до)", run_sync, args.users, args.ops)
+    await measure("async (после)", run_async, args.users, args.ops)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
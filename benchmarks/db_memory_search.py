@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Микробенчмарк памяти на большой таблице: задержка get_memory (последние записи)
+без индекса (user_id, timestamp) и с ним, и задержка search_memory —
+полный просмотр с LIKE против FTS5 с ранжированием BM25.
+
+    python benchmarks/db_memory_search.py --rows 1000000 --users 1000
+"""
+
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.database import Database  # noqa: E402
+
+# Словарь с частотами по закону Ципфа, как в обычном тексте: несколько очень частых слов и длинный хвост
+VOCABULARY = [f"слово{i}" for i in range(5000)]
+WEIGHTS = [1 / (rank + 1) for rank in range(len(VOCABULARY))]
+
+
+def populate(db: Database, rows: int, users: int):
+    rng = random.Random(1)
+    chunk = 50_000
+    with db.connection:
+        for start in range(0, rows, chunk):
+            db.cursor.executemany(
+                "INSERT INTO memory (user_id, context, timestamp) VALUES (?, ?, datetime('now', ?))",
+                [
+                    (rng.randrange(users), " ".join(rng.choices(VOCABULARY, WEIGHTS, k=8)), f"-{rows - i} seconds")
+                    for i in range(start, min(start + chunk, rows))
+                ],
+            )
+
+
+def measure(label: str, func, queries: int):
+    timings = []
+    for i in range(queries):
+        started = time.perf_counter()
+        func(i)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"{label:<34} {statistics.median(timings):>10.3f} {p99:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "bench.db"))
+        started = time.perf_counter()
+        populate(db, args.rows, args.users)
+        print(f"{args.rows} записей (с индексами) вставлено за {time.perf_counter() - started:.1f} с\n")
+
+        rng = random.Random(2)
+        user_ids = [rng.randrange(args.users) for _ in range(args.queries)]
+        # Запросы из двух слов: одно из первых 200 по частоте и одно любое
+        queries = [f"{VOCABULARY[rng.randrange(200)]} {rng.choice(VOCABULARY)}" for _ in range(args.queries)]
+
+        print(f"{'запрос':<34} {'p50, мс':>10} {'p99, мс':>10}")
+        measure("get_memory, индекс", lambda i: db.get_memory(user_ids[i]), args.queries)
+        measure("search_memory, FTS5 + BM25", lambda i: db.search_memory(user_ids[i], queries[i]), args.queries)
+        measure("search_memory, самое частое слово", lambda i: db.search_memory(user_ids[i], VOCABULARY[0]), args.queries)
+
+        # Прежнее поведение: без индекса и с поиском подстроки просмотром всей таблицы
+        db.cursor.execute("DROP INDEX idx_memory_user_time")
+        measure("get_memory, без индекса", lambda i: db.get_memory(user_ids[i]), args.queries)
+        db.fts_enabled = False
+        measure("search_memory, LIKE", lambda i: db.search_memory(user_ids[i], queries[i].split()[0]), args.queries)
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
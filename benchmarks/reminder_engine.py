@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк движка напоминаний: время восстановления после запуска, пиковая память
+(tracemalloc) и размер окна в памяти, нагрузка на CPU в простое и скорость отправки
+пачки просроченных напоминаний — при разном общем числе напоминаний в базе.
+Для сравнения — прежняя схема: задача APScheduler (cron) на каждое напоминание.
+
+    python benchmarks/reminder_engine.py --sizes 10000 1000000 --due 5000
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from tools.database import AsyncDatabase, Database  # noqa: E402
+from tools.reminders import ReminderEngine  # noqa: E402
+
+TIMEZONES = ["UTC", "Europe/Moscow", "Europe/Berlin", "America/New_York", "Asia/Tokyo"]
+
+
+class NullBot:
+    async def send_message(self, chat_id, text):
+        pass
+
+
+def populate(path: str, total: int, due: int):
+    """
+    total напоминаний, срабатывания равномерно по ближайшим суткам; due из них уже просрочены на минуту.
+    """
+    rng = random.Random(1)
+    now = int(time.time())
+    db = Database(path)
+    chunk = 50_000
+    with db.connection:
+        for start in range(0, total, chunk):
+            rows = []
+            for i in range(start, min(start + chunk, total)):
+                fire_at = now - 60 if i < due else now + rng.randrange(60, 86400)
+                minute = rng.randrange(1440)
+                rows.append((i, f"{minute // 60:02d}:{minute % 60:02d}", rng.choice(TIMEZONES), f"напоминание {i}", fire_at))
+            db.cursor.executemany(
+                "INSERT INTO reminders (user_id, time, timezone, description, next_fire_at) VALUES (?, ?, ?, ?, ?)", rows
+            )
+    db.close()
+
+
+async def wait_for(condition, timeout: float = 600):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError
+        await asyncio.sleep(0.001)
+
+
+async def run_engine(total: int, due: int, idle_seconds: float):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bot.db")
+        populate(path, total, due)
+        database = AsyncDatabase(path)
+        await database.connect()
+
+        engine = ReminderEngine()
+        engine.attach(database, NullBot())
+        tracemalloc.start()
+        started = time.perf_counter()
+        await engine.start()
+        await wait_for(lambda: engine.stats["refills"] >= 1)
+        restored = time.perf_counter() - started
+        await wait_for(lambda: engine.stats["fired"] + engine.stats["missed"] >= due)
+        fired = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        loaded = engine.loaded
+
+        cpu = time.process_time()
+        await asyncio.sleep(idle_seconds)
+        idle_cpu = (time.process_time() - cpu) / idle_seconds * 100
+
+        await engine.stop()
+        await database.close()
+
+    print(
+        f"движок      {total:>9} {restored * 1000:>10.1f} {peak / 2**20:>9.1f} {loaded:>8} "
+        f"{idle_cpu:>7.2f}% {due / fired:>10.0f}"
+    )
+
+
+async def run_apscheduler(total: int):
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+
+    async def send():
+        pass
+
+    scheduler = AsyncIOScheduler()
+    scheduler.start()
+    rng = random.Random(1)
+    tracemalloc.start()
+    started = time.perf_counter()
+    for i in range(total):
+        minute = rng.randrange(1440)
+        scheduler.add_job(send, "cron", hour=minute // 60, minute=minute % 60,
+                          timezone=rng.choice(TIMEZONES), id=f"reminder_{i}")
+    restored = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    cpu = time.process_time()
+    await asyncio.sleep(3)
+    idle_cpu = (time.process_time() - cpu) / 3 * 100
+    scheduler.shutdown(wait=False)
+    print(f"apscheduler {total:>9} {restored * 1000:>10.1f} {peak / 2**20:>9.1f} {total:>8} {idle_cpu:>7.2f}% {'—':>10}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000])
+    parser.add_argument("--due", type=int, default=5000)
+    parser.add_argument("--idle", type=float, default=3.0)
+    parser.add_argument("--baseline-limit", type=int, default=100_000,
+                        help="APScheduler меряется только до этого числа задач")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    # Пропущенные запуски задач APScheduler, пока добавляются остальные, — не ошибка замера
+    logging.getLogger("apscheduler").setLevel(logging.ERROR)
+
+    print(f"{'схема':<11} {'всего':>9} {'старт, мс':>10} {'пик, МБ':>9} {'в памяти':>8} {'CPU':>8} {'отправок/с':>10}")
+    for total in args.sizes:
+        await run_engine(total, min(args.due, total), args.idle)
+    for total in args.sizes:
+        if total <= args.baseline_limit:
+            await run_apscheduler(total)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
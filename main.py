@@ -8,12 +8,26 @@ import sys
 import os
 import importlib
 import json
-from typing import List, Dict, Any
-from openai import AsyncOpenAI
+import re
+import signal
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+# Отсчёт времени холодного старта (включая импорт зависимостей ниже)
+STARTED_AT = time.perf_counter()
 
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message
 from aiogram.client.bot import DefaultBotProperties
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from tools._agent_manifest import AgentManifest, LazyAgent, declares_process_execution, describe_source, load_module_from_file
+from tools._agent_pool import PROCESS, AgentExecutor, describe_in_worker
+from tools._hot_reload import FileWatcher
+from tools._lifecycle import ToolLifecycle
+from tools._lru import TTLCache
+from tools._singleflight import SingleFlight
 
 # Добавляем загрузку переменных окружения из .env
 from dotenv import load_dotenv
@@ -21,12 +35,32 @@ from dotenv import load_dotenv
 # Загружаем переменные окружения из файла .env, если он существует
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
+IMPORTS_DONE_AT = time.perf_counter()
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Папки с плагинами и инструментами
 AGENTS_FOLDER = os.path.join(os.path.dirname(__file__), 'agents')
 TOOLS_FOLDER = os.path.join(os.path.dirname(__file__), 'tools')
+# Агенты, созданные AutoGenAgent
+CUSTOM_AGENTS_FOLDER = os.getenv("CUSTOM_AGENTS_FOLDER", os.path.join(os.path.dirname(__file__), 'custom'))
+# Файлы в папках агентов, которые не являются агентами
+AGENT_SKIP_MODULES = ("__init__", "base_agent")
+
+# Кэш имён и описаний агентов, чтобы не импортировать их модули при старте
+AGENT_MANIFEST_PATH = os.getenv(
+    "AGENT_MANIFEST_PATH", os.path.join(os.path.dirname(__file__), '.agent_manifest.json')
+)
+
+# Начало ответа LLM в формате JSON (возможно, в ```-обёртке)
+JSON_START = re.compile(r"\s*[{`]")
+
+# Хуки запуска и остановки загруженных инструментов (startup_<имя>/shutdown_<имя>)
+tool_lifecycle = ToolLifecycle()
+
+# Время этапов запуска (мс) для отчёта о холодном старте
+startup_report: Dict[str, Any] = {}
 
 # --------------------- Менеджер Агентов ---------------------
 class AgentManager:
@@ -39,6 +73,18 @@ class AgentManager:
         self.command_map: Dict[str, Any] = {}
         self.tools = tools  # Инструменты доступны для агентов
 
+        # Ограничение одновременных вызовов каждого агента (если агент не задал своё)
+        self.default_max_concurrency = int(os.getenv("AGENT_MAX_CONCURRENCY", "4"))
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+        # Кэш результатов агентов, объявивших cache_ttl
+        self.result_cache = TTLCache(int(os.getenv("AGENT_CACHE_SIZE", "1000")), ttl=60)
+        self.cache_stats = {"hits": 0, "misses": 0}
+        # Одновременные одинаковые вызовы кэшируемых агентов выполняются один раз
+        self.single_flight = SingleFlight()
+        # Агенты с execution="thread"/"process" выполняются вне цикла событий
+        self.executor = AgentExecutor()
+
     def register_agent(self, agent_instance):
         """
         Регистрирует агента, добавляя все его команды в command_map.
@@ -47,6 +93,25 @@ class AgentManager:
         command = agent_instance.get_name().lower()
         self.command_map[command] = agent_instance
 
+    def replace_source(self, source: str, agents: List[Any]):
+        """
+        Заменяет агентов из файла source новыми (пустой список — удаляет их).
+        command_map подменяется целиком, поэтому уже начатые вызовы
+        дорабатывают на старых экземплярах, а новые получают новые.
+        """
+        registered = [agent for agent in self.agents if getattr(agent, "source", None) != source]
+        positions = [i for i, agent in enumerate(self.agents) if getattr(agent, "source", None) == source]
+        # Новая версия встаёт на место старой, чтобы не менялся порядок агентов в промпте
+        position = positions[0] if positions else len(registered)
+        registered[position:position] = agents
+
+        command_map = {}
+        for agent in registered:
+            command_map[agent.get_name().lower()] = agent
+        self.agents, self.command_map = registered, command_map
+        # Результаты старой версии агента могли устареть
+        self.result_cache.clear()
+
     def get_available_commands(self) -> List[str]:
         """
         Возвращает список всех команд, зарегистрированных в системе.
@@ -60,10 +125,99 @@ class AgentManager:
         """
         agent = self.command_map.get(command.lower())
         if agent:
-            return await agent.handle(args, message)
+            return await self.run_agent(agent, args, message)
         else:
             return f"Неизвестная команда: /{command}"
 
+    async def run_agent(self, agent, args: str, message: Message) -> str:
+        """
+        Выполняет handle агента с учётом его класса выполнения (inline, thread, process).
+        """
+        return await self.executor.run(agent, args, message)
+
+    def warm_up(self):
+        """
+        Заранее запускает пул процессов, если есть агенты с execution="process".
+        """
+        if any(getattr(agent, "execution", None) == PROCESS for agent in self.agents):
+            self.executor.warm_up()
+
+    def _get_semaphore(self, agent_name: str, agent) -> asyncio.Semaphore:
+        """
+        Возвращает семафор, ограничивающий число одновременных вызовов агента.
+        """
+        semaphore = self._semaphores.get(agent_name)
+        if semaphore is None:
+            limit = getattr(agent, "max_concurrency", None) or self.default_max_concurrency
+            semaphore = asyncio.Semaphore(limit)
+            self._semaphores[agent_name] = semaphore
+        return semaphore
+
+    async def call_agent(self, agent_name: str, args: str, message: Message) -> Tuple[bool, str]:
+        """
+        Вызывает агента с учётом ограничения параллелизма.
+        Возвращает пару (успех, результат или текст ошибки).
+        """
+        agent = self.command_map.get(agent_name)
+        if not agent:
+            logger.error(f"Агент '{agent_name}' не найден")
+            return False, f"Агент '{agent_name}' не найден"
+
+        cache_key = None
+        cache_ttl = getattr(agent, "cache_ttl", 0) or 0
+        if cache_ttl > 0:
+            key = agent.cache_key(args, message)
+            if key is not None:
+                cache_key = (agent_name, key)
+                cached = self.result_cache.get(cache_key)
+                if cached is not None:
+                    self.cache_stats["hits"] += 1
+                    logger.info(f"Результат агента '{agent_name}' взят из кэша")
+                    return True, cached
+                self.cache_stats["misses"] += 1
+
+        async def invoke() -> Tuple[bool, str]:
+            try:
+                async with self._get_semaphore(agent_name, agent):
+                    logger.info(f"Вызов агента '{agent_name}' с аргументами: {args}")
+                    result = await self.run_agent(agent, args, message)
+                logger.info(f"Агент '{agent_name}' вернул результат: {result}")
+                if cache_key is not None and agent.should_cache_result(result):
+                    self.result_cache.set(cache_key, result, ttl=cache_ttl)
+                return True, result
+            except Exception as e:
+                error_msg = f"Ошибка при вызове агента {agent_name}: {str(e)}"
+                logger.error(error_msg)
+                return False, error_msg
+
+        if cache_key is None:
+            return await invoke()
+        # Ключ кэша задаёт агент, поэтому такие вызовы безопасно объединять между пользователями
+        return await self.single_flight.do(cache_key, invoke)
+
+    def start_batch(self, message: Message, memo: Optional[Dict[str, str]] = None) -> "AgentCallBatch":
+        """
+        Создаёт пакет вызовов, в который можно добавлять вызовы по мере их появления.
+        memo — результаты уже выполненных вызовов, общие для всех итераций запроса.
+        """
+        return AgentCallBatch(self, message, memo)
+
+    async def execute_calls(
+        self,
+        agent_calls: List[Dict[str, Any]],
+        message: Message,
+        memo: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
+        """
+        Выполняет вызовы агентов параллельно с учётом depends_on и ограничений
+        параллелизма. Результаты собираются в порядке вызовов:
+        {agent_name: result} для успешных и {agent_name}_error для ошибок.
+        """
+        batch = self.start_batch(message, memo)
+        for call in agent_calls:
+            batch.submit(call)
+        return await batch.results()
+
     def get_agents_info(self) -> List[Dict[str, str]]:
         """
         Возвращает информацию о всех агентах.
@@ -76,56 +230,426 @@ class AgentManager:
             for agent in self.agents
         ]
 
+# --------------------- Пакет вызовов агентов ---------------------
+class AgentCallBatch:
+    """
+    Пакет вызовов агентов. Вызовы добавляются по одному (например, по мере
+    разбора потокового ответа LLM), и каждый запускается, как только
+    выполнены его зависимости из depends_on. depends_on может быть строкой
+    (id вызова или имя агента), номером вызова или списком таких значений.
+
+    Одинаковые вызовы (агент и аргументы) внутри пакета выполняются один раз,
+    а с общим memo — один раз за все итерации ReAct-цикла.
+
+    Вызовы агента с состоянием (stateful: память, напоминания) выполняются по порядку:
+    каждый ждёт предыдущего вызова того же агента, как в прежнем последовательном цикле,
+    иначе «memory get» мог бы прочитать память раньше, чем запишется «memory save».
+    """
+
+    def __init__(self, manager: AgentManager, message: Message, memo: Optional[Dict[str, str]] = None):
+        self.manager = manager
+        self.message = message
+        self.memo = memo  # {"agent:args": результат} успешных вызовов текущего запроса
+        self.submitted: List[Dict[str, Any]] = []  # Вызовы в исходном виде
+        self.calls: List[Dict[str, Any]] = []
+        self._dependencies: List[Optional[List[int]]] = []
+        # Предыдущий вызов того же агента с состоянием: ждём его завершения (успешного или нет)
+        self._previous: List[Optional[int]] = []
+        self._last_stateful: Dict[str, int] = {}  # агент -> индекс его последнего вызова
+        self._futures: List[asyncio.Future] = []
+        self._tasks: List[Optional[asyncio.Task]] = []
+        self._closed = asyncio.Event()
+        self._keys: Dict[str, int] = {}  # ключ вызова -> индекс первого такого вызова
+        self.duplicates: List[int] = []
+        self.avoided = 0  # Вызовы, не выполненные благодаря дедупликации и memo
+
+    def submit(self, call: Dict[str, Any]) -> int:
+        """
+        Добавляет вызов в пакет и сразу планирует его выполнение.
+        """
+        index = len(self.calls)
+        self.submitted.append(call)
+        self.calls.append({
+            "agent": str(call.get("agent") or "").lower().lstrip("/"),
+            "args": str(call.get("args") or "").lstrip("/"),
+            "id": str(call.get("id") or "").lower(),
+            "depends_on": call.get("depends_on"),
+        })
+
+        key = self.call_key(self.calls[index])
+        agent_name = self.calls[index]["agent"]
+        stateful = getattr(self.manager.command_map.get(agent_name), "stateful", False)
+        previous = self._last_stateful.get(agent_name) if stateful else None
+        first = self._keys.get(key)
+        # У агента с состоянием повтор равен первому вызову, только если между ними не было других вызовов агента
+        if first is not None and (not stateful or previous == first):
+            # Повторный вызов в том же пакете разделяет результат первого
+            logger.info(f"Пропускаем дублирующий вызов: {key}")
+            self.duplicates.append(index)
+            self.avoided += 1
+            self._dependencies.append([])
+            self._previous.append(None)
+            self._futures.append(self._futures[first])
+            self._tasks.append(None)
+            return index
+
+        self._keys[key] = index
+        if stateful:
+            self._last_stateful[agent_name] = index
+        self._dependencies.append(None)
+        self._previous.append(previous)
+        self._futures.append(asyncio.get_running_loop().create_future())
+        self._tasks.append(asyncio.ensure_future(self._run(index)))
+        return index
+
+    @staticmethod
+    def call_key(call: Dict[str, Any]) -> str:
+        return f"{call['agent']}:{call['args']}"
+
+    def _resolve(self, index: int, final: bool) -> Optional[List[int]]:
+        """
+        Преобразует depends_on вызова в индексы вызовов, которые должны завершиться раньше.
+        Пока пакет открыт, ссылка на ещё не поступивший вызов даёт None.
+        """
+        call = self.calls[index]
+        raw = call["depends_on"]
+        if raw is None:
+            raw = []
+        elif not isinstance(raw, list):
+            raw = [raw]
+
+        resolved = []
+        for ref in raw:
+            if isinstance(ref, int) and not isinstance(ref, bool):
+                matches = [ref] if 0 <= ref < len(self.calls) and ref != index else []
+            else:
+                ref = str(ref).lower().lstrip("/")
+                matches = [i for i, other in enumerate(self.calls) if i != index and other["id"] and other["id"] == ref]
+                if not matches:
+                    matches = [i for i, other in enumerate(self.calls) if i != index and other["agent"] == ref]
+            if not matches:
+                if not final:
+                    return None
+                logger.warning(f"Вызов '{call['agent']}' зависит от неизвестного вызова '{ref}', зависимость пропущена")
+            resolved.extend(i for i in matches if i not in resolved)
+        return resolved
+
+    async def _run(self, index: int):
+        call = self.calls[index]
+        dependencies = self._dependencies[index]
+        if dependencies is None:
+            dependencies = self._resolve(index, final=self._closed.is_set())
+            if dependencies is None:
+                # Зависимость ещё не пришла — ждём, пока пакет будет закрыт
+                await self._closed.wait()
+                dependencies = self._dependencies[index]
+                if dependencies is None:
+                    dependencies = self._resolve(index, final=True)
+            self._dependencies[index] = dependencies
+
+        previous = self._previous[index]
+        if previous is not None:
+            # Только порядок: неудача предыдущего вызова не отменяет этот
+            await asyncio.shield(self._futures[previous])
+
+        outcome = None
+        for dep in dependencies:
+            dep_ok, _ = await asyncio.shield(self._futures[dep])
+            if not dep_ok:
+                outcome = (False, f"Вызов агента {call['agent']} пропущен: не выполнена зависимость {self.calls[dep]['agent']}")
+                break
+        if outcome is None:
+            outcome = self._recall(call)
+        if outcome is None:
+            outcome = await self.manager.call_agent(call["agent"], call["args"], self.message)
+            self._remember(call, outcome)
+
+        if not self._futures[index].done():
+            self._futures[index].set_result(outcome)
+
+    def _recall(self, call: Dict[str, Any]) -> Optional[Tuple[bool, str]]:
+        """
+        Возвращает результат такого же вызова с прошлых итераций запроса.
+        """
+        if self.memo is None:
+            return None
+        key = self.call_key(call)
+        if key not in self.memo:
+            return None
+        logger.info(f"Результат вызова {key} уже получен на прошлой итерации")
+        self.avoided += 1
+        return True, self.memo[key]
+
+    def _remember(self, call: Dict[str, Any], outcome: Tuple[bool, str]):
+        """
+        Запоминает успешный результат вызова для следующих итераций запроса.
+        """
+        if self.memo is None:
+            return
+        key = self.call_key(call)
+        agent = self.manager.command_map.get(call["agent"])
+        if getattr(agent, "stateful", False):
+            # Агент мог изменить состояние — прежние результаты его вызовов устарели
+            prefix = f"{call['agent']}:"
+            for stale in [k for k in self.memo if k.startswith(prefix) and k != key]:
+                del self.memo[stale]
+        ok, value = outcome
+        if ok and isinstance(value, str) and not value.startswith("❌"):
+            self.memo[key] = value
+
+    def close(self):
+        """
+        Закрывает пакет: новых вызовов не будет. Вызовы из циклов
+        зависимостей (и зависящие от них) завершаются ошибкой.
+        """
+        if self._closed.is_set():
+            return
+        self._closed.set()
+
+        for index in range(len(self.calls)):
+            if self._dependencies[index] is None:
+                self._dependencies[index] = self._resolve(index, final=True)
+
+        # Топологическая сортировка: всё, что не удалось упорядочить, лежит в цикле или за ним
+        pending = {
+            i: set(deps) | ({self._previous[i]} if self._previous[i] is not None else set())
+            for i, deps in enumerate(self._dependencies)
+        }
+        order = []
+        ready = [i for i, deps in pending.items() if not deps]
+        while ready:
+            current = ready.pop(0)
+            order.append(current)
+            for i, deps in pending.items():
+                if current in deps:
+                    deps.discard(current)
+                    if not deps and i not in order and i not in ready:
+                        ready.append(i)
+
+        for index in sorted(set(pending) - set(order)):
+            agent_name = self.calls[index]["agent"]
+            logger.error(f"Циклическая зависимость у вызова агента '{agent_name}'")
+            if not self._futures[index].done():
+                self._futures[index].set_result((False, f"Циклическая зависимость у вызова агента {agent_name}"))
+            if self._tasks[index] is not None:
+                self._tasks[index].cancel()
+
+    def cancel(self):
+        """
+        Отменяет незавершённые вызовы пакета; результаты не собираются.
+        """
+        self._closed.set()
+        for task in self._tasks:
+            if task is not None:
+                task.cancel()
+
+    async def results(self) -> Dict[str, str]:
+        """
+        Закрывает пакет, дожидается всех вызовов и собирает результаты в порядке вызовов.
+        """
+        self.close()
+        outcomes = await asyncio.gather(*self._futures)
+
+        results = {}
+        for index, (call, (ok, value)) in enumerate(zip(self.calls, outcomes)):
+            # Повторный вызов того же агента с теми же аргументами уже учтён
+            if index in self.duplicates:
+                continue
+
+            agent_name = call["agent"]
+            if ok:
+                results[agent_name] = value  # Сохраняем по имени агента
+            else:
+                results[f"{agent_name}_error"] = value
+
+        return results
+
 # --------------------- Загрузка всех Агентов ---------------------
-def load_agents(agent_manager: AgentManager):
+def agent_module_name(folder: str, module_name: str) -> str:
     """
-    Сканирует папку plugins, ищет модули, наследуемые от BaseAgent,
-    и регистрирует их в agent_manager.
+    Имя модуля агента: для agents/ — имя файла, для остальных папок — с префиксом папки,
+    чтобы, например, custom/weather_agent.py не подменил agents/weather_agent.py.
     """
-    sys.path.insert(0, AGENTS_FOLDER)  # Чтобы Python мог импортировать из папки plugins
+    if os.path.abspath(folder) == os.path.abspath(AGENTS_FOLDER):
+        return module_name
+    return f"{os.path.basename(os.path.normpath(folder))}_{module_name}"
 
-    for importer, module_name, ispkg in pkgutil.iter_modules([AGENTS_FOLDER]):
-        # Пропускаем __init__ и base_agent
-        if module_name in ("__init__", "base_agent"):
-            continue
 
-        # Импортируем модуль
-        try:
-            module = importlib.import_module(module_name)
-        except Exception as e:
-            logging.error(f"Не удалось импортировать модуль {module_name}: {e}")
+def load_agents(
+    agent_manager: AgentManager,
+    folders: Optional[List[str]] = None,
+    manifest_path: str = AGENT_MANIFEST_PATH
+):
+    """
+    Сканирует папки агентов (по умолчанию agents/ и custom/) и регистрирует
+    в agent_manager агентов, наследуемых от BaseAgent.
+    Имена и описания берутся из манифеста: модуль, который не менялся с прошлого
+    запуска, не импортируется, пока агент не понадобится.
+    """
+    started = time.perf_counter()
+    if folders is None:
+        folders = [AGENTS_FOLDER, CUSTOM_AGENTS_FOLDER]
+
+    manifest = AgentManifest(manifest_path)
+    files = []
+    imported = 0
+    for folder in folders:
+        if not os.path.isdir(folder):
             continue
+        for importer, module_name, ispkg in pkgutil.iter_modules([folder]):
+            # Пропускаем __init__ и base_agent
+            if module_name in AGENT_SKIP_MODULES or ispkg:
+                continue
+            file_path = os.path.join(folder, f"{module_name}.py")
+            files.append(file_path)
+            full_name = agent_module_name(folder, module_name)
+
+            cached = manifest.lookup(file_path)
+            if cached is not None:
+                for entry in cached:
+                    agent_manager.register_agent(LazyAgent(
+                        file_path, full_name, entry["class"], entry["name"], entry["description"],
+                        agent_manager.tools, execution=entry["execution"], flags=entry
+                    ))
+                continue
 
-        # Импортируем BaseAgent
-        try:
-            from agents.base_agent import BaseAgent
-        except ImportError:
-            logging.error("Не удалось импортировать BaseAgent из plugins.base_agent")
-            continue
+            imported += 1
+            agents, complete = import_agents(full_name, file_path, agent_manager.tools)
+            for agent in agents:
+                agent_manager.register_agent(agent)
+            update_manifest(manifest, file_path, agents, complete)
+
+    manifest.prune(files)
+    manifest.save()
+    startup_report["agents_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    startup_report["agents"] = len(agent_manager.agents)
+    startup_report["agent_modules_imported"] = imported
+    startup_report["manifest_hits"] = manifest.stats["hits"]
+    startup_report["manifest_misses"] = manifest.stats["misses"]
+
+
+def import_agents(
+    module_name: str,
+    file_path: str,
+    tools: Dict[str, Any],
+    described: Optional[Tuple[List[Dict[str, Any]], bool]] = None
+) -> Tuple[List[LazyAgent], bool]:
+    """
+    Импортирует файл агента и создаёт все агенты из него.
+    Возвращает агентов и признак того, что файл импортирован и созданы все его агенты.
+    Файл с агентами execution="process" в процессе бота не выполняется: агенты описываются
+    по исходному коду, а если это не удалось — в отдельном процессе. described — уже
+    полученный результат describe_in_worker (при горячей перезагрузке его получают вне цикла событий).
+    """
+    if declares_process_execution(file_path):
+        entries = describe_source(file_path)
+        complete = True
+        if entries is None and described is not None:
+            entries, complete = described
+        elif entries is None:
+            # Блокирует поток до AGENT_PROCESS_TIMEOUT — допустимо только при запуске, пока чаты не обслуживаются
+            entries, complete = describe_in_worker(file_path, module_name)
+        agents = [
+            LazyAgent(file_path, module_name, entry["class"], entry["name"], entry["description"],
+                      tools, execution=entry["execution"], flags=entry)
+            for entry in entries
+        ]
+        for agent in agents:
+            logging.info(f"Загружен агент: {agent.class_name} (без импорта, execution={agent.execution})")
+        return agents, complete and bool(agents)
+
+    try:
+        module = load_module_from_file(module_name, file_path)
+    except Exception as e:
+        logging.error(f"Не удалось импортировать модуль {module_name}: {e}")
+        return [], False
+
+    from agents.base_agent import BaseAgent
+
+    agents = []
+    complete = True
+    # Ищем классы, унаследованные от BaseAgent
+    for attr_name in dir(module):
+        attr = getattr(module, attr_name)
+        # Проверяем, что это класс, унаследованный от BaseAgent, но не сам BaseAgent
+        if isinstance(attr, type) and issubclass(attr, BaseAgent) and attr is not BaseAgent:
+            try:
+                instance = attr(tools=tools)  # Передаем инструменты при инициализации
+                agents.append(LazyAgent(
+                    file_path, module_name, attr_name, instance.get_name(), instance.get_description(),
+                    tools, instance=instance, execution=instance.execution
+                ))
+                logging.info(f"Загружен агент: {attr_name}")
+            except Exception as e:
+                complete = False
+                logging.error(f"Не удалось инициализировать агента {attr_name}: {e}")
+    return agents, complete
+
+
+def needs_worker_description(file_path: str) -> bool:
+    """
+    Агентов файла можно описать только в отдельном процессе: execution="process",
+    а имя, описание или флаги заданы не литералами.
+    """
+    return os.path.exists(file_path) and declares_process_execution(file_path) and describe_source(file_path) is None
+
+
+def update_manifest(manifest: AgentManifest, file_path: str, agents: List[LazyAgent], complete: bool):
+    if complete:
+        manifest.update(file_path, [agent.manifest_entry() for agent in agents])
+    else:
+        # Агенты, которые не удалось создать (например, нет API-ключа), в манифест не попадают,
+        # а файл проверяется заново при следующем запуске
+        manifest.forget(file_path)
+
+
+def reload_agent_file(
+    agent_manager: AgentManager,
+    file_path: str,
+    manifest_path: str = AGENT_MANIFEST_PATH,
+    described: Optional[Tuple[List[Dict[str, Any]], bool]] = None
+) -> bool:
+    """
+    Перезагружает агентов из изменённого, нового или удалённого файла.
+    Если файл не импортируется или его агенты не создаются, остаются прежние агенты.
+    described — описание агентов execution="process", полученное в отдельном процессе (см. import_agents).
+    Возвращает True, если набор агентов изменился.
+    """
+    manifest = AgentManifest(manifest_path)
+    folder, name = os.path.split(file_path)
+    module_name = agent_module_name(folder, os.path.splitext(name)[0])
+
+    if not os.path.exists(file_path):
+        agent_manager.replace_source(file_path, [])
+        sys.modules.pop(module_name, None)
+        manifest.forget(file_path)
+        manifest.save()
+        logging.info(f"Агенты из {file_path} удалены")
+        return True
+
+    agents, complete = import_agents(module_name, file_path, agent_manager.tools, described)
+    if not complete:
+        logging.error(f"Агенты из {file_path} не перезагружены, продолжают работать прежние версии")
+        return False
+    agent_manager.replace_source(file_path, agents)
+    update_manifest(manifest, file_path, agents, complete)
+    manifest.save()
+    logging.info(f"Агенты из {file_path} перезагружены: {', '.join(agent.get_name() for agent in agents) or 'нет агентов'}")
+    return True
 
-        # Ищем классы, унаследованные от BaseAgent
-        for attr_name in dir(module):
-            attr = getattr(module, attr_name)
-            # Проверяем, что это класс, унаследованный от BaseAgent, но не сам BaseAgent
-            if isinstance(attr, type) and issubclass(attr, BaseAgent) and attr is not BaseAgent:
-                try:
-                    agent_instance = attr(tools=agent_manager.tools)  # Передаем инструменты при инициализации
-                    agent_manager.register_agent(agent_instance)
-                    logging.info(f"Загружен агент: {attr_name}")
-                except Exception as e:
-                    logging.error(f"Не удалось инициализировать агента {attr_name}: {e}")
 
 # --------------------- Загрузка Инструментов ---------------------
 def load_tools() -> Dict[str, Any]:
     """
     Динамически загружает все инструменты из папки tools и возвращает словарь инструментов.
     """
+    started = time.perf_counter()
     tools = {}
     sys.path.insert(0, TOOLS_FOLDER)  # Чтобы Python мог импортировать из папки tools
 
     for importer, module_name, ispkg in pkgutil.iter_modules([TOOLS_FOLDER]):
-        # Пропускаем __init__
-        if module_name == "__init__":
+        # Пропускаем __init__ и вспомогательные модули (_*.py), которые не являются инструментами
+        if module_name.startswith("_"):
             continue
 
         try:
@@ -145,8 +669,10 @@ def load_tools() -> Dict[str, Any]:
                 continue
 
         tools[module_name] = tool
+        tool_lifecycle.register(module_name, module)
         logging.info(f"Загружен инструмент: {module_name}")
 
+    startup_report["tools_ms"] = round((time.perf_counter() - started) * 1000, 1)
     return tools
 
 # --------------------- Класс бота на aiogram ---------------------
@@ -158,20 +684,95 @@ class AITelegramBot:
         )
         self.dp = Dispatcher()
 
+        # Способ получения обновлений: polling (по умолчанию) или webhook
+        self.mode = os.getenv("BOT_MODE", "polling").lower()
+        self.webhook_url = os.getenv("WEBHOOK_URL", "")  # Публичный адрес, который сообщается Telegram
+        self.webhook_host = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.webhook_port = int(os.getenv("WEBHOOK_PORT", "8080"))
+        self.webhook_path = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.webhook_secret = os.getenv("WEBHOOK_SECRET", "")
+
         # Добавляем объект бота в инструменты для использования агентами
         self.tools = tools
         self.tools['bot'] = self.bot  # Для агентов, которым нужен доступ к боту
 
+        # Общий пул клиентов LLM, создаётся один раз при загрузке инструментов
+        self.llm_client = self.tools.get('llm_client')
+        # Потоковый вывод ответа с постепенным редактированием сообщения
+        self.telegram_stream = self.tools.get('telegram_stream')
+        # Разбор ответов LLM, в том числе инкрементальный (вызовы агентов до конца ответа)
+        self.json_parser = self.tools.get('json_parser')
+        # Кэш ответов LLM (точные совпадения и почти-дубликаты)
+        self.response_cache = self.tools.get('response_cache')
+        # Сборка промптов в пределах бюджета токенов
+        self.prompt_builder = self.tools.get('prompt_builder')
+        # Очереди сообщений по чатам, справедливое распределение и ограничение нагрузки
+        self.admission = self.tools.get('admission')
+        # Исходящие сообщения с учётом лимитов Telegram
+        self.send_queue = self.tools.get('send_queue')
+
+        # Статистика ReAct-цикла: невыполненные повторные вызовы агентов и досрочные выходы
+        self.react_stats = {"avoided_calls": 0, "early_exits": 0}
+
+        # Горячая перезагрузка агентов из agents/ и custom/ без перезапуска бота
+        # (снимок файлов делается до загрузки, чтобы не пропустить изменения)
+        self.hot_reload = os.getenv("AGENT_HOT_RELOAD", "1").lower() in ("1", "true", "yes")
+        self.agent_watcher = FileWatcher(
+            [AGENTS_FOLDER, CUSTOM_AGENTS_FOLDER], skip=AGENT_SKIP_MODULES,
+            interval=float(os.getenv("AGENT_RELOAD_INTERVAL", "2"))
+        ) if self.hot_reload else None
+        self._reload_task: Optional[asyncio.Task] = None
+
         # Инициализируем менеджер агентов с доступными инструментами
         self.agent_manager = AgentManager(tools=tools)
-        # Загружаем все агенты из папки plugins
+        # Загружаем все агенты из папок agents/ и custom/
         load_agents(self.agent_manager)
 
+        # Системное сообщение для GPT, включая информацию о доступных агентах
+        self.system_prompt = self.build_system_prompt()
+
+        if self.response_cache and self.response_cache.persist and self.tools.get('database'):
+            self.response_cache.attach_database(self.tools['database'])
+
+        # Сроки хранения, квоты и сжатие памяти — фоновая задача планировщика
+        memory_retention = self.tools.get('memory_retention')
+        if memory_retention and self.tools.get('database'):
+            memory_retention.attach(self.tools['database'], self.tools.get('scheduler'), self.admission)
+
+        # Потоковый вывод отправляет заглушку, правки и продолжения ответа через очередь исходящих сообщений
+        if self.telegram_stream and self.send_queue:
+            self.telegram_stream.attach(self.send_queue)
+
+        # Напоминания: хранятся в базе и восстанавливаются при запуске
+        reminders = self.tools.get('reminders')
+        if reminders and self.tools.get('database'):
+            reminders.attach(self.tools['database'], self.bot, self.send_queue)
+
+        @self.dp.message()
+        async def message_handler(message: Message):
+            if not message.text:
+                return
+
+            if self.admission and self.admission.enabled:
+                user = message.from_user
+                accepted = self.admission.submit(
+                    message.chat.id, user.id if user else message.chat.id,
+                    lambda: self.process_message(message)
+                )
+                if not accepted:
+                    await self.reply(message, self.admission.busy_text, parse_mode=None)
+                return
+
+            await self.process_message(message)
+
+    def build_system_prompt(self) -> str:
+        """
+        Системное сообщение для GPT со списком доступных агентов.
+        """
         # Получаем информацию о агентах для использования в системном сообщении
         agents_info = self.agent_manager.get_agents_info()
 
-        # Системное сообщение для GPT, включая информацию о доступных агентах
-        self.system_prompt = (
+        return (
             "Ты — GPT-бот, который не только объясняет свои действия, но и полностью выполняет поставленные задачи. "
             "Используй ReAct подход (Reasoning + Acting) для решения задач.\n\n"
             "Правила работы с агентами:\n"
@@ -209,42 +810,79 @@ class AITelegramBot:
             "1. ВСЕГДА выполняй действия через agent_calls\n"
             "2. Не просто планируй, а реально ВЫЗЫВАЙ агентов\n"
             "3. Используй все необходимые агенты для полного решения задачи\n"
-            "4. Объединяй результаты всех агентов в финальном ответе"
+            "4. Объединяй результаты всех агентов в финальном ответе\n"
+            "5. Вызовы из agent_calls выполняются параллельно; если вызов должен выполниться "
+            "после другого, укажи в нём \"depends_on\": \"<имя агента>\""
         )
 
-        @self.dp.message()
-        async def message_handler(message: Message):
-            if not message.text:
+    async def reload_agents(self, added: List[str], changed: List[str], removed: List[str]):
+        """
+        Перезагружает агентов из изменившихся файлов и пересобирает системный промпт.
+        """
+        reloaded = False
+        for file_path in added + changed + removed:
+            described = None
+            if needs_worker_description(file_path):
+                # Описание в отдельном процессе длится до AGENT_PROCESS_TIMEOUT — не в потоке цикла событий,
+                # иначе на это время остановились бы все чаты
+                folder, name = os.path.split(file_path)
+                described = await asyncio.get_running_loop().run_in_executor(
+                    None, describe_in_worker, file_path, agent_module_name(folder, os.path.splitext(name)[0])
+                )
+            reloaded = reload_agent_file(self.agent_manager, file_path, described=described) or reloaded
+        if reloaded:
+            self.system_prompt = self.build_system_prompt()
+            logger.info(f"Системный промпт обновлён, агентов: {len(self.agent_manager.agents)}")
+
+    async def process_message(self, message: Message):
+        """
+        Обрабатывает сообщение: команду агенту напрямую или задачу через цикл ReAct.
+        """
+        if message.text.startswith('/'):
+            # Remove leading slash and split command
+            command_full = message.text[1:].split(maxsplit=1)
+            command_parts = command_full[0].split('_')  # Split by underscore for subcommands
+            base_command = command_parts[0].lower()  # Get base command (e.g., 'memory' from 'memory_get')
+            
+            # Prepare args: if there's a subcommand, add it to the beginning of args
+            args = ""
+            if len(command_parts) > 1:
+                args = command_parts[1]  # Add subcommand to args
+                if len(command_full) > 1:
+                    args += " " + command_full[1]
+            elif len(command_full) > 1:
+                args = command_full[1]
+            
+            # Try to find and execute the base command
+            agent = self.agent_manager.command_map.get(base_command)
+            if agent:
+                agent_response = await self.agent_manager.run_agent(agent, args, message)
+                await self.reply(message, agent_response)
+                return
+            else:
+                await self.reply(message, f"Неизвестная команда: /{base_command}")
                 return
 
-            if message.text.startswith('/'):
-                # Remove leading slash and split command
-                command_full = message.text[1:].split(maxsplit=1)
-                command_parts = command_full[0].split('_')  # Split by underscore for subcommands
-                base_command = command_parts[0].lower()  # Get base command (e.g., 'memory' from 'memory_get')
-                
-                # Prepare args: if there's a subcommand, add it to the beginning of args
-                args = ""
-                if len(command_parts) > 1:
-                    args = command_parts[1]  # Add subcommand to args
-                    if len(command_full) > 1:
-                        args += " " + command_full[1]
-                elif len(command_full) > 1:
-                    args = command_full[1]
-                
-                # Try to find and execute the base command
-                agent = self.agent_manager.command_map.get(base_command)
-                if agent:
-                    agent_response = await agent.handle(args, message)
-                    await message.answer(agent_response)
-                    return
-                else:
-                    await message.answer(f"Неизвестная команда: /{base_command}")
-                    return
-
-            # Запускаем цикл ReAct
-            final_response = await self.execute_react_cycle(message.text, message)
-            await message.answer(final_response)
+        # Запускаем цикл ReAct
+        if self.telegram_stream and self.telegram_stream.enabled:
+            # Сразу отправляем заглушку и обновляем её по мере генерации ответа
+            stream = await self.telegram_stream.start(message)
+            final_response = await self.execute_react_cycle(message.text, message, stream=stream)
+            await stream.finish(final_response)
+            return
+
+        final_response = await self.execute_react_cycle(message.text, message)
+        await self.reply(message, final_response)
+
+    async def reply(self, message: Message, text: str, **kwargs):
+        """
+        Отвечает на сообщение через очередь исходящих сообщений (с приоритетом ответа пользователю).
+        """
+        if self.send_queue:
+            return await self.send_queue.send(
+                message.chat.id, lambda: message.answer(text, **kwargs), priority=self.send_queue.INTERACTIVE
+            )
+        return await message.answer(text, **kwargs)
 
     async def execute_react_cycle(
         self,
@@ -252,7 +890,8 @@ class AITelegramBot:
         message,
         context: Dict[str, Any] = None,
         iteration_count: int = 0,
-        max_iterations: int = 5
+        max_iterations: int = 5,
+        stream=None
     ) -> str:
         if context is None:
             context = {}
@@ -260,37 +899,85 @@ class AITelegramBot:
         if iteration_count >= max_iterations:
             logger.warning("Достигнут лимит итераций для ReAct цикла!")
             context["error"] = "Достигнут лимит итераций"
-            return await self.get_final_response(user_message, context)
+            return await self.get_final_response(user_message, context, on_delta=self._stream_preview(stream))
 
         calls_history = context.setdefault("calls_history", [])
         progress_history = context.setdefault("progress_history", [])
+        # Результаты вызовов агентов, уже выполненных в рамках этого запроса
+        call_memo = context.setdefault("call_memo", {})
         
         logger.debug(f"===== ИТЕРАЦИЯ #{iteration_count} =====")
         logger.debug(f"Текущий контекст:\n{context}")
 
         # Формируем сообщение для модели с контекстом и прогрессом
         full_message = self.format_message_with_context(user_message, context)
-        ai_response = await self.get_ai_response(full_message)
+
+        # Вызовы агентов запускаются сразу, как только LLM закончила очередной объект agent_calls
+        batch = None
+        on_delta = self._stream_preview(stream)
+        if self.json_parser and self.json_parser.early_dispatch:
+            batch = self.agent_manager.start_batch(message, call_memo)
+            on_delta = self._early_dispatch(batch, on_delta)
+
+        # Первое сообщение без накопленного контекста можно обслужить из кэша ответов LLM
+        use_cache = bool(self.response_cache and self.llm_client) and full_message == user_message
+        cached_response = None
+        if use_cache:
+            cached_response = self.response_cache.get(user_message, self.llm_client.model, self.system_prompt)
+        if cached_response is not None:
+            logger.info("Ответ LLM взят из кэша")
+            ai_response = cached_response
+        else:
+            ai_response = await self.get_ai_response(full_message, on_delta=on_delta, structured=True)
 
         try:
-            response_data = json.loads(ai_response)
+            if self.json_parser:
+                # Локальный ремонт (```-обёртка, висячие запятые) вместо повторного запроса к LLM
+                response_data = self.json_parser.loads(ai_response)
+            else:
+                response_data = json.loads(ai_response)
         except json.JSONDecodeError as e:
+            if batch:
+                batch.cancel()
             context["error"] = f"Ошибка парсинга JSON: {str(e)}"
-            return await self.execute_react_cycle(user_message, message, context, iteration_count + 1)
+            return await self.execute_react_cycle(user_message, message, context, iteration_count + 1, stream=stream)
 
         # Получаем текущие вызовы агентов
         agent_calls = response_data.get("agent_calls", [])
         calls_history.append(agent_calls)
 
+        if use_cache and cached_response is None:
+            if self.is_cacheable_plan(agent_calls):
+                self.response_cache.put(
+                    user_message, self.llm_client.model, self.system_prompt,
+                    json.dumps(response_data, ensure_ascii=False)  # уже исправленный ответ
+                )
+            else:
+                self.response_cache.skip()
+
+        if stream and agent_calls:
+            stream.update("⚡️ Вызываю агентов: " + ", ".join(
+                str(call.get("agent", "")) for call in agent_calls if isinstance(call, dict)
+            ))
+
         # Выполняем вызовы агентов и собираем результаты
-        agent_results = await self.execute_agent_calls(agent_calls, message)
-        
+        if batch is None or not self._complete_batch(batch, agent_calls):
+            if batch is not None:
+                batch.cancel()
+            batch = self.agent_manager.start_batch(message, call_memo)
+            for call in agent_calls if isinstance(agent_calls, list) else []:
+                batch.submit(call)
+        agent_results = await batch.results()
+        self.react_stats["avoided_calls"] += batch.avoided
+
         # Анализируем прогресс
         progress = self.analyze_progress(context, agent_results, response_data)
+        progress["repeated_calls"] = bool(batch.calls) and batch.avoided == len(batch.calls)
         progress_history.append(progress)
 
-        # Обновляем контекст результатами
+        # Обновляем контекст результатами и запоминаем, на какой итерации они получены
         context.update(agent_results)
+        context.setdefault("result_iterations", {}).update({key: iteration_count for key in agent_results})
 
         # Если все агенты выполнились успешно, формируем финальный ответ
         if progress.get("success", False):
@@ -332,41 +1019,27 @@ class AITelegramBot:
 
         # Если есть ошибки или не все агенты выполнились, продолжаем цикл
         if agent_results or "error" in context:
-            return await self.execute_react_cycle(user_message, message, context, iteration_count + 1)
+            if self.is_stuck(progress_history):
+                # LLM повторяет одно и то же — дальнейшие итерации не дадут нового
+                logger.warning(f"ReAct цикл не продвигается, завершаем на итерации #{iteration_count}")
+                self.react_stats["early_exits"] += 1
+                context["error"] = "Выполнение остановлено: повторные итерации не дают новых результатов"
+                return await self.get_final_response(user_message, context, on_delta=self._stream_preview(stream))
+            return await self.execute_react_cycle(user_message, message, context, iteration_count + 1, stream=stream)
 
         return self.format_final_response(response_data)
 
-    async def execute_agent_calls(self, agent_calls: List[Dict[str, str]], message: Message) -> Dict[str, str]:
+    async def execute_agent_calls(
+        self,
+        agent_calls: List[Dict[str, str]],
+        message: Message,
+        memo: Optional[Dict[str, str]] = None
+    ) -> Dict[str, str]:
         """
         Выполняет вызовы агентов и возвращает словарь с результатами.
+        Независимые вызовы выполняются параллельно (см. AgentManager.execute_calls).
         """
-        results = {}
-        for call in agent_calls:
-            agent_name = call.get("agent", "").lower().lstrip("/")
-            args = call.get("args", "").lstrip("/")
-
-            # Если это повторный вызов того же агента с теми же аргументами, пропускаем
-            call_key = f"{agent_name}:{args}"
-            if call_key in results:
-                logger.info(f"Пропускаем дублирующий вызов: {call_key}")
-                continue
-
-            agent = self.agent_manager.command_map.get(agent_name)
-            if agent:
-                try:
-                    logger.info(f"Вызов агента '{agent_name}' с аргументами: {args}")
-                    result = await agent.handle(args, message)
-                    results[agent_name] = result  # Сохраняем по имени агента
-                    logger.info(f"Агент '{agent_name}' вернул результат: {result}")
-                except Exception as e:
-                    error_msg = f"Ошибка при вызове агента {agent_name}: {str(e)}"
-                    logger.error(error_msg)
-                    results[f"{agent_name}_error"] = error_msg
-            else:
-                logger.error(f"Агент '{agent_name}' не найден")
-                results[f"{agent_name}_error"] = f"Агент '{agent_name}' не найден"
-
-        return results
+        return await self.agent_manager.execute_calls(agent_calls, message, memo)
 
     def analyze_progress(self, context: Dict[str, Any], new_results: Dict[str, Any], response_data: Dict[str, Any]) -> Dict[str, Any]:
         """Анализирует прогресс в решении задачи"""
@@ -376,12 +1049,20 @@ class AITelegramBot:
         failed_calls = sum(1 for result in new_results.values() 
                          if isinstance(result, str) and result.startswith("❌"))
         
-        # Проверяем успешность выполнения всей задачи
-        all_calls_processed = len(response_data.get("agent_calls", [])) == len(new_results)
+        # Проверяем успешность выполнения всей задачи (повторы одного вызова считаются один раз)
+        agent_calls = response_data.get("agent_calls", [])
+        unique_calls = {
+            (str(call.get("agent") or "").lower().lstrip("/"), str(call.get("args") or "").lstrip("/"))
+            for call in agent_calls if isinstance(call, dict)
+        } if isinstance(agent_calls, list) else set()
+        all_calls_processed = len(unique_calls) == len(new_results)
         success = successful_calls > 0 and failed_calls == 0 and all_calls_processed
 
+        # Новая информация — результаты, которых ещё нет в контексте
+        has_new_info = any(context.get(key) != value for key, value in new_results.items())
+
         return {
-            "has_new_info": bool(new_results),
+            "has_new_info": has_new_info,
             "error_resolved": "error" in context and "error" not in new_results,
             "reasoning_changed": self.has_reasoning_changed(context, response_data),
             "agent_calls_count": len(response_data.get("agent_calls", [])),
@@ -395,6 +1076,11 @@ class AITelegramBot:
         """
         Определяет, застряло ли выполнение, анализируя историю прогресса
         """
+        # Две итерации подряд LLM повторяет уже выполненные вызовы, не получая ничего нового
+        last_two = progress_history[-2:]
+        if len(last_two) == 2 and all(p.get("repeated_calls") and not p["has_new_info"] for p in last_two):
+            return True
+
         if len(progress_history) < 3:
             return False
 
@@ -427,26 +1113,120 @@ class AITelegramBot:
         # Простое сравнение на неравенство
         return old_reasoning != new_reasoning
 
-    async def get_final_response(self, user_message: str, context: Dict[str, Any]) -> str:
+    async def get_final_response(self, user_message: str, context: Dict[str, Any], on_delta=None) -> str:
         """
         Запрашивает у LLM финальный ответ с учетом всего контекста
         """
+        if self.prompt_builder:
+            final_prompt = self.prompt_builder.final_prompt(user_message, context)
+            return await self.get_ai_response(final_prompt, on_delta=on_delta)
+
         full_context = json.dumps(context, ensure_ascii=False, indent=2)
         final_prompt = (
             f"Задача: {user_message}\n\n"
             f"Контекст выполнения:\n{full_context}\n\n"
             "Пожалуйста, сформируй финальный ответ, учитывая все полученные результаты и ошибки."
         )
-        return await self.get_ai_response(final_prompt)
+        return await self.get_ai_response(final_prompt, on_delta=on_delta)
+
+    def is_cacheable_plan(self, agent_calls: Any) -> bool:
+        """
+        План можно кэшировать, только если все вызываемые агенты известны
+        и не помечены как некэшируемые (cacheable = False).
+        """
+        if not isinstance(agent_calls, list):
+            return False
+        for call in agent_calls:
+            if not isinstance(call, dict):
+                return False
+            agent = self.agent_manager.command_map.get(str(call.get("agent") or "").lower().lstrip("/"))
+            if agent is None or not getattr(agent, "cacheable", True):
+                return False
+        return True
+
+    def _early_dispatch(self, batch: AgentCallBatch, on_delta=None):
+        """
+        Возвращает обработчик частичного ответа LLM, который разбирает его
+        инкрементально и отправляет в batch каждый завершённый вызов агента.
+        Досрочный запуск останавливается на первом вызове агента с состоянием (stateful):
+        если ответ не разберётся, пакет отменяется и запрос повторяется, и побочные эффекты
+        (запись в память, новое напоминание) выполнились бы дважды. Он и последующие вызовы
+        запускаются после разбора всего ответа.
+        """
+        parser = self.json_parser.agent_calls_parser()
+        held = False
+
+        def dispatch(buffer: str):
+            nonlocal held
+            if on_delta:
+                on_delta(buffer)
+            for call in parser.feed(buffer[len(parser.buffer):]):
+                if not held:
+                    name = str(call.get("agent") or "").lower().lstrip("/")
+                    held = getattr(self.agent_manager.command_map.get(name), "stateful", False)
+                if held:
+                    continue
+                logger.info(f"Вызов агента '{call.get('agent')}' запущен до завершения ответа LLM")
+                batch.submit(call)
+
+        return dispatch
+
+    def _complete_batch(self, batch: AgentCallBatch, agent_calls: Any) -> bool:
+        """
+        Сверяет уже запущенные вызовы с разобранным ответом и добавляет недостающие.
+        Возвращает False, если запущенные вызовы не совпали с ответом.
+        """
+        if not isinstance(agent_calls, list):
+            return not batch.submitted
+        started = len(batch.submitted)
+        if agent_calls[:started] != batch.submitted:
+            logger.warning("Запущенные до конца ответа вызовы не совпали с ответом LLM, выполняем заново")
+            return False
+        for call in agent_calls[started:]:
+            batch.submit(call)
+        return True
+
+    def _stream_preview(self, stream):
+        """
+        Возвращает обработчик частичного ответа LLM, который показывает
+        пользователю рассуждения модели по мере их генерации.
+        """
+        if stream is None:
+            return None
+
+        # Разбор идёт по новым фрагментам, а текст предпросмотра собирается, только когда подошло время правки
+        reasoning = self.telegram_stream.partial_field("reasoning")
+
+        def render() -> str:
+            text = reasoning.value
+            if not text:
+                return ""
+            return ("🤖 Процесс решения:\n" + text
+                    .replace("Thought:", "💭 Размышление:")
+                    .replace("Action:", "⚡️ Действие:")
+                    .replace("Observation:", "👁 Наблюдение:")
+                    .replace("Final Response:", "✅ Итоговый ответ:"))
+
+        def on_delta(buffer: str):
+            if reasoning.feed(buffer):
+                stream.update(render)
+            elif not JSON_START.match(buffer):
+                # Ответ не в JSON (например, финальный ответ) — показываем как есть
+                stream.update(buffer)
+
+        return on_delta
 
     def format_message_with_context(self, user_message: str, context: Dict[str, Any]) -> str:
         """
         Форматирует сообщение для LLM с учетом контекста
         """
+        if self.prompt_builder:
+            return self.prompt_builder.iteration_prompt(user_message, context)
+
         message_parts = [user_message]
 
         filtered_context = {k: v for k, v in context.items() 
-                          if k not in ["calls_history", "progress_history", "last_reasoning"]}
+                          if k not in ["calls_history", "progress_history", "last_reasoning", "result_iterations", "call_memo"]}
         
         if (filtered_context):
             message_parts.append("\nПредыдущие результаты:")
@@ -459,40 +1239,50 @@ class AITelegramBot:
 
         return "\n".join(message_parts)
 
-    async def get_ai_response(self, user_message: str) -> str:
+    async def get_ai_response(self, user_message: str, on_delta=None, structured: bool = False) -> str:
         """
         Отправляет запрос к GPT и получает ответ.
+        Если передан on_delta, ответ запрашивается потоком и обработчик
+        вызывается с накопленным текстом после каждого фрагмента.
+        structured=True включает response_format API (если он настроен в json_parser).
         """
 
-        api_key = os.getenv("GPT_API_KEY")
-    
-        if not api_key:
+        if not self.llm_client or not self.llm_client.api_key:
             logging.error("GPT_API_KEY не установлена в переменных окружения.")
             return "Внутренняя ошибка: API ключ GPT не настроен."
-        
-        # Читаем базовый URL из GPT_BASE_URL (если не задан, используется дефолтный)
-        base_url = os.getenv("GPT_BASE_URL", "https://api.openai.com/v1")
 
-        # Читаем модель из переменной окружения; если не задана, используем дефолтную
-        gpt_model = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
-
-        client = AsyncOpenAI(
-            api_key=api_key,
-            base_url=base_url
+        # Клиент переиспользуется между запросами вместе с его пулом соединений
+        client = self.llm_client.get_client()
+
+        params = dict(
+            model=self.llm_client.model,
+            messages=[
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_message},
+            ],
+            max_tokens=5000,
+            temperature=0.7,
         )
+        if structured and self.json_parser:
+            response_format = self.json_parser.response_format()
+            if response_format:
+                params["response_format"] = response_format
 
         try:
-            completion = await client.chat.completions.create(
-                model=gpt_model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_message},
-                ],
-                max_tokens=5000,
-                temperature=0.7,
-            )
-            response_text = completion.choices[0].message.content
-            return response_text
+            # Общий предел одновременных запросов к LLM (GPT_MAX_CONCURRENT_REQUESTS)
+            async with self.llm_client.slot():
+                if on_delta is None:
+                    completion = await client.chat.completions.create(**params)
+                    response_text = completion.choices[0].message.content
+                    return response_text
+
+                response_text = ""
+                completion_stream = await client.chat.completions.create(stream=True, **params)
+                async for chunk in completion_stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        response_text += chunk.choices[0].delta.content
+                        on_delta(response_text)
+                return response_text
         except Exception as e:
             logging.error(f"Ошибка при обращении к GPT: {e}")
             return "Произошла ошибка при обработке вашего запроса."
@@ -532,9 +1322,105 @@ class AITelegramBot:
 
         return "Произошла ошибка при обработке ответа."
 
+    def create_webhook_app(self) -> web.Application:
+        """
+        Создаёт aiohttp-приложение, принимающее обновления Telegram по WEBHOOK_PATH.
+        Запрос подтверждается сразу (200), а обновление обрабатывается в фоне.
+        Запросы без правильного заголовка X-Telegram-Bot-Api-Secret-Token отклоняются.
+        """
+        app = web.Application()
+        SimpleRequestHandler(
+            dispatcher=self.dp,
+            bot=self.bot,
+            handle_in_background=True,
+            secret_token=self.webhook_secret or None,
+        ).register(app, path=self.webhook_path)
+        setup_application(app, self.dp, bot=self.bot)
+        return app
+
+    async def run_webhook(self):
+        """
+        Запускает HTTP-сервер для webhook и регистрирует адрес в Telegram (если задан WEBHOOK_URL).
+        """
+        if not self.webhook_secret:
+            logger.warning("WEBHOOK_SECRET не задан: запросы к webhook не проверяются")
+        runner = web.AppRunner(self.create_webhook_app())
+        await runner.setup()
+        try:
+            site = web.TCPSite(runner, self.webhook_host, self.webhook_port)
+            await site.start()
+            logger.info(f"Webhook слушает {self.webhook_host}:{self.webhook_port}{self.webhook_path}")
+            if self.webhook_url:
+                await self.bot.set_webhook(
+                    self.webhook_url.rstrip("/") + self.webhook_path,
+                    secret_token=self.webhook_secret or None,
+                )
+            # Сервер работает до SIGTERM/SIGINT
+            stop = asyncio.Event()
+            loop = asyncio.get_running_loop()
+            for sig in (signal.SIGTERM, signal.SIGINT):
+                loop.add_signal_handler(sig, stop.set)
+            await stop.wait()
+            logger.info("Получен сигнал остановки, webhook больше не принимает обновления")
+        finally:
+            await runner.cleanup()
+
     async def run(self):
-        # Запускаем бота (long-polling)
-        await self.dp.start_polling(self.bot)
+        # Запускаем бота: long-polling или webhook (BOT_MODE=webhook)
+        await self.startup()
+        try:
+            if self.mode == "webhook":
+                await self.run_webhook()
+            else:
+                # Polling останавливается по SIGTERM/SIGINT (обработчики ставит aiogram)
+                await self.dp.start_polling(self.bot, close_bot_session=False)
+        finally:
+            await self.shutdown()
+
+    async def startup(self):
+        """
+        Запускает инструменты в порядке их зависимостей и пишет отчёт о времени запуска.
+        """
+        started = time.perf_counter()
+        await tool_lifecycle.startup()
+        startup_report["tools_startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        self.report_startup()
+        self.agent_manager.warm_up()
+        if self.agent_watcher and self._reload_task is None:
+            self._reload_task = asyncio.ensure_future(self.agent_watcher.watch(self.reload_agents))
+
+    def report_startup(self) -> Dict[str, Any]:
+        """
+        Отчёт о холодном старте: время этапов (импорт, инструменты, агенты, запуск
+        инструментов) и сколько модулей агентов пришлось импортировать.
+        При STARTUP_REPORT_PATH отчёт дописывается в файл строкой JSON, чтобы следить за регрессиями.
+        """
+        report = {
+            "imports_ms": round((IMPORTS_DONE_AT - STARTED_AT) * 1000, 1),
+            **startup_report,
+            "total_ms": round((time.perf_counter() - STARTED_AT) * 1000, 1),
+        }
+        logger.info("Запуск: " + ", ".join(f"{key}={value}" for key, value in report.items()))
+        report_path = os.getenv("STARTUP_REPORT_PATH")
+        if report_path:
+            try:
+                with open(report_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({"time": time.time(), "pid": os.getpid(), **report}) + "\n")
+            except OSError as e:
+                logger.warning(f"Не удалось записать отчёт о запуске в {report_path}: {e}")
+        return report
+
+    async def shutdown(self):
+        """
+        Останавливает инструменты в обратном порядке: сначала очередь сообщений
+        дорабатывает принятые (не дольше ADMISSION_DRAIN_TIMEOUT), затем закрываются пулы.
+        """
+        if self._reload_task:
+            self._reload_task.cancel()
+            self._reload_task = None
+        await tool_lifecycle.shutdown()
+        self.agent_manager.executor.shutdown()
+        await self.bot.session.close()
 
 # --------------------- Точка входа ---------------------
 async def main():
@@ -549,6 +1435,13 @@ async def main():
         logging.error("Переменная окружения TELEGRAM_BOT_TOKEN не установлена!")
         raise ValueError("Переменная окружения TELEGRAM_BOT_TOKEN не установлена!")
 
+    # При BOT_WORKERS > 1 обновления распределяются по процессам-воркерам
+    workers = int(os.getenv("BOT_WORKERS", "1"))
+    if workers > 1:
+        from supervisor import run_supervisor
+        await run_supervisor(telegram_token, workers)
+        return
+
     # Загружаем инструменты
     tools = load_tools()
 
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Офлайн-перебалансировка базы бота между раскладками шардов (DATABASE_SHARDS).
+Бот должен быть остановлен. Данные копируются в новые файлы (число шардов входит
+в их имя), проверяются и только потом становятся на место; исходные файлы остаются,
+пока не указан --delete-source (и удаляются, только когда все новые файлы на месте и повторно
+проверены).
+
+    python rebalance_shards.py --to 4                # один файл → 4 шарда
+    python rebalance_shards.py --from 4 --to 8       # 4 шарда → 8
+    python rebalance_shards.py --from 4 --to 1       # обратно в один файл
+
+После переноса запустите бота с DATABASE_SHARDS, равным --to.
+"""
+
+import argparse
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+
+from tools.database import Database, UPSERT_USER_SQL, shard_index, shard_paths
+
+# Сколько строк памяти читается и записывается за раз
+CHUNK_SIZE = 10000
+
+
+def _remove(path: str):
+    for file_path in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+
+def _count_rows(paths: List[str], table: str) -> int:
+    total = 0
+    for path in paths:
+        connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            total += connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        finally:
+            connection.close()
+    return total
+
+
+def rebalance(db_path: str, from_shards: int, to_shards: int, delete_source: bool = False) -> Dict[str, Any]:
+    """
+    Переносит пользователей, память, напоминания и кэш ответов LLM из from_shards файлов в to_shards.
+    Возвращает отчёт: сколько строк попало в каждый новый шард и время переноса.
+    """
+    started = time.perf_counter()
+    sources = shard_paths(db_path, from_shards)
+    targets = shard_paths(db_path, to_shards)
+    if sources == targets:
+        raise ValueError("Исходная и новая раскладки совпадают")
+    missing = [path for path in sources if not os.path.exists(path)]
+    if missing:
+        raise FileNotFoundError(f"Нет файлов исходной раскладки: {', '.join(missing)}")
+    existing = [path for path in targets if os.path.exists(path)]
+    if existing:
+        raise FileExistsError(f"Файлы новой раскладки уже существуют: {', '.join(existing)}")
+
+    # Новые шарды собираются во временных файлах: прерванный перенос не оставляет полуготовую раскладку
+    temporary = [path + ".rebalance" for path in targets]
+    for path in temporary:
+        _remove(path)
+    outputs: List[Database] = [Database(path) for path in temporary]
+    report: Dict[str, Any] = {"users": [0] * to_shards, "memory": [0] * to_shards, "reminders": [0] * to_shards}
+    source_totals = {"users": 0, "memory": 0, "reminders": 0}
+
+    try:
+        for source_path in sources:
+            # Исходный файл открывается как рабочий: при необходимости его схема обновляется до текущей
+            source = Database(source_path)
+            try:
+                users: List[List[tuple]] = [[] for _ in range(to_shards)]
+                for row in source.cursor.execute("SELECT * FROM users").fetchall():
+                    users[shard_index(row[0], to_shards)].append(row)
+                for index, rows in enumerate(users):
+                    with outputs[index].connection:
+                        outputs[index].cursor.executemany(UPSERT_USER_SQL, rows)
+                    report["users"][index] += len(rows)
+                    source_totals["users"] += len(rows)
+
+                # Память копируется по порядку id: порядок записей пользователя сохраняется
+                cursor = source.connection.execute(
+                    "SELECT user_id, context, timestamp, digest FROM memory ORDER BY id"
+                )
+                while True:
+                    chunk = cursor.fetchmany(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    memory: List[List[tuple]] = [[] for _ in range(to_shards)]
+                    for row in chunk:
+                        memory[shard_index(row[0], to_shards)].append(row)
+                    for index, rows in enumerate(memory):
+                        if rows:
+                            with outputs[index].connection:
+                                outputs[index].cursor.executemany(
+                                    "INSERT INTO memory (user_id, context, timestamp, digest) VALUES (?, ?, ?, ?)", rows
+                                )
+                        report["memory"][index] += len(rows)
+                    source_totals["memory"] += len(chunk)
+
+                # Напоминания живут в шарде своего пользователя; id назначаются заново
+                reminders: List[List[tuple]] = [[] for _ in range(to_shards)]
+                for row in source.cursor.execute(
+                    "SELECT user_id, time, timezone, description, next_fire_at, created_at FROM reminders ORDER BY id"
+                ).fetchall():
+                    reminders[shard_index(row[0], to_shards)].append(row)
+                for index, rows in enumerate(reminders):
+                    if rows:
+                        with outputs[index].connection:
+                            outputs[index].cursor.executemany(
+                                "INSERT INTO reminders (user_id, time, timezone, description, next_fire_at, created_at) "
+                                "VALUES (?, ?, ?, ?, ?, ?)", rows
+                            )
+                    report["reminders"][index] += len(rows)
+                    source_totals["reminders"] += len(rows)
+
+                # Кэш ответов LLM не привязан к пользователю и живёт в шарде 0
+                cache = source.cursor.execute(
+                    "SELECT cache_key, scope, normalized, response, created_at FROM llm_cache"
+                ).fetchall()
+                with outputs[0].connection:
+                    outputs[0].cursor.executemany(
+                        "INSERT OR REPLACE INTO llm_cache (cache_key, scope, normalized, response, created_at) "
+                        "VALUES (?, ?, ?, ?, ?)", cache
+                    )
+            finally:
+                source.close()
+
+        # Проверка: в новых шардах столько же строк, сколько было в исходных
+        for key, table in (("users", "users"), ("memory", "memory"), ("reminders", "reminders")):
+            copied = sum(db.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for db in outputs)
+            if copied != source_totals[key]:
+                raise RuntimeError(f"Перенесено {copied} строк {table} из {source_totals[key]}")
+    except Exception:
+        for db, path in zip(outputs, temporary):
+            db.close()
+            _remove(path)
+        raise
+
+    # Закрытие переносит WAL в основной файл, после чего файлы можно переименовать
+    for db in outputs:
+        db.close()
+    # Исходные файлы удаляются последними — только когда все новые шарды на месте и полны
+    try:
+        for tmp_path, path in zip(temporary, targets):
+            os.replace(tmp_path, path)
+        for key, table in (("users", "users"), ("memory", "memory"), ("reminders", "reminders")):
+            placed = _count_rows(targets, table)
+            if placed != source_totals[key]:
+                raise RuntimeError(f"В новой раскладке {placed} строк {table} из {source_totals[key]}")
+    except Exception:
+        # Новой раскладки до переноса не было — убираем её целиком, повторный запуск начнётся с нуля
+        for path in targets + temporary:
+            _remove(path)
+        raise
+    if delete_source:
+        for path in sources:
+            _remove(path)
+
+    report["duration_s"] = round(time.perf_counter() - started, 2)
+    return report
+
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=os.getenv("DATABASE_PATH", "bot_database.db"))
+    parser.add_argument("--from", dest="from_shards", type=int, default=int(os.getenv("DATABASE_SHARDS", "1")))
+    parser.add_argument("--to", dest="to_shards", type=int, required=True)
+    parser.add_argument("--delete-source", action="store_true", help="удалить файлы исходной раскладки")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+
+    report = rebalance(args.path, args.from_shards, args.to_shards, args.delete_source)
+    for index, path in enumerate(shard_paths(args.path, args.to_shards)):
+        print(f"{path}: пользователей {report['users'][index]}, записей памяти {report['memory'][index]}, "
+              f"напоминаний {report['reminders'][index]}")
+    print(f"Готово за {report['duration_s']} с. Запускайте бота с DATABASE_SHARDS={args.to_shards}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import asyncio
+import logging
+import os
+import queue
+import secrets
+import signal
+import threading
+import time
+import zlib
+import multiprocessing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Процессы запускаются через spawn: воркер не наследует цикл событий и соединения ингеста
+_mp = multiprocessing.get_context("spawn")
+
+
+def update_chat_id(update: Dict[str, Any]) -> Optional[int]:
+    """
+    Достаёт id чата из обновления Telegram (сообщение, правка, callback и т.п.).
+    """
+    for key, value in update.items():
+        if not isinstance(value, dict):
+            continue
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+        user = value.get("from") or value.get("user")
+        if isinstance(user, dict) and "id" in user:
+            return user["id"]
+    return None
+
+
+def run_worker(index: int, updates, token: str):
+    """
+    Точка входа процесса-воркера: свои инструменты, AgentManager и цикл событий.
+    """
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'%(asctime)s - worker {index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    # Ctrl+C получает вся группа процессов — останавливает воркеров супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    # По номеру инструменты выбирают процесс для общих фоновых задач (хранение памяти)
+    os.environ["BOT_WORKER_INDEX"] = str(index)
+    asyncio.run(_worker_main(index, updates, token))
+
+
+async def _worker_main(index: int, updates, token: str):
+    from main import AITelegramBot, load_tools
+
+    bot_app = AITelegramBot(token=token, tools=load_tools())
+    await bot_app.startup()
+    loop = asyncio.get_running_loop()
+    logger.info(f"Воркер {index} запущен (pid {os.getpid()})")
+    try:
+        while True:
+            try:
+                data = await loop.run_in_executor(None, updates.recv)
+            except EOFError:
+                break
+            if data is None:
+                break
+            try:
+                # Обновления подаются по одному, поэтому порядок в чате сохраняется
+                await bot_app.dp.feed_raw_update(bot_app.bot, data)
+            except Exception as e:
+                logger.error(f"Воркер {index}: ошибка при обработке обновления: {e}")
+    finally:
+        await bot_app.shutdown()
+        logger.info(f"Воркер {index} остановлен")
+
+
+class Supervisor:
+    """
+    Запускает N процессов-воркеров и распределяет между ними обновления
+    по хешу chat_id: все сообщения одного чата попадают в один воркер и
+    обрабатываются по порядку. Упавший воркер перезапускается,
+    при остановке воркеры дорабатывают полученные обновления.
+
+    У каждого воркера свой канал (Pipe) с единственным читателем: в отличие от
+    multiprocessing.Queue, в нём нет общих блокировок, которые убитый воркер
+    мог бы унести с собой. Обновления пишет в канал отдельный поток, поэтому
+    медленный воркер не блокирует цикл событий ингеста.
+    """
+
+    def __init__(self, workers: int, target: Callable = run_worker, args: Tuple = ()):
+        self.workers = workers
+        self.target = target
+        self.args = args
+        # Обновления, ещё не переданные воркеру, хранятся здесь и переживают его перезапуск
+        self.outboxes: List["queue.Queue"] = [queue.Queue() for _ in range(workers)]
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self._connections: List[Any] = [None] * workers
+        self._writers: List[Optional[threading.Thread]] = [None] * workers
+        self.stopping = False
+        self.stats = {"routed": 0, "restarts": 0}
+
+    def _spawn(self, index: int):
+        reader, writer = _mp.Pipe(duplex=False)
+        process = _mp.Process(
+            target=self.target, args=(index, reader) + self.args,
+            name=f"ngrambot-worker-{index}", daemon=False
+        )
+        process.start()
+        # Копия читающего конца есть у воркера; закрываем свою, чтобы смерть воркера давала BrokenPipeError
+        reader.close()
+        old, self._connections[index] = self._connections[index], writer
+        self.processes[index] = process
+        if old is not None:
+            old.close()
+
+    def _write(self, index: int):
+        """
+        Поток-писатель: передаёт обновления воркеру по порядку; если воркер
+        умер, ждёт перезапуска и повторяет отправку.
+        """
+        outbox = self.outboxes[index]
+        while True:
+            item = outbox.get()
+            while True:
+                connection = self._connections[index]
+                try:
+                    connection.send(item)
+                    break
+                except (BrokenPipeError, EOFError, OSError):
+                    if self.stopping:
+                        return
+                    time.sleep(0.1)
+            if item is None:
+                return
+
+    def start(self):
+        for index in range(self.workers):
+            self._spawn(index)
+            writer = threading.Thread(target=self._write, args=(index,), name=f"ngrambot-writer-{index}", daemon=True)
+            writer.start()
+            self._writers[index] = writer
+        logger.info(f"Запущено воркеров: {self.workers}")
+
+    def shard(self, chat_id: Any) -> int:
+        """
+        Номер воркера для чата (стабилен между перезапусками).
+        """
+        return zlib.crc32(str(chat_id).encode("utf-8")) % self.workers
+
+    def route(self, update: Dict[str, Any]):
+        """
+        Передаёт обновление воркеру, отвечающему за его чат.
+        """
+        chat_id = update_chat_id(update)
+        key = chat_id if chat_id is not None else update.get("update_id", 0)
+        self.outboxes[self.shard(key)].put(update)
+        self.stats["routed"] += 1
+
+    def check_workers(self):
+        """
+        Перезапускает воркеров, завершившихся без команды на остановку.
+        """
+        if self.stopping:
+            return
+        for index, process in enumerate(self.processes):
+            if process is not None and not process.is_alive():
+                logger.error(f"Воркер {index} завершился с кодом {process.exitcode}, перезапускаем")
+                process.join()
+                self.stats["restarts"] += 1
+                self._spawn(index)
+
+    async def monitor(self, interval: float = 1.0):
+        while not self.stopping:
+            self.check_workers()
+            await asyncio.sleep(interval)
+
+    async def stop(self, timeout: float = 30.0):
+        """
+        Останавливает воркеров: каждый дорабатывает очередь и выходит.
+        Не успевшие за timeout секунд завершаются принудительно.
+        """
+        self.stopping = True
+        for outbox in self.outboxes:
+            outbox.put(None)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        for index, process in enumerate(self.processes):
+            if process is None:
+                continue
+            await loop.run_in_executor(None, process.join, max(0.0, deadline - loop.time()))
+            if process.is_alive():
+                logger.warning(f"Воркер {index} не завершился за {timeout} с, останавливаем принудительно")
+                process.terminate()
+                process.join()
+        for connection in self._connections:
+            if connection is not None:
+                connection.close()
+        logger.info("Все воркеры остановлены")
+
+
+async def _poll_updates(bot, supervisor: Supervisor, stop: asyncio.Event):
+    """
+    Получает обновления long polling и передаёт их воркерам.
+    """
+    offset = None
+    timeout = int(os.getenv("POLLING_TIMEOUT", "30"))
+    while not stop.is_set():
+        poll = asyncio.ensure_future(bot.get_updates(offset=offset, timeout=timeout))
+        stopped = asyncio.ensure_future(stop.wait())
+        await asyncio.wait({poll, stopped}, return_when=asyncio.FIRST_COMPLETED)
+        stopped.cancel()
+        if not poll.done():
+            poll.cancel()
+            break
+        try:
+            updates = poll.result()
+        except Exception as e:
+            logger.error(f"Ошибка при получении обновлений: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            supervisor.route(update.model_dump(mode="json", exclude_none=True))
+
+
+def create_ingest_app(supervisor: Supervisor, path: str, secret: str) -> web.Application:
+    """
+    aiohttp-приложение webhook для супервизора: проверяет секрет,
+    сразу отвечает 200 и передаёт обновление воркеру.
+    """
+    async def handle(request: web.Request) -> web.Response:
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if secret and not secrets.compare_digest(token, secret):
+            return web.Response(status=401, text="Unauthorized")
+        supervisor.route(await request.json())
+        return web.json_response({})
+
+    app = web.Application()
+    app.router.add_post(path, handle)
+    return app
+
+
+async def run_supervisor(token: str, workers: int):
+    """
+    Режим супервизора: ингест обновлений (polling или webhook, как в BOT_MODE)
+    в этом процессе и обработка в workers процессах-воркерах.
+    """
+    from aiogram import Bot
+
+    supervisor = Supervisor(workers, args=(token,))
+    supervisor.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    monitor = asyncio.ensure_future(supervisor.monitor())
+    bot = Bot(token=token)
+    runner = None
+    try:
+        if os.getenv("BOT_MODE", "polling").lower() == "webhook":
+            path = os.getenv("WEBHOOK_PATH", "/webhook")
+            secret = os.getenv("WEBHOOK_SECRET", "")
+            runner = web.AppRunner(create_ingest_app(supervisor, path, secret))
+            await runner.setup()
+            await web.TCPSite(runner, os.getenv("WEBHOOK_HOST", "0.0.0.0"), int(os.getenv("WEBHOOK_PORT", "8080"))).start()
+            webhook_url = os.getenv("WEBHOOK_URL", "")
+            if webhook_url:
+                await bot.set_webhook(webhook_url.rstrip("/") + path, secret_token=secret or None)
+            await stop.wait()
+        else:
+            await bot.delete_webhook()
+            await _poll_updates(bot, supervisor, stop)
+    finally:
+        logger.info("Остановка: прекращаем приём обновлений и ждём воркеров")
+        if runner is not None:
+            await runner.cleanup()
+        monitor.cancel()
+        await supervisor.stop(float(os.getenv("SUPERVISOR_DRAIN_TIMEOUT", "30")))
+        await bot.session.close()
@@ -0,0 +1,99 @@
+# tests/test_admission.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.admission import AdmissionController
+
+
+def make_controller(max_active=2, max_backlog=10, max_per_user=10):
+    controller = AdmissionController()
+    controller.max_active = max_active
+    controller.max_backlog = max_backlog
+    controller.max_per_user = max_per_user
+    return controller
+
+
+def job(log, name, delay=0.01):
+    async def run():
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+    return run
+
+
+@pytest.mark.asyncio
+async def test_messages_of_one_chat_run_in_order():
+    log = []
+    controller = make_controller(max_active=4)
+    for i in range(3):
+        assert controller.submit("chat", "user", job(log, i))
+    await controller.drain()
+
+    # Следующее сообщение чата начинается только после завершения предыдущего
+    assert log == [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert controller.stats["completed"] == 3
+    assert controller.pending == 0 and controller.active == 0
+
+
+@pytest.mark.asyncio
+async def test_users_are_served_round_robin():
+    log = []
+    controller = make_controller(max_active=1)
+    for i in range(3):
+        controller.submit(f"spam{i}", "spammer", job(log, f"spam{i}"))
+    controller.submit("quiet", "quiet", job(log, "quiet"))
+    await controller.drain()
+
+    starts = [name for event, name in log if event == "start"]
+    assert starts.index("quiet") == 1
+    assert controller.stats["max_wait"] > 0
+
+
+@pytest.mark.asyncio
+async def test_backlog_is_bounded():
+    log = []
+    controller = make_controller(max_active=1, max_backlog=3, max_per_user=2)
+    assert controller.submit("a", "u1", job(log, "a1"))   # сразу запускается
+    assert controller.submit("a", "u1", job(log, "a2"))
+    assert controller.submit("a", "u1", job(log, "a3"))
+    assert not controller.submit("a", "u1", job(log, "a4"))   # предел пользователя
+    assert controller.submit("b", "u2", job(log, "b1"))
+    assert not controller.submit("c", "u3", job(log, "c1"))   # общий предел очереди
+    await controller.drain()
+
+    assert controller.stats["rejected"] == 2
+    assert len([event for event, _ in log if event == "end"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_drain_finishes_accepted_and_rejects_new():
+    controller = make_controller(max_active=1)
+    log = []
+    for name in ("a", "b"):
+        assert controller.submit(1, 1, job(log, name))
+
+    await controller.drain(timeout=1)
+    assert [entry for entry in log if entry[0] == "end"] == [("end", "a"), ("end", "b")]
+    assert not controller.submit(1, 1, job(log, "c"))
+
+
+@pytest.mark.asyncio
+async def test_drain_cancels_after_deadline():
+    controller = make_controller(max_active=1)
+    log = []
+    controller.submit(1, 1, job(log, "slow", delay=10))
+    controller.submit(1, 1, job(log, "queued"))
+
+    start = asyncio.get_running_loop().time()
+    await controller.drain(timeout=0.1)
+    assert asyncio.get_running_loop().time() - start < 1
+    assert log == [("start", "slow")]
+    assert controller.pending == 0 and not controller._tasks
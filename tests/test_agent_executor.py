@@ -0,0 +1,252 @@
+# tests/test_agent_executor.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from main import AgentManager
+
+
+class SleepyAgent:
+    def __init__(self, name: str, delay: float, log: list, max_concurrency=None):
+        self.name = name
+        self.delay = delay
+        self.log = log
+        self.max_concurrency = max_concurrency
+        self.active = 0
+        self.peak = 0
+
+    def get_name(self):
+        return self.name
+
+    def get_description(self):
+        return self.name
+
+    async def handle(self, args, message):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        self.log.append(("start", self.name, args))
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.log.append(("end", self.name, args))
+        if args == "fail":
+            raise RuntimeError("boom")
+        return f"{self.name}:{args}"
+
+
+def make_manager(*agents):
+    manager = AgentManager(tools={})
+    for agent in agents:
+        manager.register_agent(agent)
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_independent_calls_run_concurrently():
+    log = []
+    manager = make_manager(SleepyAgent("weather", 0.2, log), SleepyAgent("translate", 0.2, log))
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    results = await manager.execute_calls(
+        [{"agent": "weather", "args": "Moscow"}, {"agent": "/translate", "args": "en hi"}], None
+    )
+    assert loop.time() - started < 0.35
+    assert results == {"weather": "weather:Moscow", "translate": "translate:en hi"}
+    assert list(results) == ["weather", "translate"]
+
+
+@pytest.mark.asyncio
+async def test_depends_on_orders_calls_and_propagates_failures():
+    log = []
+    manager = make_manager(SleepyAgent("memory", 0.05, log), SleepyAgent("weather", 0.01, log))
+
+    results = await manager.execute_calls(
+        [
+            {"agent": "weather", "args": "Moscow", "depends_on": "memory"},
+            {"agent": "memory", "args": "fail"},
+            {"agent": "unknown", "args": ""},
+        ],
+        None,
+    )
+    assert "weather_error" in results and "зависимость" in results["weather_error"]
+    assert "memory_error" in results
+    assert results["unknown_error"] == "Агент 'unknown' не найден"
+    assert ("start", "weather", "Moscow") not in log
+
+    log.clear()
+    results = await manager.execute_calls(
+        [{"agent": "weather", "args": "Moscow", "depends_on": [1]}, {"agent": "memory", "args": "save x"}], None
+    )
+    assert results == {"weather": "weather:Moscow", "memory": "memory:save x"}
+    assert log.index(("end", "memory", "save x")) < log.index(("start", "weather", "Moscow"))
+
+
+@pytest.mark.asyncio
+async def test_cycles_and_concurrency_caps():
+    log = []
+    capped = SleepyAgent("weather", 0.02, log, max_concurrency=2)
+    manager = make_manager(capped, SleepyAgent("memory", 0.01, log))
+
+    results = await manager.execute_calls(
+        [
+            {"agent": "weather", "args": "a", "id": "x", "depends_on": "y"},
+            {"agent": "memory", "args": "b", "id": "y", "depends_on": "x"},
+        ],
+        None,
+    )
+    assert set(results) == {"weather_error", "memory_error"}
+
+    await manager.execute_calls([{"agent": "weather", "args": str(i)} for i in range(6)], None)
+    assert capped.peak == 2
+
+
+class CountingAgent(SleepyAgent):
+    cache_ttl = 60
+    cache_per_user = False
+
+    def cache_key(self, args, message):
+        return args.lower()
+
+    def should_cache_result(self, result):
+        return not result.endswith(":bad")
+
+
+@pytest.mark.asyncio
+async def test_result_cache_hits_and_skips_errors():
+    log = []
+    agent = CountingAgent("weather", 0, log)
+    manager = make_manager(agent, SleepyAgent("memory", 0, log))
+
+    await manager.execute_calls([{"agent": "weather", "args": "Moscow"}], None)
+    results = await manager.execute_calls([{"agent": "weather", "args": "MOSCOW"}], None)
+    assert results == {"weather": "weather:Moscow"}
+    assert manager.cache_stats == {"hits": 1, "misses": 1}
+
+    for _ in range(2):
+        await manager.execute_calls([{"agent": "weather", "args": "bad"}], None)
+        await manager.execute_calls([{"agent": "memory", "args": "get"}], None)
+    assert [entry for entry in log if entry[0] == "start"].count(("start", "weather", "bad")) == 2
+    assert [entry for entry in log if entry[0] == "start"].count(("start", "memory", "get")) == 2
+    assert manager.cache_stats == {"hits": 1, "misses": 3}
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_calls_are_coalesced():
+    log = []
+    agent = CountingAgent("weather", 0.05, log)
+    manager = make_manager(agent)
+
+    results = await asyncio.gather(*(
+        manager.call_agent("weather", "Moscow", None) for _ in range(5)
+    ))
+    assert results == [(True, "weather:Moscow")] * 5
+    assert log.count(("start", "weather", "Moscow")) == 1
+    assert manager.single_flight.stats == {"calls": 1, "coalesced": 4}
+    assert len(manager.single_flight) == 0
+
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_exceptions():
+    from tools._singleflight import SingleFlight
+
+    flight = SingleFlight()
+    calls = []
+
+    async def failing():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    outcomes = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+    assert len(calls) == 1
+    assert all(isinstance(outcome, RuntimeError) for outcome in outcomes)
+
+    await asyncio.gather(*(flight.do("key", failing) for _ in range(2)), return_exceptions=True)
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_duplicate_calls_and_memo_across_batches():
+    log = []
+    weather = SleepyAgent("weather", 0.01, log)
+    memory = SleepyAgent("memory", 0.01, log)
+    memory.stateful = True
+    manager = make_manager(weather, memory)
+    memo = {}
+
+    batch = manager.start_batch(None, memo)
+    for call in [{"agent": "weather", "args": "Moscow"}] * 3 + [{"agent": "memory", "args": "get"}]:
+        batch.submit(call)
+    assert await batch.results() == {"weather": "weather:Moscow", "memory": "memory:get"}
+    assert batch.avoided == 2
+    assert log.count(("start", "weather", "Moscow")) == 1
+
+    # Следующая итерация того же запроса: повтор берётся из memo
+    batch = manager.start_batch(None, memo)
+    batch.submit({"agent": "weather", "args": "Moscow"})
+    batch.submit({"agent": "memory", "args": "save x"})
+    await batch.results()
+    assert batch.avoided == 1
+    assert log.count(("start", "weather", "Moscow")) == 1
+
+    # memory save изменил состояние — memory get выполняется заново
+    await manager.execute_calls([{"agent": "memory", "args": "get"}], None, memo)
+    assert log.count(("start", "memory", "get")) == 2
+
+
+class BufferedMemoryAgent:
+    """
+    Как memory с групповой фиксацией: запись видна только после окна пакета, чтение — сразу.
+    """
+
+    stateful = True
+
+    def __init__(self):
+        self.saved = []
+
+    def get_name(self):
+        return "memory"
+
+    def get_description(self):
+        return "memory"
+
+    async def handle(self, args, message):
+        command, _, text = args.partition(" ")
+        if command == "save":
+            await asyncio.sleep(0.05)
+            self.saved.append(text)
+            return "сохранено"
+        return ", ".join(self.saved) or "пусто"
+
+
+@pytest.mark.asyncio
+async def test_stateful_agent_calls_keep_plan_order():
+    memory = BufferedMemoryAgent()
+    log = []
+    manager = make_manager(memory, SleepyAgent("weather", 0.05, log))
+
+    batch = manager.start_batch(None)
+    for call in [
+        {"agent": "memory", "args": "get"},
+        {"agent": "memory", "args": "save x"},
+        {"agent": "weather", "args": "Moscow"},
+        {"agent": "memory", "args": "get"},
+    ]:
+        batch.submit(call)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await batch.results()
+    outcomes = [future.result() for future in batch._futures]
+
+    # Второй get не совпадает с первым: между ними память изменилась
+    assert outcomes[0] == (True, "пусто") and outcomes[3] == (True, "x")
+    assert batch.duplicates == []
+    # Агенты без состояния не ждут очереди memory
+    assert ("end", "weather", "Moscow") in log and loop.time() - started < 0.2
@@ -0,0 +1,77 @@
+# tests/test_agent_manifest.py
+
+import os
+import sys
+import uuid
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from main import AgentManager, agent_module_name, load_agents, startup_report
+
+AGENT_SOURCE = '''
+from agents.base_agent import BaseAgent
+
+class EchoAgent(BaseAgent):
+    def get_name(self):
+        return "echo"
+
+    def get_description(self):
+        return "{description}"
+
+    async def handle(self, args, message):
+        return "echo: " + args
+'''
+
+
+def write_agent(folder, module_name, description):
+    path = folder / f"{module_name}.py"
+    path.write_text(AGENT_SOURCE.format(description=description), encoding="utf-8")
+    return path
+
+
+def load(folder, manifest_path):
+    manager = AgentManager(tools={})
+    load_agents(manager, folders=[str(folder)], manifest_path=str(manifest_path))
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_manifest_hit_defers_import_until_first_use(tmp_path):
+    file_name = f"echo_agent_{uuid.uuid4().hex}"
+    write_agent(tmp_path, file_name, "Повторяет текст")
+    module_name = agent_module_name(str(tmp_path), file_name)
+    manifest_path = tmp_path / "manifest.json"
+
+    manager = load(tmp_path, manifest_path)
+    assert startup_report["manifest_misses"] == 1
+    assert module_name in sys.modules
+
+    # Новый процесс: модуля ещё нет, имя и описание берутся из манифеста
+    del sys.modules[module_name]
+    manager = load(tmp_path, manifest_path)
+    assert startup_report["manifest_hits"] == 1
+    assert startup_report["agent_modules_imported"] == 0
+    assert manager.get_agents_info() == [{"name": "echo", "description": "Повторяет текст"}]
+    assert module_name not in sys.modules
+
+    assert await manager.command_map["echo"].handle("привет", None) == "echo: привет"
+    assert module_name in sys.modules
+
+
+def test_changed_file_invalidates_manifest(tmp_path):
+    file_name = f"echo_agent_{uuid.uuid4().hex}"
+    path = write_agent(tmp_path, file_name, "Старое описание")
+    module_name = agent_module_name(str(tmp_path), file_name)
+    manifest_path = tmp_path / "manifest.json"
+    load(tmp_path, manifest_path)
+
+    write_agent(tmp_path, file_name, "Новое описание агента")
+    os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 1_000_000))
+    del sys.modules[module_name]
+    manager = load(tmp_path, manifest_path)
+    assert startup_report["manifest_misses"] == 1
+    assert manager.get_agents_info()[0]["description"] == "Новое описание агента"
@@ -0,0 +1,157 @@
+# tests/test_agent_pool.py
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+
+import pytest
+from aiogram.types import Message
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from main import AgentManager, agent_module_name, load_agents
+
+AGENT_SOURCE = '''
+import os
+import time
+from agents.base_agent import BaseAgent
+
+class PoolAgent(BaseAgent):
+    execution = "{execution}"
+    timeout = 1
+
+    def get_name(self):
+        return "pool"
+
+    def get_description(self):
+        return "Тестовый агент"
+
+    async def handle(self, args, message):
+        if args == "spin":
+            while True:
+                pass
+        if args == "sleep":
+            time.sleep(0.3)
+        return f"{{os.getpid()}}:{{message.text if message else ''}}"
+'''
+
+MESSAGE = Message.model_validate({
+    "message_id": 1,
+    "date": 1700000000,
+    "chat": {"id": 42, "type": "private"},
+    "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+    "text": "привет",
+})
+
+
+def make_manager(tmp_path, execution):
+    path = tmp_path / f"pool_agent_{uuid.uuid4().hex}.py"
+    path.write_text(AGENT_SOURCE.format(execution=execution), encoding="utf-8")
+    manager = AgentManager(tools={})
+    load_agents(manager, folders=[str(tmp_path)], manifest_path=str(tmp_path / "manifest.json"))
+    return manager
+
+
+@pytest.mark.asyncio
+async def test_process_agent_runs_in_worker_with_message_snapshot(tmp_path):
+    manager = make_manager(tmp_path, "process")
+    manager.executor.process_workers = 1
+    try:
+        ok, result = await manager.call_agent("pool", "", MESSAGE)
+        assert ok
+        pid, text = result.split(":")
+        assert int(pid) != os.getpid() and text == "привет"
+
+        # Зациклившийся вызов прерывается, а воркер остаётся в пуле
+        ok, error = await manager.call_agent("pool", "spin", MESSAGE)
+        assert not ok and "лимит" in error
+        assert await manager.handle_command("pool", "", MESSAGE) == result
+        assert manager.executor.stats["timeouts"] == 1
+    finally:
+        manager.executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_process_workers_are_recycled(tmp_path):
+    manager = make_manager(tmp_path, "process")
+    manager.executor.process_workers = 1
+    manager.executor.max_tasks = 1
+    try:
+        first = await manager.handle_command("pool", "", None)
+        second = await manager.handle_command("pool", "", None)
+        assert first.split(":")[0] != second.split(":")[0]
+        assert manager.executor.stats["recycled"] == 1
+    finally:
+        manager.executor.shutdown()
+
+
+COMPUTED_SOURCE = '''
+from agents.base_agent import BaseAgent
+
+NAME = "computed"
+
+class ComputedAgent(BaseAgent):
+    execution = "process"
+    cacheable = False
+    cache_ttl = 30
+
+    def get_name(self):
+        return NAME
+
+    def get_description(self):
+        return "Имя вычисляется при импорте"
+
+    async def handle(self, args, message):
+        return args.upper()
+'''
+
+
+@pytest.mark.asyncio
+async def test_process_agents_are_never_imported_in_bot_process(tmp_path):
+    literal = tmp_path / f"pool_agent_{uuid.uuid4().hex}.py"
+    literal.write_text(AGENT_SOURCE.format(execution="process"), encoding="utf-8")
+    # get_name не литерал — описание строится в отдельном процессе
+    computed = tmp_path / f"computed_agent_{uuid.uuid4().hex}.py"
+    computed.write_text(COMPUTED_SOURCE, encoding="utf-8")
+    module_names = [agent_module_name(str(tmp_path), path.stem) for path in (literal, computed)]
+
+    manager = AgentManager(tools={})
+    load_agents(manager, folders=[str(tmp_path)], manifest_path=str(tmp_path / "manifest.json"))
+    manager.executor.process_workers = 1
+    try:
+        agent = manager.command_map["computed"]
+        assert (agent.execution, agent.cacheable, agent.stateful, agent.cache_ttl) == ("process", False, False, 30)
+        assert await manager.call_agent("computed", "abc", MESSAGE) == (True, "ABC")
+        # Результат кэшируется по ключу BaseAgent, без загрузки агента
+        assert await manager.call_agent("computed", "abc", MESSAGE) == (True, "ABC")
+        assert manager.cache_stats["hits"] == 1
+        assert (await manager.call_agent("pool", "", MESSAGE))[0]
+        assert not any(name in sys.modules for name in module_names)
+        with pytest.raises(RuntimeError):
+            agent.load()
+    finally:
+        manager.executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_thread_agent_does_not_block_event_loop(tmp_path):
+    manager = make_manager(tmp_path, "thread")
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.02)
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        result = await manager.handle_command("pool", "sleep", MESSAGE)
+    finally:
+        task.cancel()
+        manager.executor.shutdown()
+    assert result == f"{os.getpid()}:привет"
+    assert len(ticks) >= 5
@@ -0,0 +1,198 @@
+# tests/test_database.py
+
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from agents.memory_agent import MemoryAgent
+from tools.database import AsyncDatabase, Database
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "bot.db"))
+    await db.connect()
+    yield db
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_round_trip_and_wal(database):
+    await database.add_or_update_user(1, reminder_time="09:00", reminder_description="зарядка", timezone="UTC")
+    assert (await database.get_user_data(1))["reminder_time"] == "09:00"
+    assert await database.save_memory(1, "первая")
+    assert await database.save_memory(1, "вторая")
+    assert sorted(await database.get_memory(1)) == ["вторая", "первая"]
+    assert await database.clear_memory(1)
+    assert await database.get_memory(1) == []
+    assert await database.delete_user(1)
+    assert await database.get_user(1) is None
+
+    with sqlite3.connect(database.db_path) as connection:
+        assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_first_calls_wait_for_schema(tmp_path, monkeypatch):
+    # Таблицы создаются медленно: запросы, пришедшие в это время, должны дождаться схемы
+    setup_tables = Database.setup_tables
+
+    def slow_setup_tables(self):
+        time.sleep(0.2)
+        setup_tables(self)
+
+    monkeypatch.setattr(Database, "setup_tables", slow_setup_tables)
+    # Без явного connect: первые запросы приходят одновременно, чтения — раньше записей
+    db = AsyncDatabase(str(tmp_path / "fresh.db"))
+    try:
+        results = await asyncio.gather(
+            db.get_memory(1), db.get_user_data(2), db.connect(), db.save_memory(1, "первая"), db.get_memory(3)
+        )
+        assert results[0] == [] and results[1] is None and results[3] is True
+        assert await db.get_memory(1) == ["первая"]
+    finally:
+        await db.close()
+
+
+@pytest.mark.asyncio
+async def test_writes_and_reads_run_off_the_event_loop(database):
+    current = lambda db: threading.current_thread().name
+    assert (await database._write(current)).startswith("db-writer")
+    assert (await database._read(current)).startswith("db-reader")
+
+    # Медленный запрос в потоке-писателе не останавливает цикл событий
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    task = asyncio.ensure_future(ticker())
+    await database._write(lambda db: time.sleep(0.2))
+    task.cancel()
+    assert len(ticks) >= 10
+
+
+@pytest.mark.asyncio
+async def test_memory_agent_uses_async_database(database):
+    agent = MemoryAgent(tools={"database": database})
+    message = SimpleNamespace(from_user=SimpleNamespace(id=7))
+    assert await agent.handle("save купить молоко", message) == "✅ Контекст успешно сохранен"
+    assert "купить молоко" in await agent.handle("get", message)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_one_commit(database):
+    database.batch_window = 0.05
+    results = await asyncio.gather(
+        *(database.save_memory(user_id % 3, f"заметка {user_id}") for user_id in range(20)),
+        database.add_or_update_user(1, reminder_time="10:00"),
+        database.add_or_update_user(1, reminder_time="11:00"),
+    )
+    assert results[:20] == [True] * 20
+    assert database.stats["batches"] == 1 and database.stats["max_batch"] == 22
+    assert len(await database.get_memory(0, limit=100)) == 7
+    # Обновления одного пользователя применяются в порядке вызовов
+    assert (await database.get_user_data(1))["reminder_time"] == "11:00"
+
+
+@pytest.mark.asyncio
+async def test_async_durability_flush_and_ordering(database):
+    database.durability = "async"
+    database.batch_window = 10
+    assert await database.save_memory(5, "черновик")
+    assert await database.get_memory(5) == []
+    await database.flush()
+    assert await database.get_memory(5) == ["черновик"]
+
+    # Очистка после незафиксированной записи выполняется после неё
+    await database.save_memory(5, "ещё одна")
+    assert await database.clear_memory(5)
+    assert await database.get_memory(5) == []
+
+
+@pytest.mark.asyncio
+async def test_user_cache_is_write_through(database):
+    assert await database.get_user_data(3) is None
+    assert await database.get_user(3) is None  # отсутствие тоже кэшируется
+
+    await database.add_or_update_user(3, reminder_time="08:00", timezone="UTC")
+    assert (await database.get_user_data(3))["reminder_time"] == "08:00"
+    await database.add_or_update_user(3, completed_practices=2, reminder_time="09:00", timezone="UTC")
+    assert await database.get_user(3) == (3, 2, "09:00", None, "UTC")
+
+    metrics = database.user_cache_metrics()
+    assert metrics["misses"] == 1 and metrics["hits"] == 3
+
+    assert await database.delete_user(3)
+    assert await database.get_user(3) is None
+    # В базе те же данные, что и в кэше
+    database.user_cache.clear()
+    assert await database.get_user(3) is None
+
+
+def test_add_or_update_user_upsert(tmp_path):
+    db = Database(str(tmp_path / "sync.db"))
+    db.add_or_update_user(1, reminder_time="07:00")
+    db.add_or_update_user(1, completed_practices=5, reminder_time="08:00", timezone="UTC")
+    assert db.get_user_data(1) == {
+        "user_id": 1, "completed_practices": 5, "reminder_time": "08:00",
+        "reminder_description": None, "timezone": "UTC",
+    }
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_search_memory_ranks_and_isolates_users(database):
+    await database.save_memory(1, "купить молоко и хлеб")
+    await database.save_memory(1, "молоко, молоко, снова молоко")
+    await database.save_memory(1, "позвонить маме")
+    await database.save_memory(2, "молоко для соседа")
+
+    hits = await database.search_memory(1, "молоко")
+    assert [text for text, _ in hits] == ["молоко, молоко, снова молоко", "купить молоко и хлеб"]
+    assert await database.search_memory(1, 'молоко" OR "мама') == []
+    assert [text for text, _ in await database.search_memory(1, "молоко", limit=1, offset=1)] == ["купить молоко и хлеб"]
+
+    assert await database.clear_memory(1)
+    assert await database.search_memory(1, "молоко") == []
+    assert len(await database.search_memory(2, "молоко")) == 1
+
+
+def test_search_index_is_built_for_existing_memory(tmp_path):
+    path = str(tmp_path / "old.db")
+    connection = sqlite3.connect(path)
+    connection.execute("CREATE TABLE memory (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER, context TEXT, timestamp DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    connection.execute("INSERT INTO memory (user_id, context) VALUES (1, 'старая заметка про отпуск')")
+    connection.commit()
+    connection.close()
+
+    db = Database(path)
+    assert [text for text, _ in db.search_memory(1, "отпуск")] == ["старая заметка про отпуск"]
+    db.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_agent_search_pages(database):
+    agent = MemoryAgent(tools={"database": database})
+    message = SimpleNamespace(from_user=SimpleNamespace(id=7))
+    for i in range(7):
+        await agent.handle(f"save заметка номер {i}", message)
+
+    first = await agent.handle("search заметка", message)
+    assert "стр. 1" in first and "memory search заметка --page 2" in first
+    second = await agent.handle("search заметка --page 2", message)
+    assert second.count("заметка номер") == 2 and "--page 3" not in second
+    assert await agent.handle("search отпуск", message) == "📭 Ничего не найдено"
@@ -0,0 +1,153 @@
+# tests/test_hot_reload.py
+
+import asyncio
+import os
+import sys
+import time
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+import main
+from main import AITelegramBot, AgentManager, load_agents, reload_agent_file
+from tools._hot_reload import FileWatcher
+
+AGENT_SOURCE = '''
+from agents.base_agent import BaseAgent
+
+class VersionAgent(BaseAgent):
+    def get_name(self):
+        return "version"
+
+    def get_description(self):
+        return "Версия {version}"
+
+    async def handle(self, args, message):
+        if args == "wait":
+            await self.tools["gate"].wait()
+        return "{version}"
+'''
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8")
+    # Гарантируем новый mtime даже на ФС с грубым разрешением времени
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+
+@pytest.fixture
+def agent_file(tmp_path):
+    path = tmp_path / f"version_agent_{uuid.uuid4().hex}.py"
+    write(path, AGENT_SOURCE.format(version="v1"))
+    manager = AgentManager(tools={"gate": asyncio.Event()})
+    manifest_path = str(tmp_path / "manifest.json")
+    load_agents(manager, folders=[str(tmp_path)], manifest_path=manifest_path)
+    return path, manager, manifest_path
+
+
+@pytest.mark.asyncio
+async def test_reload_swaps_agent_and_lets_inflight_call_finish(agent_file):
+    path, manager, manifest_path = agent_file
+    inflight = asyncio.ensure_future(manager.call_agent("version", "wait", None))
+    await asyncio.sleep(0.01)
+
+    write(path, AGENT_SOURCE.format(version="v2"))
+    assert reload_agent_file(manager, str(path), manifest_path)
+    assert await manager.call_agent("version", "", None) == (True, "v2")
+    assert manager.get_agents_info() == [{"name": "version", "description": "Версия v2"}]
+
+    manager.tools["gate"].set()
+    assert await inflight == (True, "v1")
+
+
+@pytest.mark.asyncio
+async def test_broken_module_keeps_previous_version(agent_file):
+    path, manager, manifest_path = agent_file
+    write(path, "this is not python")
+    assert not reload_agent_file(manager, str(path), manifest_path)
+    assert await manager.call_agent("version", "", None) == (True, "v1")
+
+
+def test_removed_file_unregisters_agent(agent_file):
+    path, manager, manifest_path = agent_file
+    path.unlink()
+    assert reload_agent_file(manager, str(path), manifest_path)
+    assert manager.command_map == {} and manager.agents == []
+
+
+def test_file_watcher_reports_changes(tmp_path):
+    kept = tmp_path / "kept.py"
+    removed = tmp_path / "removed.py"
+    write(kept, "A = 1")
+    write(removed, "B = 1")
+    (tmp_path / "__init__.py").write_text("")
+    watcher = FileWatcher([str(tmp_path)])
+
+    added = tmp_path / "added.py"
+    write(added, "C = 1")
+    write(kept, "A = 2")
+    removed.unlink()
+    assert watcher.poll() == ([str(added)], [str(kept)], [str(removed)])
+    assert watcher.poll() == ([], [], [])
+
+
+PROCESS_SOURCE = '''
+from agents.base_agent import BaseAgent
+
+NAME = "generated"
+
+class GeneratedAgent(BaseAgent):
+    execution = "process"
+
+    def get_name(self):
+        return NAME
+
+    def get_description(self):
+        return "Имя вычисляется при импорте"
+
+    async def handle(self, args, message):
+        return args
+'''
+
+
+@pytest.mark.asyncio
+async def test_reload_describes_process_agents_off_the_event_loop(tmp_path, monkeypatch):
+    manifest_path = str(tmp_path / "manifest.json")
+    describe_in_worker = main.describe_in_worker
+
+    def slow_describe(*args):
+        time.sleep(0.3)
+        return describe_in_worker(*args)
+
+    monkeypatch.setattr(main, "describe_in_worker", slow_describe)
+    monkeypatch.setattr(main, "reload_agent_file", lambda manager, path, described=None: reload_agent_file(
+        manager, path, manifest_path, described=described
+    ))
+    manager = AgentManager(tools={})
+    bot = SimpleNamespace(agent_manager=manager, build_system_prompt=lambda: "", system_prompt="")
+    path = tmp_path / f"generated_agent_{uuid.uuid4().hex}.py"
+    path.write_text(PROCESS_SOURCE, encoding="utf-8")
+
+    gaps = []
+
+    async def ticker():
+        last = time.monotonic()
+        while True:
+            await asyncio.sleep(0.01)
+            gaps.append(time.monotonic() - last)
+            last = time.monotonic()
+
+    task = asyncio.ensure_future(ticker())
+    try:
+        await AITelegramBot.reload_agents(bot, [str(path)], [], [])
+    finally:
+        task.cancel()
+    assert manager.command_map["generated"].execution == "process"
+    # Описание в отдельном процессе не останавливало цикл событий
+    assert len(gaps) >= 20 and max(gaps) < 0.2
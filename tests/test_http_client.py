@@ -0,0 +1,57 @@
+# tests/test_http_client.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.http_client import HTTPClient
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+    async def json(self):
+        await asyncio.sleep(0.05)  # Остальные запросы успевают присоединиться к первому
+        return self.payload
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, params=None):
+        self.requests += 1
+        return FakeResponse({"city": params["q"], "hourly": [1, 2, 3]})
+
+
+@pytest.mark.asyncio
+async def test_coalesced_get_returns_independent_copies():
+    client = HTTPClient()
+    client._session = FakeSession()
+
+    results = await asyncio.gather(*(client.get("https://api.example/weather", {"q": "Рим"}) for _ in range(3)))
+
+    assert client._session.requests == 1
+    assert client.single_flight.stats == {"calls": 1, "coalesced": 2}
+    # Один вызывающий меняет свой ответ — у остальных он прежний
+    results[0]["hourly"].append(4)
+    results[1]["city"] = "Париж"
+    assert results[2] == {"city": "Рим", "hourly": [1, 2, 3]}
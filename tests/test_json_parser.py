@@ -0,0 +1,174 @@
+# tests/test_json_parser.py
+
+import asyncio
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.json_parser import AgentCallsStreamParser
+from main import AITelegramBot, AgentManager
+
+RESPONSE = json.dumps({
+    "reasoning": "Thought: {\"agent_calls\": [ ... ]} в строке не считается",
+    "nested": {"agent_calls": [{"agent": "ignored"}]},
+    "agent_calls": [
+        {"agent": "weather", "args": "Moscow"},
+        {"agent": "translate", "args": {"lang": "en", "text": "}] \\\" {["}},
+        {"agent": "memory", "args": "save x", "depends_on": ["weather"]},
+    ],
+    "response": "[weather]",
+}, ensure_ascii=False)
+
+
+def test_calls_match_json_loads_and_arrive_early():
+    parser = AgentCallsStreamParser()
+    emitted_at = []
+    for i, char in enumerate(RESPONSE):
+        for call in parser.feed(char):
+            emitted_at.append((i, call))
+
+    assert [call for _, call in emitted_at] == json.loads(RESPONSE)["agent_calls"]
+    # Первый вызов отдан задолго до конца ответа
+    assert emitted_at[0][0] < RESPONSE.index('"response"')
+
+
+def test_fenced_and_chunked_response():
+    text = "```json\n" + RESPONSE + "\n```"
+    parser = AgentCallsStreamParser()
+    calls = []
+    for start in range(0, len(text), 7):
+        calls.extend(parser.feed(text[start:start + 7]))
+    assert calls == json.loads(RESPONSE)["agent_calls"]
+
+
+class EchoAgent:
+    def __init__(self, name, log):
+        self.name = name
+        self.log = log
+
+    def get_name(self):
+        return self.name
+
+    async def handle(self, args, message):
+        self.log.append(self.name)
+        await asyncio.sleep(0.01)
+        return f"{self.name}:{args}"
+
+
+@pytest.mark.asyncio
+async def test_batch_waits_for_forward_dependency():
+    log = []
+    manager = AgentManager(tools={})
+    manager.register_agent(EchoAgent("weather", log))
+    manager.register_agent(EchoAgent("memory", log))
+
+    batch = manager.start_batch(None)
+    batch.submit({"agent": "memory", "args": "save", "depends_on": "weather"})
+    await asyncio.sleep(0.05)
+    assert log == []
+
+    batch.submit({"agent": "weather", "args": "Moscow"})
+    results = await batch.results()
+    assert log == ["weather", "memory"]
+    assert results == {"memory": "memory:save", "weather": "weather:Moscow"}
+
+
+@pytest.mark.asyncio
+async def test_stateful_calls_are_not_dispatched_early():
+    from tools.json_parser import JSONParser
+
+    log = []
+    manager = AgentManager(tools={})
+    manager.register_agent(EchoAgent("weather", log))
+    manager.register_agent(EchoAgent("translate", log))
+    memory = EchoAgent("memory", log)
+    memory.stateful = True
+    manager.register_agent(memory)
+    bot = SimpleNamespace(json_parser=JSONParser(), agent_manager=manager)
+
+    batch = manager.start_batch(None)
+    dispatch = AITelegramBot._early_dispatch(bot, batch)
+    calls = [
+        {"agent": "weather", "args": "Moscow"},
+        {"agent": "memory", "args": "save x"},
+        {"agent": "translate", "args": "en hi"},
+    ]
+    text = json.dumps({"agent_calls": calls})
+    for end in range(1, len(text)):  # Ответ оборвался до последней скобки
+        dispatch(text[:end])
+
+    # Запущен только вызов до первого агента с состоянием: отмена пакета не повторит запись
+    assert batch.submitted == calls[:1]
+    batch.cancel()
+
+
+def test_local_repair_counts_saved_iterations():
+    from tools.json_parser import JSONParser
+
+    parser = JSONParser()
+    expected = json.loads(RESPONSE)
+
+    assert parser.loads(RESPONSE) == expected
+    assert parser.loads("```json\n" + RESPONSE + "\n```") == expected
+    assert parser.loads('{"response": "ok", "agent_calls": [{"agent": "weather", "args": "a,]"},],}') == {
+        "response": "ok", "agent_calls": [{"agent": "weather", "args": "a,]"}]
+    }
+    assert parser.loads('Вот ответ: {"response": "ok"} и {"x": 1}.') == {"response": "ok"}
+    with pytest.raises(json.JSONDecodeError):
+        parser.loads("Просто текст без JSON")
+    assert parser.stats == {"strict": 1, "repaired": 3, "failed": 1}
+
+
+def test_stream_parser_applies_same_repair():
+    text = '{"agent_calls": [{"agent": "weather", "args": "Moscow",}, {"agent": "memory", "args": "get"}]}'
+    parser = AgentCallsStreamParser()
+    assert parser.feed(text) == [{"agent": "weather", "args": "Moscow"}, {"agent": "memory", "args": "get"}]
+
+
+def test_response_format_modes():
+    from tools.json_parser import JSONParser
+
+    parser = JSONParser()
+    parser.response_format_mode = ""
+    assert parser.response_format() is None
+    parser.response_format_mode = "json_object"
+    assert parser.response_format() == {"type": "json_object"}
+    parser.response_format_mode = "json_schema"
+    schema = parser.response_format()["json_schema"]["schema"]
+    assert schema["required"] == ["reasoning", "response", "agent_calls"]
+
+
+@pytest.mark.asyncio
+async def test_depends_on_index_form_matches_schema():
+    from tools.json_parser import RESPONSE_SCHEMA, JSONParser
+
+    depends_on = RESPONSE_SCHEMA["properties"]["agent_calls"]["items"]["properties"]["depends_on"]
+    types = {option.get("type") for option in depends_on["anyOf"]}
+    item_types = {option["type"] for option in next(
+        option for option in depends_on["anyOf"] if option.get("type") == "array"
+    )["items"]["anyOf"]}
+    # Все формы, которые понимает AgentCallBatch, допустимы по схеме
+    assert types == {"string", "integer", "array"} and item_types == {"string", "integer"}
+
+    log = []
+    manager = AgentManager(tools={})
+    manager.register_agent(EchoAgent("weather", log))
+    manager.register_agent(EchoAgent("memory", log))
+    response = JSONParser().loads(json.dumps({
+        "reasoning": "", "response": "",
+        "agent_calls": [
+            {"agent": "memory", "args": "save", "depends_on": 1},
+            {"agent": "weather", "args": "Moscow", "depends_on": []},
+        ],
+    }))
+    assert await manager.execute_calls(response["agent_calls"], None) == {
+        "memory": "memory:save", "weather": "weather:Moscow"
+    }
+    assert log == ["weather", "memory"]
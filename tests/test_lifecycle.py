@@ -0,0 +1,68 @@
+# tests/test_lifecycle.py
+
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools._lifecycle import ToolLifecycle
+from tools.database import Database
+
+
+def make_module(name, log, depends_on=(), fail=False):
+    async def startup():
+        if fail:
+            raise RuntimeError("не запустился")
+        log.append(("startup", name))
+
+    def shutdown():
+        log.append(("shutdown", name))
+
+    return SimpleNamespace(**{f"startup_{name}": startup, f"shutdown_{name}": shutdown, "DEPENDS_ON": depends_on})
+
+
+@pytest.mark.asyncio
+async def test_startup_in_dependency_order_and_shutdown_in_reverse():
+    log = []
+    lifecycle = ToolLifecycle()
+    lifecycle.register("admission", make_module("admission", log, ("send_queue", "database")))
+    lifecycle.register("send_queue", make_module("send_queue", log))
+    lifecycle.register("database", make_module("database", log))
+    lifecycle.register("plain", SimpleNamespace())
+
+    await lifecycle.startup()
+    assert log == [("startup", "send_queue"), ("startup", "database"), ("startup", "admission")]
+
+    log.clear()
+    await lifecycle.shutdown()
+    assert log == [("shutdown", "admission"), ("shutdown", "database"), ("shutdown", "send_queue")]
+    assert lifecycle.started == []
+
+
+@pytest.mark.asyncio
+async def test_failed_startup_is_skipped_on_shutdown():
+    log = []
+    lifecycle = ToolLifecycle()
+    lifecycle.register("broken", make_module("broken", log, fail=True))
+    lifecycle.register("ok", make_module("ok", log, ("broken",)))
+
+    await lifecycle.startup()
+    await lifecycle.shutdown()
+    assert log == [("startup", "ok"), ("shutdown", "ok")]
+
+
+def test_database_connects_lazily(tmp_path):
+    path = tmp_path / "lazy.db"
+    database = Database(str(path))
+    assert not path.exists()
+
+    database.cursor.execute("SELECT COUNT(*) FROM users")
+    assert database.cursor.fetchone() == (0,)
+    assert path.exists()
+    database.close()
+    database.close()
@@ -0,0 +1,48 @@
+# tests/test_llm_client.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.llm_client import LLMClientPool
+
+
+@pytest.mark.asyncio
+async def test_client_reused_per_base_url_and_model():
+    pool = LLMClientPool()
+    pool.api_key = "test-key"
+
+    first = pool.get_client()
+    assert pool.get_client() is first
+    assert pool.get_client(model="other-model") is not first
+    assert pool.get_client(base_url="https://example.com/v1") is not first
+
+    await pool.close()
+    assert pool.get_client() is not first
+    await pool.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_limited():
+    pool = LLMClientPool()
+    pool.max_concurrent_requests = 2
+    active = []
+
+    async def request():
+        async with pool.slot():
+            active.append(1)
+            peak = len(active)
+            await asyncio.sleep(0.01)
+            active.pop()
+            return peak
+
+    peaks = await asyncio.gather(*(request() for _ in range(5)))
+    assert max(peaks) == 2
+    assert pool.stats["requests"] == 5
+    assert pool.stats["max_waiting"] == 3 and pool.stats["waiting"] == 0
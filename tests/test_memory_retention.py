@@ -0,0 +1,158 @@
+# tests/test_memory_retention.py
+
+import os
+import sqlite3
+import sys
+
+import pytest
+import pytest_asyncio
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.database import AsyncDatabase
+from tools.memory_retention import MemoryRetention
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "bot.db"))
+    await db.connect()
+    yield db
+    await db.close()
+
+
+async def insert(database, user_id, context, timestamp):
+    await database._write(lambda db: db.cursor.execute(
+        "INSERT INTO memory (user_id, context, timestamp) VALUES (?, ?, datetime('now', ?))",
+        (user_id, context, timestamp)
+    ) and db.connection.commit())
+
+
+def make_retention(database, **overrides):
+    retention = MemoryRetention()
+    retention.attach(database)
+    retention.idle_seconds = 0
+    retention.idle_wait = 0
+    for name, value in overrides.items():
+        setattr(retention, name, value)
+    return retention
+
+
+@pytest.mark.asyncio
+async def test_expire_compact_and_quota(database):
+    await insert(database, 1, "совсем старая", "-400 days")
+    await insert(database, 1, "купить молоко", "-40 days")
+    await insert(database, 1, "позвонить врачу", "-40 days")
+    await insert(database, 1, "одна старая запись", "-35 days")
+    for i in range(3):
+        await database.save_memory(1, f"новая {i}")
+
+    retention = make_retention(database, ttl=365 * 86400, compact_after=30 * 86400, max_rows=5, max_bytes=0)
+    report = await retention.run()
+
+    assert report["expired"] == 1
+    assert report["compacted"] == 2 and report["digests"] == 1
+    assert report["over_quota"] == 0
+    assert report["vacuum"] in ("incremental", "none")
+    assert "duration_ms" in report and "bytes_reclaimed" in report
+
+    memories = await database.get_memory(1, limit=10)
+    assert len(memories) == 5
+    assert memories[-1].startswith("Дайджест за") and "• купить молоко" in memories[-1]
+    # Дайджест доступен поиску, исходные записи — нет
+    assert [text for text, _ in await database.search_memory(1, "врачу")] == [memories[-1]]
+    # Единственная запись за день не сжимается
+    assert memories[-2] == "одна старая запись"
+
+
+@pytest.mark.asyncio
+async def test_row_quota_keeps_newest(database):
+    for i in range(5):
+        await insert(database, 1, f"запись {i}", f"-{5 - i} minutes")
+    report = await make_retention(database, max_rows=2, max_bytes=0).run()
+    assert report["over_quota"] == 3
+    assert await database.get_memory(1, limit=10) == ["запись 4", "запись 3"]
+
+
+@pytest.mark.asyncio
+async def test_byte_quota_keeps_newest(database):
+    for i in range(5):
+        await insert(database, 2, "я" * 100 + str(i), f"-{5 - i} minutes")  # 201 байт
+    await insert(database, 3, "чужая запись", "-1 minutes")
+
+    report = await make_retention(database, ttl=0, compact_after=0, max_rows=0, max_bytes=450).run()
+
+    assert report["over_quota"] == 3
+    assert [text[-1] for text in await database.get_memory(2, limit=10)] == ["4", "3"]
+    assert await database.get_memory(3) == ["чужая запись"]
+
+
+@pytest.mark.asyncio
+async def test_maintenance_waits_for_idle(database):
+    retention = make_retention(database, idle_seconds=3600)
+    await database.save_memory(1, "только что")
+    report = await retention.run()
+    assert report["vacuum"] == "skipped"
+    assert retention.stats["maintenance_runs"] == 0
+
+
+@pytest.mark.asyncio
+async def test_full_vacuum_is_opt_in(tmp_path):
+    # База прежней версии: без auto_vacuum и со свободными страницами
+    path = str(tmp_path / "legacy.db")
+    legacy = sqlite3.connect(path)
+    legacy.execute("CREATE TABLE filler (data TEXT)")
+    legacy.executemany("INSERT INTO filler VALUES (?)", [("x" * 1000,) for _ in range(200)])
+    legacy.execute("DELETE FROM filler")
+    legacy.commit()
+    legacy.close()
+
+    database = AsyncDatabase(path)
+    await database.connect()
+    try:
+        report = await make_retention(database).run()
+        assert report["vacuum"] == "full_required"
+        assert await database._write(lambda db: db.cursor.execute("PRAGMA auto_vacuum").fetchone()[0]) == 0
+
+        report = await make_retention(database, full_vacuum=True).run()
+        assert report["vacuum"] == "full" and report["bytes_reclaimed"] > 0
+        assert await database._write(lambda db: db.cursor.execute("PRAGMA auto_vacuum").fetchone()[0]) == 2
+    finally:
+        await database.close()
+
+
+class FakeScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def add_job(self, func, *args, **kwargs):
+        self.jobs.append(kwargs["id"])
+
+
+def test_scheduled_only_in_first_worker(database, monkeypatch):
+    for index, expected in (("0", ["memory_retention"]), ("1", [])):
+        monkeypatch.setenv("BOT_WORKER_INDEX", index)
+        retention, scheduler = MemoryRetention(), FakeScheduler()
+        retention.attach(database, scheduler)
+        retention.schedule()
+        assert scheduler.jobs == expected
+
+
+@pytest.mark.asyncio
+async def test_defaults_keep_all_memories(database, monkeypatch):
+    for name in ("MEMORY_TTL_DAYS", "MEMORY_COMPACT_AFTER_DAYS", "MEMORY_MAX_ROWS_PER_USER", "MEMORY_MAX_BYTES_PER_USER"):
+        monkeypatch.delenv(name, raising=False)
+    await insert(database, 1, "совсем старая", "-4000 days")
+    await insert(database, 1, "купить молоко", "-40 days")
+    await insert(database, 1, "позвонить врачу", "-40 days")
+
+    retention = MemoryRetention()
+    retention.attach(database)
+    retention.idle_seconds = retention.idle_wait = 0
+    report = await retention.run()
+
+    assert not retention.has_policy()
+    assert report["expired"] == report["compacted"] == report["over_quota"] == 0
+    assert len(await database.get_memory(1, limit=10)) == 3
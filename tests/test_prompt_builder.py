@@ -0,0 +1,62 @@
+# tests/test_prompt_builder.py
+
+import json
+import os
+import sys
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.prompt_builder import PromptBuilder
+
+
+def make_context():
+    weather = "Погода в Москве: " + "ясно, ветер слабый. " * 400
+    return {
+        "calls_history": [[{"agent": "weather", "args": "Moscow"}], [{"agent": "memory", "args": "get"}]],
+        "progress_history": [
+            {"successful_calls": 1, "failed_calls": 0, "results": {"weather": weather}},
+            {"successful_calls": 1, "failed_calls": 0, "results": {"memory": weather}},
+        ],
+        "last_reasoning": "Thought: ...",
+        "weather": weather,
+        "memory": weather,
+        "translate": "Hello world",
+        "result_iterations": {"weather": 0, "memory": 1, "translate": 1},
+        "error": "Ошибка парсинга JSON",
+    }
+
+
+def test_first_iteration_prompt_is_the_message():
+    builder = PromptBuilder()
+    assert builder.iteration_prompt("погода?", {"calls_history": [], "progress_history": []}) == "погода?"
+
+
+def test_iteration_prompt_fits_budget_and_dedupes():
+    builder = PromptBuilder()
+    builder.budget = 300
+    prompt = builder.iteration_prompt("Какая погода?", make_context())
+
+    assert builder.count_tokens(prompt) <= builder.budget + 50
+    assert "Результат от weather:\n(совпадает с результатом memory)" in prompt
+    assert "Hello world" in prompt
+    assert "#1: weather(Moscow) → успешно 1, ошибок 0" in prompt
+    assert "Ошибка парсинга JSON" in prompt
+    assert "Thought: ..." not in prompt
+    assert builder.stats["compacted"] == 1
+    assert builder.stats["tokens_before"] > builder.stats["tokens_after"]
+
+
+def test_final_prompt_drops_bookkeeping():
+    builder = PromptBuilder()
+    builder.budget = 300
+    context = make_context()
+    prompt = builder.final_prompt("Какая погода?", context)
+
+    payload = json.loads(prompt.split("Контекст выполнения:\n", 1)[1].rsplit("\n\n", 1)[0])
+    assert set(payload) == {"history", "error", "results"}
+    assert set(payload["results"]) == {"weather", "memory", "translate"}
+    assert builder.count_tokens(prompt) <= builder.budget + 50
+    # Исходный контекст не изменяется
+    assert context == make_context()
@@ -0,0 +1,78 @@
+# tests/test_react_loop.py
+
+import json
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from main import AITelegramBot
+from tools.llm_client import LLMClientPool
+
+
+class FakeCompletions:
+    def __init__(self, content: str):
+        self.content = content
+        self.calls = 0
+
+    async def create(self, **params):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=self.content))])
+
+
+class FakeLLM(LLMClientPool):
+    def __init__(self, content: str):
+        super().__init__()
+        self.api_key = "key"
+        self.completions = FakeCompletions(content)
+
+    def get_client(self, base_url=None, model=None):
+        return SimpleNamespace(chat=SimpleNamespace(completions=self.completions))
+
+
+class BrokenAgent:
+    def __init__(self):
+        self.calls = 0
+
+    def get_name(self):
+        return "broken"
+
+    def get_description(self):
+        return "broken"
+
+    async def handle(self, args, message):
+        self.calls += 1
+        return "❌ Сервис недоступен"
+
+
+@pytest.mark.asyncio
+async def test_stalled_loop_exits_early():
+    plan = json.dumps({
+        "reasoning": "Thought: вызываю broken\nAction: broken",
+        "response": "[broken]",
+        "agent_calls": [{"agent": "broken", "args": "x"}],
+    })
+    llm = FakeLLM(plan)
+    bot = AITelegramBot("123:ABC", {"llm_client": llm})
+    agent = BrokenAgent()
+    bot.agent_manager.register_agent(agent)
+
+    await bot.execute_react_cycle("сделай", None)
+
+    # После трёх итераций подряд без новых результатов — сразу финальный ответ
+    assert llm.completions.calls == 4 + 1
+    assert agent.calls == 4
+    assert bot.react_stats["early_exits"] == 1
+
+
+def test_repeated_memoized_calls_are_stuck():
+    bot = AITelegramBot.__new__(AITelegramBot)
+    repeated = {"repeated_calls": True, "has_new_info": False, "reasoning_changed": True, "agent_calls_count": 1}
+    fresh = dict(repeated, has_new_info=True)
+    assert not bot.is_stuck([fresh, repeated])
+    assert bot.is_stuck([fresh, repeated, repeated])
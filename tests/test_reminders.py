@@ -0,0 +1,226 @@
+# tests/test_reminders.py
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import pytest
+import pytest_asyncio
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.database import AsyncDatabase
+from tools.reminders import ReminderEngine, next_fire_time
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+@pytest_asyncio.fixture
+async def database(tmp_path):
+    db = AsyncDatabase(str(tmp_path / "bot.db"))
+    await db.connect()
+    yield db
+    await db.close()
+
+
+def make_engine(database, bot, **overrides):
+    engine = ReminderEngine()
+    engine.attach(database, bot)
+    for name, value in overrides.items():
+        setattr(engine, name, value)
+    return engine
+
+
+async def wait_for(condition, timeout=3.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        await asyncio.sleep(0.02)
+    assert condition()
+
+
+def test_next_fire_time_keeps_local_time_across_dst():
+    berlin = ZoneInfo("Europe/Berlin")
+    # 30 марта 2025 в Берлине переходят на летнее время: сутки длятся 23 часа
+    after = datetime(2025, 3, 29, 10, 0, tzinfo=berlin).timestamp()
+    first = next_fire_time("09:00", "Europe/Berlin", after)
+    second = next_fire_time("09:00", "Europe/Berlin", first)
+    assert datetime.fromtimestamp(first, berlin) == datetime(2025, 3, 30, 9, 0, tzinfo=berlin)
+    assert datetime.fromtimestamp(second, berlin) == datetime(2025, 3, 31, 9, 0, tzinfo=berlin)
+    assert second - first == 86400
+
+    # Тот же момент в другом поясе и в UTC
+    assert next_fire_time("09:00", "Asia/Tokyo", after) == datetime(2025, 3, 30, 0, 0, tzinfo=ZoneInfo("UTC")).timestamp()
+    assert next_fire_time("09:00", "Нет/Такого", after) == next_fire_time("09:00", "UTC", after)
+
+
+@pytest.mark.asyncio
+async def test_fires_due_and_reschedules(database):
+    bot = FakeBot()
+    now = int(time.time())
+    first = await database.add_reminder(1, "09:00", "UTC", "зарядка", now - 5)
+    await database.add_reminder(1, "10:00", "UTC", "вода", now + 3600)
+    # Простой дольше допустимого опоздания: напоминание не отправляется, но переносится
+    stale = await database.add_reminder(2, "08:00", "UTC", "", now - 7200)
+
+    engine = make_engine(database, bot, misfire_grace=60)
+    await engine.start()
+    try:
+        await wait_for(lambda: engine.stats["fired"] == 1)
+        assert bot.sent == [(1, "Это ваше ежедневное напоминание!\nОписание: зарядка")]
+        assert engine.stats["missed"] == 1
+
+        rows = {row[0]: row for row in await database.get_reminders(1)}
+        assert rows[first][4] == next_fire_time("09:00", "UTC", now)
+        assert (await database.get_reminders(2))[0][4] > now
+        assert [row[0] for row in await database.get_reminders(2)] == [stale]
+    finally:
+        await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_add_remove_and_restore_after_restart(database):
+    bot = FakeBot()
+    engine = make_engine(database, bot)
+    await engine.start()
+    first, _ = await engine.add(1, "07:30", "бег", "Europe/Moscow")
+    second, _ = await engine.add(1, "21:00", "чтение", "Europe/Moscow")
+    await engine.add(2, "12:00", "", "UTC")
+    assert engine.loaded <= 3
+    assert await engine.remove(1, first) == 1
+    await engine.stop()
+
+    # Новый экземпляр (перезапуск бота) видит сохранённые напоминания
+    restarted = make_engine(database, bot)
+    await restarted.start()
+    try:
+        assert [row[0] for row in await restarted.user_reminders(1)] == [second]
+        assert await restarted.remove(2) == 1
+        assert await restarted.user_reminders(2) == []
+    finally:
+        await restarted.stop()
+
+    # Добавленное во время работы и ставшее ближайшим будит цикл
+    current = (await database.get_reminders(1))[0][4]
+    assert await database.claim_reminders([(1, second, current, int(time.time()) + 1)]) == {(1, second)}
+    restarted = make_engine(database, bot)
+    await restarted.start()
+    try:
+        await wait_for(lambda: bot.sent, timeout=5)
+        assert bot.sent == [(1, "Это ваше ежедневное напоминание!\nОписание: чтение")]
+    finally:
+        await restarted.stop()
+
+
+class SlowLoadDatabase:
+    """
+    База, в которой страница подгрузки возвращается движку только по сигналу.
+    """
+
+    def __init__(self, database):
+        self.database = database
+        self.page_read = asyncio.Event()
+        self.release = asyncio.Event()
+
+    def __getattr__(self, name):
+        return getattr(self.database, name)
+
+    async def load_reminders(self, after, until, limit):
+        rows = await self.database.load_reminders(after, until, limit)
+        if rows:
+            self.page_read.set()
+            await self.release.wait()
+        return rows
+
+
+@pytest.mark.asyncio
+async def test_remove_during_refill_does_not_fire(database):
+    bot = FakeBot()
+    reminder = await database.add_reminder(1, "09:00", "UTC", "удалено", int(time.time()) + 1)
+    slow = SlowLoadDatabase(database)
+    engine = make_engine(slow, bot)
+    await engine.start()
+    try:
+        # Подгрузка уже прочитала строку, но ещё не положила её в кучу
+        await asyncio.wait_for(slow.page_read.wait(), 3)
+        removing = asyncio.ensure_future(engine.remove(1, reminder))
+        await asyncio.sleep(0.05)
+        slow.release.set()
+        assert await removing == 1
+        await asyncio.sleep(0.05)  # Подгрузка завершилась
+        assert engine.loaded == 0 and engine._heap == []
+        await asyncio.sleep(1.5)
+        assert bot.sent == []
+    finally:
+        await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_two_workers_send_once(tmp_path):
+    # Два процесса бота (BOT_WORKERS=2) — два движка и два подключения к одному файлу
+    path = str(tmp_path / "bot.db")
+    databases = [AsyncDatabase(path), AsyncDatabase(path)]
+    for db in databases:
+        await db.connect()
+    now = int(time.time())
+    for user_id in range(20):
+        # Срабатывание чуть позже старта: оба движка успевают загрузить напоминания в своё окно
+        await databases[0].add_reminder(user_id, "09:00", "UTC", "общее", now + 1)
+
+    bot = FakeBot()
+    engines = [make_engine(db, bot) for db in databases]
+    try:
+        await asyncio.gather(*(engine.start() for engine in engines))
+        await wait_for(lambda: len(bot.sent) >= 20, timeout=5)
+        await asyncio.sleep(0.2)  # Время на повторную отправку вторым движком, если бы она была
+        assert sorted(chat_id for chat_id, _ in bot.sent) == list(range(20))
+    finally:
+        for engine in engines:
+            await engine.stop()
+        for db in databases:
+            await db.close()
+
+
+@pytest.mark.asyncio
+async def test_window_is_bounded(database):
+    now = int(time.time())
+    await database._write(lambda db: db.cursor.executemany(
+        "INSERT INTO reminders (user_id, time, timezone, description, next_fire_at) VALUES (?, '09:00', 'UTC', '', ?)",
+        [(user_id, now + 600 + user_id) for user_id in range(300)]
+    ) and db.connection.commit())
+
+    engine = make_engine(database, FakeBot(), max_loaded=50, horizon=3600)
+    await engine.start()
+    try:
+        await wait_for(lambda: engine.stats["refills"] >= 1)
+        assert engine.loaded == 50
+        # В окне — ближайшие по времени
+        assert min(entry[1] for entry in engine._heap) == 0 and max(entry[1] for entry in engine._heap) == 49
+    finally:
+        await engine.stop()
+
+
+@pytest.mark.asyncio
+async def test_migrates_legacy_user_reminders(database):
+    await database.add_or_update_user(5, reminder_time="08:15", reminder_description="таблетки", timezone="Europe/Berlin")
+    engine = make_engine(database, FakeBot())
+    await engine.start()
+    await engine.stop()
+
+    rows = await database.get_reminders(5)
+    assert [row[1:4] for row in rows] == [("08:15", "Europe/Berlin", "таблетки")]
+    assert (await database.get_user_data(5))["reminder_time"] is None
+    # Повторный запуск не дублирует напоминание
+    await engine.start()
+    await engine.stop()
+    assert len(await database.get_reminders(5)) == 1
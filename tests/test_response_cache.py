@@ -0,0 +1,106 @@
+# tests/test_response_cache.py
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.response_cache import ResponseCache, normalize_message
+
+PROMPT = "system prompt"
+
+
+def make_cache(**overrides):
+    cache = ResponseCache()
+    cache.enabled = cache.near_enabled = True
+    cache.persist = False
+    for name, value in overrides.items():
+        setattr(cache, name, value)
+    return cache
+
+
+def test_exact_and_near_duplicate_tiers():
+    cache = make_cache()
+    cache.put("Погода в Москве", "gpt", PROMPT, "plan-moscow")
+
+    assert normalize_message("  Погода в МОСКВЕ!! ") == "погода в москве"
+    assert cache.get("погода в москве!", "gpt", PROMPT) == "plan-moscow"
+    assert cache.stats["exact_hits"] == 1
+
+    assert cache.get("какая погода в москве?", "gpt", PROMPT) == "plan-moscow"
+    assert cache.stats["near_hits"] == 1
+
+    assert cache.get("погода в Лондоне", "gpt", PROMPT) is None
+    assert cache.get("погода в москве", "other-model", PROMPT) is None
+    assert cache.get("погода в москве", "gpt", "another prompt") is None
+
+
+def test_numbers_must_match_for_near_duplicates():
+    cache = make_cache()
+    cache.put("сколько будет 2+2", "gpt", PROMPT, "four")
+    assert cache.get("сколько будет 2+3?", "gpt", PROMPT) is None
+    assert cache.get("скажи сколько будет 2+2", "gpt", PROMPT) == "four"
+
+
+def test_near_duplicate_requires_plan_arguments():
+    cache = make_cache()
+    rome = json.dumps({"agent_calls": [{"agent": "weather", "args": "Rome"}]})
+    cache.put("what is the weather like in rome today", "gpt", PROMPT, rome)
+    # Сообщения похожи (Жаккар выше порога), но аргумент плана — другой город
+    assert cache.get("what is the weather like in paris today", "gpt", PROMPT) is None
+    assert cache.get("so what is the weather like in rome today", "gpt", PROMPT) == rome
+
+    moscow = json.dumps({"agent_calls": [{"agent": "weather", "args": "Москва"}]})
+    cache.put("скажи пожалуйста какая сегодня погода в городе москва", "gpt", PROMPT, moscow)
+    assert cache.get("скажи пожалуйста какая сегодня погода в городе минск", "gpt", PROMPT) is None
+    assert cache.stats["near_hits"] == 1
+
+
+def test_lru_eviction_and_ttl():
+    cache = make_cache()
+    cache._near.maxsize = 1
+    cache.put("погода в москве", "gpt", PROMPT, "a")
+    cache.put("курс доллара сегодня", "gpt", PROMPT, "b")
+    # Вытесненная запись удаляется и из LSH-корзин
+    assert len(cache._bands) == 1
+    assert cache.get("какая погода в москве?", "gpt", PROMPT) is None
+
+    cache._exact.ttl = 0.01
+    cache.put("привет", "gpt", PROMPT, "hi")
+    time.sleep(0.02)
+    cache.near_enabled = False
+    assert cache.get("привет", "gpt", PROMPT) is None
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.rows = []
+
+    async def save_llm_cache(self, cache_key, scope, normalized, response, created_at):
+        self.rows.insert(0, (cache_key, scope, normalized, response, created_at))
+        return True
+
+    async def load_llm_cache(self, created_after, limit):
+        return [row for row in self.rows if row[4] >= created_after][:limit]
+
+
+@pytest.mark.asyncio
+async def test_persistence_warms_new_cache():
+    database = FakeDatabase()
+    first = make_cache(persist=True)
+    first.attach_database(database)
+    first.put("погода в москве", "gpt", PROMPT, "plan")
+    await asyncio.gather(*first._saving)
+
+    second = make_cache(persist=True)
+    second.attach_database(database)
+    await second.load_persisted()
+    assert second.get("погода в москве", "gpt", PROMPT) == "plan"
+    assert second.get("какая погода в москве", "gpt", PROMPT) == "plan"
@@ -0,0 +1,144 @@
+# tests/test_send_queue.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.send_queue import SendQueue, TokenBucket
+
+
+def make_queue(global_rate=1000.0, chat_rate=1000.0, chat_burst=1000.0):
+    queue = SendQueue()
+    queue.global_rate = global_rate
+    queue.chat_rate = chat_rate
+    queue.chat_burst = chat_burst
+    queue._global = TokenBucket(global_rate, 1)
+    return queue
+
+
+def sender(log, name, result=None):
+    async def send():
+        log.append(name)
+        return result or name
+    return send
+
+
+@pytest.mark.asyncio
+async def test_interactive_replies_go_before_bulk():
+    log = []
+    queue = make_queue(global_rate=50.0)
+    sends = [queue.send(i, sender(log, f"bulk{i}"), priority=queue.BULK) for i in range(1, 4)]
+    sends.append(queue.send(10, sender(log, "reply"), priority=queue.INTERACTIVE))
+    results = await asyncio.gather(*sends)
+
+    assert results[-1] == "reply"
+    assert log.index("reply") <= 1
+    assert queue.metrics()["sent"] == 4
+    assert queue.metrics()["depth"] == 0
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_busy_chat_does_not_block_others():
+    log = []
+    queue = make_queue(chat_rate=5.0, chat_burst=1)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.gather(
+        queue.send(1, sender(log, "a1")),
+        queue.send(1, sender(log, "a2")),
+        queue.send(2, sender(log, "b1")),
+    )
+
+    # Второе сообщение в чат 1 ждёт токен (~0.2 с), а чат 2 обслуживается сразу
+    assert log == ["a1", "b1", "a2"]
+    assert loop.time() - started >= 0.15
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_retry_after_pauses_chat_and_retries():
+    attempts = []
+    queue = make_queue()
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise TelegramRetryAfter(method=SendMessage(chat_id=1, text="x"), message="Too Many Requests", retry_after=0.1)
+        return "ok"
+
+    assert await queue.send(1, flaky) == "ok"
+    assert len(attempts) == 2
+    assert queue.stats["retries"] == 1
+    assert queue.metrics()["max_latency"] >= 0.1
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_back_pressure():
+    queue = make_queue(global_rate=20.0)
+    queue.max_size = 2
+    log = []
+    tasks = [asyncio.ensure_future(queue.send(i, sender(log, i), priority=queue.BULK)) for i in range(6)]
+    await asyncio.sleep(0.01)
+    assert queue.depth <= 2
+    await asyncio.gather(*tasks)
+    assert sorted(log) == list(range(6))
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_restarted_worker_wakes_waiting_senders():
+    log = []
+    queue = make_queue()
+    queue.max_size = 1
+    crash = [True]
+    delay = queue._global.delay
+
+    def failing_delay(now=None):
+        if crash[0]:
+            raise RuntimeError("сбой цикла")
+        return delay(now)
+
+    queue._global.delay = failing_delay
+    first = asyncio.ensure_future(queue.send(1, sender(log, "first")))
+    await asyncio.sleep(0.01)
+    # Цикл упал, очередь полна — второй отправитель ждёт места
+    second = asyncio.ensure_future(queue.send(2, sender(log, "second")))
+    await asyncio.sleep(0.01)
+    assert queue._worker.done() and not second.done()
+
+    crash[0] = False
+    third = asyncio.ensure_future(queue.send(3, sender(log, "third")))
+    assert await asyncio.wait_for(asyncio.gather(first, second, third), 1) == ["first", "second", "third"]
+    await queue.close()
+
+
+@pytest.mark.asyncio
+async def test_close_is_bounded_and_fails_unsent_jobs():
+    queue = make_queue()
+    never = asyncio.Event()
+
+    async def hanging():
+        await never.wait()
+
+    queue._chat_bucket(2).pause(100)
+    stuck = asyncio.ensure_future(queue.send(1, hanging))
+    paused = asyncio.ensure_future(queue.send(2, sender([], "paused")))
+    await asyncio.sleep(0.05)
+
+    started = asyncio.get_running_loop().time()
+    await queue.close(timeout=0.2)
+    assert asyncio.get_running_loop().time() - started < 1
+    for future in (stuck, paused):
+        with pytest.raises(RuntimeError):
+            await future
+    assert queue.depth == 0
@@ -0,0 +1,113 @@
+# tests/test_sharding.py
+
+import os
+import sys
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from rebalance_shards import rebalance
+from tools.database import AsyncDatabase, Database, ShardedDatabase, check_shard_layout, shard_index, shard_paths
+
+
+def count_rows(path, table):
+    db = Database(path)
+    try:
+        return db.cursor.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    finally:
+        db.close()
+
+
+@pytest.mark.asyncio
+async def test_users_are_spread_across_shards(tmp_path):
+    path = str(tmp_path / "bot.db")
+    db = ShardedDatabase(path, shards=3)
+    await db.connect()
+    try:
+        for user_id in range(30):
+            await db.add_or_update_user(user_id, timezone="UTC")
+            await db.save_memory(user_id, f"заметка пользователя {user_id}")
+        await db.save_llm_cache("key", "scope", "привет", "ответ", 1.0)
+
+        assert (await db.get_user_data(7))["timezone"] == "UTC"
+        assert await db.get_memory(7) == ["заметка пользователя 7"]
+        assert [text for text, _ in await db.search_memory(7, "заметка")] == ["заметка пользователя 7"]
+        assert sorted(await db.user_ids()) == list(range(30))
+        assert sorted(await db.memory_users()) == list(range(30))
+        assert len(await db.load_llm_cache(0.0, 10)) == 1
+        assert db.stats["batched_writes"] == 60
+    finally:
+        await db.close()
+
+    # Каждый пользователь лежит только в своём шарде
+    for index, shard_file in enumerate(shard_paths(path, 3)):
+        expected = sum(1 for user_id in range(30) if shard_index(user_id, 3) == index)
+        assert count_rows(shard_file, "users") == expected
+        assert 0 < expected < 30
+    assert not os.path.exists(path)
+
+
+@pytest.mark.asyncio
+async def test_rebalance_single_file_to_shards(tmp_path):
+    path = str(tmp_path / "bot.db")
+    single = AsyncDatabase(path)
+    await single.connect()
+    for user_id in range(20):
+        await single.add_or_update_user(user_id, reminder_time="09:00")
+        await single.save_memory(user_id, "первая")
+        await single.save_memory(user_id, "вторая")
+        await single.add_reminder(user_id, "09:00", "UTC", "зарядка", 1000 + user_id)
+    await single.close()
+
+    report = rebalance(path, 1, 4, delete_source=True)
+    assert sum(report["users"]) == 20 and sum(report["memory"]) == 40 and sum(report["reminders"]) == 20
+    assert not os.path.exists(path)
+    # Один файл больше не найден, а шарды есть — однофайловый режим не стартует с пустой базой
+    with pytest.raises(RuntimeError):
+        check_shard_layout(path, 1)
+    # Без --delete-source исходные шарды остаются, и обратный перенос в них запрещён
+    assert sum(rebalance(path, 4, 2)["memory"]) == 40
+    with pytest.raises(FileExistsError):
+        rebalance(path, 2, 4)
+
+    sharded = ShardedDatabase(path, shards=4)
+    await sharded.connect()
+    try:
+        assert await sharded.get_memory(13) == ["вторая", "первая"]
+        assert (await sharded.get_user_data(13))["reminder_time"] == "09:00"
+        assert len(await sharded.search_memory(13, "первая")) == 1
+        assert [row[1:] for row in await sharded.get_reminders(13)] == [("09:00", "UTC", "зарядка", 1013)]
+        assert [row[1] for row in await sharded.load_reminders((-1, 0, 0), 1005, 10)] == [0, 1, 2, 3, 4, 5]
+    finally:
+        await sharded.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_rebalance_keeps_sources(tmp_path, monkeypatch):
+    path = str(tmp_path / "bot.db")
+    single = AsyncDatabase(path)
+    await single.connect()
+    for user_id in range(10):
+        await single.save_memory(user_id, "запись")
+    await single.close()
+
+    replace = os.replace
+    calls = []
+
+    def failing_replace(src, dst):
+        calls.append(dst)
+        if len(calls) == 3:
+            raise OSError("диск переполнен")
+        replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", failing_replace)
+    with pytest.raises(OSError):
+        rebalance(path, 1, 4, delete_source=True)
+    # Новые шарды не встали на место целиком — исходный файл не удалён
+    assert count_rows(path, "memory") == 10
+    assert not any(os.path.exists(target) for target in shard_paths(path, 4))
+    monkeypatch.setattr(os, "replace", replace)
+    assert sum(rebalance(path, 1, 4)["memory"]) == 10
@@ -0,0 +1,84 @@
+# tests/test_supervisor.py
+
+import os
+import queue
+import sys
+import time
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from supervisor import Supervisor, _mp, update_chat_id
+
+
+def echo_worker(index, updates, results):
+    """
+    Воркер для теста: вместо бота возвращает, кто и в каком порядке получил обновления.
+    """
+    while True:
+        try:
+            data = updates.recv()
+        except EOFError:
+            return
+        if data is None:
+            return
+        results.put((index, update_chat_id(data), data["update_id"]))
+
+
+def make_update(update_id, chat_id):
+    return {
+        "update_id": update_id,
+        "message": {"message_id": update_id, "date": 0, "chat": {"id": chat_id, "type": "private"}, "text": "hi"},
+    }
+
+
+def collect(results, count):
+    return [results.get(timeout=20) for _ in range(count)]
+
+
+def test_update_chat_id():
+    assert update_chat_id(make_update(1, 42)) == 42
+    callback = {"update_id": 2, "callback_query": {"id": "1", "from": {"id": 7}, "message": {"chat": {"id": -100}}}}
+    assert update_chat_id(callback) == -100
+    assert update_chat_id({"update_id": 3}) is None
+
+
+@pytest.mark.asyncio
+async def test_updates_are_sharded_by_chat_and_workers_restart():
+    results = _mp.Queue()
+    supervisor = Supervisor(3, target=echo_worker, args=(results,))
+    supervisor.start()
+    try:
+        chats = [11, 22, 33, 44, -55]
+        for update_id in range(20):
+            supervisor.route(make_update(update_id, chats[update_id % len(chats)]))
+
+        received = collect(results, 20)
+        workers = {}
+        for index, chat_id, update_id in received:
+            workers.setdefault(chat_id, set()).add(index)
+        # Все обновления чата обрабатывает один и тот же воркер, по порядку
+        assert all(len(indexes) == 1 for indexes in workers.values())
+        for chat_id in chats:
+            ids = [update_id for _, chat, update_id in received if chat == chat_id]
+            assert ids == sorted(ids)
+
+        # Воркер, убитый во время ожидания обновлений, перезапускается,
+        # и его чаты продолжают обслуживаться
+        crashed = supervisor.shard(11)
+        time.sleep(0.2)  # даём фоновому потоку воркера дописать results
+        supervisor.processes[crashed].kill()
+        supervisor.processes[crashed].join(timeout=20)
+        supervisor.check_workers()
+        assert supervisor.stats["restarts"] == 1
+        supervisor.route(make_update(101, 11))
+        assert collect(results, 1) == [(crashed, 11, 101)]
+    finally:
+        await supervisor.stop(timeout=20)
+
+    assert not any(process.is_alive() for process in supervisor.processes)
+    with pytest.raises(queue.Empty):
+        results.get(timeout=0.1)
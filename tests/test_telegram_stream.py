@@ -0,0 +1,118 @@
+# tests/test_telegram_stream.py
+
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from tools.send_queue import SendQueue, TokenBucket
+from tools.telegram_stream import MESSAGE_LIMIT, PartialString, TelegramStreamer, extract_partial_string
+
+
+class FakeSent:
+    def __init__(self, edits):
+        self.edits = edits
+
+    async def edit_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+class FakeMessage:
+    def __init__(self, chat_id=1):
+        self.chat = SimpleNamespace(id=chat_id)
+        self.answers = []
+        self.edits = []
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+        return FakeSent(self.edits)
+
+
+def test_extract_partial_string():
+    assert extract_partial_string('{"resp', "reasoning") is None
+    assert extract_partial_string('{"reasoning": "Thought: a\\nb \\"q\\" \\u0442', "reasoning") == 'Thought: a\nb "q" т'
+    assert extract_partial_string('{"reasoning": "done", "response": "x"}', "reasoning") == "done"
+    assert extract_partial_string('{"reasoning": "cut\\', "reasoning") == "cut"
+
+
+def test_partial_string_is_parsed_incrementally():
+    response = '{"response": "x", "reasoning": "Thought: a\\nb \\"q\\" \\u0442 конец", "agent_calls": []}'
+    reader = PartialString("reasoning")
+    values = []
+    # Фрагменты по одному символу: заголовок поля и escape-последовательности приходят по частям
+    for end in range(1, len(response) + 1):
+        started = reader.feed(response[:end])
+        values.append(reader.value if started else None)
+        assert values[-1] == extract_partial_string(response[:end], "reasoning")
+    assert values[-1] == 'Thought: a\nb "q" т конец'
+    # Более короткий буфер — новый ответ, разбор начинается заново
+    assert not reader.feed('{"resp')
+    assert reader.feed('{"reasoning": "новый') and reader.value == "новый"
+
+
+@pytest.mark.asyncio
+async def test_callable_update_is_rendered_only_when_edit_is_due():
+    streamer = TelegramStreamer()
+    streamer.private_interval = 0.1
+    message = FakeMessage()
+    stream = await streamer.start(message, "...")
+
+    renders = []
+
+    def render():
+        renders.append(1)
+        return f"текст {len(renders)}"
+
+    for _ in range(200):
+        stream.update(render)
+        await asyncio.sleep(0.001)
+    await stream.finish("готово")
+    assert len(renders) == len(message.edits) - 1 <= 5
+
+
+@pytest.mark.asyncio
+async def test_updates_are_throttled_and_finish_replaces_text():
+    streamer = TelegramStreamer()
+    streamer.private_interval = 0.1
+    message = FakeMessage()
+
+    stream = await streamer.start(message, "...")
+    for i in range(50):
+        stream.update(f"partial {i}")
+        await asyncio.sleep(0.005)
+    await stream.finish("final " + "x" * MESSAGE_LIMIT)
+
+    assert message.answers[0] == "..."
+    # За ~0.25 с при интервале 0.1 с возможно лишь несколько промежуточных правок
+    assert 1 <= len(message.edits) <= 5
+    assert message.edits[-1] == ("final " + "x" * MESSAGE_LIMIT)[:MESSAGE_LIMIT]
+    assert message.answers[1:] == ["x" * 6]
+
+
+@pytest.mark.asyncio
+async def test_sends_and_edits_go_through_send_queue():
+    queue = SendQueue()
+    # Один токен на чат в 0.2 с: правка предпросмотра не успевает уйти до финального ответа
+    queue.chat_rate, queue.chat_burst = 5.0, 1.0
+    queue._global = TokenBucket(1000.0, 1000.0)
+    streamer = TelegramStreamer()
+    streamer.private_interval = 0.0
+    streamer.attach(queue)
+    message = FakeMessage()
+
+    stream = await streamer.start(message, "...")
+    stream.update("предпросмотр")
+    await asyncio.sleep(0.01)
+    await stream.finish("final " + "x" * MESSAGE_LIMIT)
+    await queue.close()
+
+    assert message.answers == ["...", "x" * 6]
+    # Отменённая правка предпросмотра снята с очереди и не затёрла финальный текст
+    assert message.edits == [("final " + "x" * MESSAGE_LIMIT)[:MESSAGE_LIMIT]]
+    assert queue.stats["sent"] == 3
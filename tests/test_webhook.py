@@ -0,0 +1,61 @@
+# tests/test_webhook.py
+
+import asyncio
+import os
+import sys
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+PARENT_DIR = os.path.abspath(os.path.join(CURRENT_DIR, ".."))
+sys.path.append(PARENT_DIR)
+
+from main import AITelegramBot
+
+# Обновление в том виде, в каком его присылает Telegram
+RECORDED_UPDATE = {
+    "update_id": 100,
+    "message": {
+        "message_id": 1,
+        "date": 1700000000,
+        "chat": {"id": 42, "type": "private"},
+        "from": {"id": 42, "is_bot": False, "first_name": "Тест"},
+        "text": "Какая погода в Москве?",
+    },
+}
+
+
+@pytest.mark.asyncio
+async def test_webhook_acknowledges_and_processes_updates():
+    bot_app = AITelegramBot("123:ABC", {})
+    bot_app.webhook_secret = "secret"
+    received = []
+    done = asyncio.Event()
+
+    async def process_message(message):
+        await asyncio.sleep(0.2)  # долгая обработка не задерживает ответ Telegram
+        received.append(message.text)
+        done.set()
+
+    bot_app.process_message = process_message
+
+    client = TestClient(TestServer(bot_app.create_webhook_app()))
+    await client.start_server()
+    try:
+        response = await client.post(bot_app.webhook_path, json=RECORDED_UPDATE)
+        assert response.status == 401
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        response = await client.post(
+            bot_app.webhook_path, json=RECORDED_UPDATE,
+            headers={"X-Telegram-Bot-Api-Secret-Token": "secret"},
+        )
+        assert response.status == 200
+        assert loop.time() - started < 0.2
+
+        await asyncio.wait_for(done.wait(), 2)
+        assert received == ["Какая погода в Москве?"]
+    finally:
+        await client.close()
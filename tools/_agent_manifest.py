@@ -0,0 +1,282 @@
+# tools/_agent_manifest.py
+
+import os
+import sys
+import ast
+import json
+import hashlib
+import logging
+import importlib.util
+from types import ModuleType
+from typing import Any, Dict, List, Optional
+
+# Меняется при изменении формата манифеста — старый файл тогда просто перестраивается
+MANIFEST_VERSION = 3
+
+# Атрибуты агента, которые нужны AgentManager до вызова, и их значения в BaseAgent.
+# Хранятся в манифесте, чтобы не импортировать модуль агента ради них
+AGENT_FLAGS = {
+    "cacheable": True,
+    "stateful": False,
+    "cache_ttl": 0,
+    "cache_per_user": False,
+    "max_concurrency": None,
+    "timeout": None,
+}
+
+PROCESS = "process"
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_module_from_file(module_name: str, file_path: str) -> ModuleType:
+    """
+    Выполняет файл как новый модуль. В sys.modules он попадает только после
+    успешного выполнения, так что ошибка в файле не затрагивает уже загруженную версию.
+    """
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Не удалось создать модуль из {file_path}")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    sys.modules[module_name] = module
+    return module
+
+
+def agent_entry(agent: Any, class_name: str) -> Dict[str, Any]:
+    """
+    Запись манифеста о созданном агенте: класс, имя, описание, класс выполнения и флаги.
+    """
+    entry = {
+        "class": class_name,
+        "name": agent.get_name(),
+        "description": agent.get_description(),
+        "execution": getattr(agent, "execution", "inline"),
+    }
+    for flag, default in AGENT_FLAGS.items():
+        entry[flag] = getattr(agent, flag, default)
+    return entry
+
+
+def _literal_return(function: ast.FunctionDef) -> Any:
+    body = function.body
+    if body and isinstance(body[0], ast.Expr) and isinstance(getattr(body[0], "value", None), ast.Constant):
+        body = body[1:]  # docstring
+    if len(body) != 1 or not isinstance(body[0], ast.Return) or body[0].value is None:
+        raise ValueError(function.name)
+    return ast.literal_eval(body[0].value)
+
+
+def describe_source(file_path: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    Читает агентов файла без его выполнения (по синтаксическому дереву).
+    Получается, если каждый агент — прямой наследник BaseAgent, а get_name,
+    get_description и флаги заданы литералами. Иначе (или если в файле есть классы
+    с другими базовыми классами) возвращает None.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), file_path)
+    except (OSError, SyntaxError, ValueError):
+        return None
+
+    entries = []
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+        bases = [base.id if isinstance(base, ast.Name) else getattr(base, "attr", None) for base in node.bases]
+        if not bases or bases == ["object"]:
+            continue
+        if bases != ["BaseAgent"]:
+            return None  # Возможен косвенный наследник BaseAgent — без импорта не разобрать
+        entry: Dict[str, Any] = {"class": node.name, "execution": "inline", **AGENT_FLAGS}
+        try:
+            for item in node.body:
+                if isinstance(item, ast.Assign):
+                    targets, value = item.targets, item.value
+                elif isinstance(item, ast.AnnAssign) and item.value is not None:
+                    targets, value = [item.target], item.value
+                elif isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)) and item.name in ("get_name", "get_description"):
+                    entry[item.name[4:]] = _literal_return(item)
+                    continue
+                else:
+                    continue
+                for target in targets:
+                    if isinstance(target, ast.Name) and (target.id in AGENT_FLAGS or target.id == "execution"):
+                        entry[target.id] = ast.literal_eval(value)
+        except ValueError:
+            return None
+        if not isinstance(entry.get("name"), str) or not isinstance(entry.get("description"), str):
+            return None
+        entries.append(entry)
+    return entries
+
+
+def declares_process_execution(file_path: str) -> bool:
+    """
+    Есть ли в файле класс с execution = "process". Такой файл не импортируется в процессе бота:
+    его агенты описываются по исходному коду или в процессе пула.
+    """
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read(), file_path)
+    except (OSError, SyntaxError, ValueError):
+        return False
+    for node in ast.walk(tree):
+        if isinstance(node, ast.ClassDef):
+            for item in node.body:
+                targets = item.targets if isinstance(item, ast.Assign) else [getattr(item, "target", None)]
+                value = getattr(item, "value", None)
+                if (any(isinstance(target, ast.Name) and target.id == "execution" for target in targets)
+                        and isinstance(value, ast.Constant) and value.value == PROCESS):
+                    return True
+    return False
+
+
+class AgentManifest:
+    """
+    Кэш сведений об агентах на диске: для каждого файла (путь, mtime, размер, хеш)
+    хранятся классы агентов с их именами и описаниями. Если файл не менялся,
+    системный промпт и command_map строятся без импорта модуля.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.changed = False
+        self.stats = {"hits": 0, "misses": 0}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"Манифест агентов {self.path} не прочитан, будет построен заново: {e}")
+            return
+        if data.get("version") == MANIFEST_VERSION:
+            self.entries = data.get("files", {})
+
+    def lookup(self, file_path: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Возвращает агентов файла из манифеста или None, если файл изменился
+        (или ещё не попадал в манифест). Хеш считается, только если изменились mtime или размер.
+        """
+        entry = self.entries.get(file_path)
+        stat = os.stat(file_path)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if entry["mtime_ns"] != stat.st_mtime_ns or entry["size"] != stat.st_size:
+            if entry["sha256"] != file_hash(file_path):
+                self.stats["misses"] += 1
+                return None
+            # Содержимое прежнее (например, файл перезаписан git checkout) — обновляем только mtime
+            entry["mtime_ns"], entry["size"] = stat.st_mtime_ns, stat.st_size
+            self.changed = True
+        self.stats["hits"] += 1
+        return entry["agents"]
+
+    def update(self, file_path: str, agents: List[Dict[str, str]]):
+        stat = os.stat(file_path)
+        self.entries[file_path] = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "sha256": file_hash(file_path),
+            "agents": agents,
+        }
+        self.changed = True
+
+    def forget(self, file_path: str):
+        if self.entries.pop(file_path, None) is not None:
+            self.changed = True
+
+    def prune(self, existing: List[str]):
+        """
+        Удаляет записи о файлах, которых больше нет.
+        """
+        for file_path in set(self.entries) - set(existing):
+            self.forget(file_path)
+
+    def save(self):
+        if not self.changed:
+            return
+        # Запись через временный файл: воркеры супервизора могут сохранять манифест одновременно
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": MANIFEST_VERSION, "files": self.entries}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_path, self.path)
+            self.changed = False
+        except OSError as e:
+            logging.warning(f"Не удалось сохранить манифест агентов {self.path}: {e}")
+
+
+class LazyAgent:
+    """
+    Агент из манифеста: имя, описание и флаги (AGENT_FLAGS) известны сразу, а модуль
+    импортируется и агент создаётся при первом обращении к остальным атрибутам (handle и т.п.).
+    Агенты с execution="process" в процессе бота не импортируются никогда — их вызывает пул процессов.
+    source — файл агента: по нему агенты заменяются при горячей перезагрузке.
+    """
+
+    def __init__(self, source: str, module_name: str, class_name: str, name: str, description: str,
+                 tools: Dict[str, Any], instance: Any = None, execution: str = "inline",
+                 flags: Optional[Dict[str, Any]] = None):
+        self.source = source
+        # Класс выполнения известен из манифеста, чтобы заранее прогреть пул процессов без импорта агента
+        self.execution = execution
+        self.module_name = module_name
+        self.class_name = class_name
+        self._name = name
+        self._description = description
+        self._flags = {flag: (flags or {}).get(flag, default) for flag, default in AGENT_FLAGS.items()}
+        self._tools = tools
+        self._instance = instance
+
+    def get_name(self) -> str:
+        return self._name
+
+    def get_description(self) -> str:
+        return self._description
+
+    @property
+    def loaded(self) -> bool:
+        return self._instance is not None
+
+    def manifest_entry(self) -> Dict[str, Any]:
+        if self._instance is not None:
+            return agent_entry(self._instance, self.class_name)
+        return {"class": self.class_name, "name": self._name, "description": self._description,
+                "execution": self.execution, **self._flags}
+
+    def load(self) -> Any:
+        if self._instance is None:
+            if self.execution == PROCESS:
+                raise RuntimeError(f"Агент {self._name} выполняется только в пуле процессов")
+            module = sys.modules.get(self.module_name) or load_module_from_file(self.module_name, self.source)
+            agent_class = getattr(module, self.class_name)
+            self._instance = agent_class(tools=self._tools)
+            logging.info(f"Агент {self._name} загружен при первом обращении ({self.module_name}.{self.class_name})")
+        return self._instance
+
+    def __getattr__(self, item: str) -> Any:
+        # Вызывается только для атрибутов, которых нет у самой обёртки
+        if item.startswith("__") or item in ("_instance", "_flags"):
+            raise AttributeError(item)
+        if self._instance is None and item in self._flags:
+            return self._flags[item]
+        if self._instance is None and self.execution == PROCESS and item in ("cache_key", "should_cache_result"):
+            # Ключ кэша процесс-агента считается по правилам BaseAgent, без импорта его модуля
+            from agents.base_agent import BaseAgent
+            return getattr(BaseAgent, item).__get__(self)
+        return getattr(self.load(), item)
+
+    def __repr__(self) -> str:
+        state = "загружен" if self.loaded else "не загружен"
+        return f"<LazyAgent {self._name} ({self.module_name}.{self.class_name}), {state}>"
@@ -0,0 +1,273 @@
+# tools/_agent_pool.py
+
+import os
+import signal
+import asyncio
+import inspect
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import resource  # Лимиты памяти и CPU (только Unix)
+except ImportError:
+    resource = None
+
+# Где выполняется handle агента
+INLINE, THREAD, PROCESS = "inline", "thread", "process"
+EXECUTION_CLASSES = (INLINE, THREAD, PROCESS)
+
+# Агенты, уже созданные в процессе-воркере: (файл, класс, mtime) -> агент
+_worker_agents: Dict[Tuple[str, str, int], Any] = {}
+
+
+def agent_location(agent: Any) -> Tuple[str, str, str]:
+    """
+    Файл, модуль и класс агента — по ним процесс-воркер создаёт свой экземпляр.
+    """
+    source = getattr(agent, "source", None)
+    if source:  # LazyAgent
+        return source, agent.module_name, agent.class_name
+    agent_class = type(agent)
+    return inspect.getfile(agent_class), agent_class.__module__, agent_class.__name__
+
+
+def message_snapshot(message: Any) -> Optional[Dict[str, Any]]:
+    """
+    Сериализуемая копия сообщения для процесса-воркера (без привязки к боту).
+    """
+    if hasattr(message, "model_dump"):
+        return message.model_dump(mode="json", exclude_none=True)
+    return None
+
+
+def _init_worker(memory_mb: int):
+    # Ctrl+C обрабатывает основной процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if resource is not None and memory_mb > 0:
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def _warm_up() -> int:
+    # Самое долгое при первом вызове — импорт aiogram, который нужен любому агенту
+    import agents.base_agent  # noqa: F401
+    return os.getpid()
+
+
+class AgentLimitExceeded(Exception):
+    """
+    Процесс-воркер прервал вызов агента по таймеру или лимиту процессорного времени.
+    """
+
+
+def _on_limit(signum, frame):
+    raise AgentLimitExceeded("превышен лимит времени выполнения агента")
+
+
+def _run_agent(file_path: str, module_name: str, class_name: str, args: str,
+               message_data: Optional[Dict[str, Any]], timeout: float, cpu_seconds: float) -> Any:
+    """
+    Выполняет handle агента в процессе-воркере. Агент создаётся один раз на процесс
+    (и заново, если файл изменился), инструменты основного процесса ему недоступны.
+    """
+    key = (file_path, class_name, os.stat(file_path).st_mtime_ns)
+    agent = _worker_agents.get(key)
+    if agent is None:
+        from tools._agent_manifest import load_module_from_file
+        module = load_module_from_file(module_name, file_path)
+        agent = getattr(module, class_name)(tools={})
+        _worker_agents[key] = agent
+
+    message = None
+    if message_data is not None:
+        from aiogram.types import Message
+        message = Message.model_validate(message_data)
+
+    # Время ожидания — таймером, процессорное время — мягким RLIMIT_CPU от уже израсходованного
+    signal.signal(signal.SIGALRM, _on_limit)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    cpu_limited = resource is not None and cpu_seconds > 0
+    if cpu_limited:
+        signal.signal(signal.SIGXCPU, _on_limit)
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+        soft = int(usage.ru_utime + usage.ru_stime + cpu_seconds) + 1
+        resource.setrlimit(resource.RLIMIT_CPU, (soft if hard == resource.RLIM_INFINITY else min(soft, hard), hard))
+    try:
+        return asyncio.run(agent.handle(args, message))
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if cpu_limited:
+            resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def _describe_agents(file_path: str, module_name: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Импортирует файл агента в процессе-воркере и описывает его агентов для манифеста.
+    """
+    from agents.base_agent import BaseAgent
+    from tools._agent_manifest import agent_entry, load_module_from_file
+
+    module = load_module_from_file(module_name, file_path)
+    entries, complete = [], True
+    for attr_name in dir(module):
+        attr = getattr(module, attr_name)
+        if isinstance(attr, type) and issubclass(attr, BaseAgent) and attr is not BaseAgent:
+            try:
+                entries.append(agent_entry(attr(tools={}), attr_name))
+            except Exception:
+                complete = False
+    return entries, complete
+
+
+def describe_in_worker(file_path: str, module_name: str) -> Tuple[List[Dict[str, Any]], bool]:
+    """
+    Описывает агентов файла в отдельном процессе (с теми же лимитами, что и пул),
+    не импортируя файл в процессе бота. Возвращает записи манифеста и признак успеха.
+    """
+    pool = ProcessPoolExecutor(
+        max_workers=1,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(int(os.getenv("AGENT_PROCESS_MEMORY_MB", "512")),),
+    )
+    try:
+        return pool.submit(_describe_agents, file_path, module_name).result(
+            float(os.getenv("AGENT_PROCESS_TIMEOUT", "30"))
+        )
+    except Exception as e:
+        logging.error(f"Не удалось описать агентов {file_path} в процессе пула: {e}")
+        for process in list((getattr(pool, "_processes", None) or {}).values()):
+            process.terminate()
+        return [], False
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _run_in_new_loop(handle, args: str, message: Any) -> Any:
+    return asyncio.run(handle(args, message))
+
+
+class AgentExecutor:
+    """
+    Выполнение агентов вне цикла событий бота по их классу выполнения (execution):
+    - inline — в основном цикле (по умолчанию);
+    - thread — в отдельном потоке со своим циклом событий (блокирующий код);
+    - process — в тёплом пуле процессов (тяжёлые вычисления и непроверенный код,
+      например агенты AutoGenAgent) с таймаутом вызова, лимитами памяти и CPU.
+    Процессы пула пересоздаются после AGENT_PROCESS_MAX_TASKS вызовов, после
+    зависшего вызова и после аварийного завершения воркера.
+    """
+
+    def __init__(self):
+        self.process_workers = int(os.getenv("AGENT_PROCESS_WORKERS", "2"))
+        self.thread_workers = int(os.getenv("AGENT_THREAD_WORKERS", "4"))
+        self.max_tasks = int(os.getenv("AGENT_PROCESS_MAX_TASKS", "100"))
+        self.timeout = float(os.getenv("AGENT_PROCESS_TIMEOUT", "30"))
+        self.memory_mb = int(os.getenv("AGENT_PROCESS_MEMORY_MB", "512"))
+        self.cpu_seconds = float(os.getenv("AGENT_PROCESS_CPU_SECONDS", "10"))
+        # Сколько ждать сверх таймаута, прежде чем убить процесс, не реагирующий на сигнал
+        self.kill_grace = 5.0
+
+        self._processes: Optional[ProcessPoolExecutor] = None
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._submitted = 0
+        self.stats = {"process_calls": 0, "thread_calls": 0, "timeouts": 0, "recycled": 0, "crashed": 0}
+
+    def _process_pool(self) -> ProcessPoolExecutor:
+        if self._processes is not None and self._submitted >= self.max_tasks:
+            self.recycle()
+        if self._processes is None:
+            self._processes = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.memory_mb,),
+            )
+            self._submitted = 0
+        return self._processes
+
+    def warm_up(self):
+        """
+        Заранее запускает процессы пула, чтобы первый вызов не ждал их старта.
+        """
+        pool = self._process_pool()
+        for _ in range(self.process_workers):
+            pool.submit(_warm_up)
+
+    def recycle(self, kill: bool = False):
+        """
+        Заменяет пул процессов новым. Старый дорабатывает начатые вызовы,
+        а при kill=True его процессы завершаются сразу.
+        """
+        pool, self._processes = self._processes, None
+        if pool is None:
+            return
+        self.stats["recycled"] += 1
+        if kill:
+            # У ProcessPoolExecutor нет публичного способа прервать задачу
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=kill)
+
+    async def run(self, agent: Any, args: str, message: Any) -> Any:
+        execution = getattr(agent, "execution", INLINE)
+        if execution == PROCESS:
+            return await self._run_process(agent, args, message)
+        if execution == THREAD:
+            return await self._run_thread(agent, args, message)
+        return await agent.handle(args, message)
+
+    async def _run_thread(self, agent: Any, args: str, message: Any) -> Any:
+        if self._threads is None:
+            self._threads = ThreadPoolExecutor(self.thread_workers, thread_name_prefix="agent")
+        self.stats["thread_calls"] += 1
+        timeout = getattr(agent, "timeout", None) or self.timeout
+        future = asyncio.get_running_loop().run_in_executor(
+            self._threads, _run_in_new_loop, agent.handle, args, message
+        )
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            # Поток прервать нельзя: он доработает в фоне, но ответа уже не ждём
+            self.stats["timeouts"] += 1
+            raise TimeoutError(f"Агент {agent.get_name()} не ответил за {timeout} с")
+
+    async def _run_process(self, agent: Any, args: str, message: Any) -> Any:
+        file_path, module_name, class_name = agent_location(agent)
+        timeout = getattr(agent, "timeout", None) or self.timeout
+        pool = self._process_pool()
+        self._submitted += 1
+        self.stats["process_calls"] += 1
+        future = asyncio.get_running_loop().run_in_executor(
+            pool, _run_agent, file_path, module_name, class_name, args,
+            message_snapshot(message), timeout, self.cpu_seconds
+        )
+        try:
+            return await asyncio.wait_for(future, timeout + self.kill_grace)
+        except AgentLimitExceeded as e:
+            # Воркер прервал вызов сам (таймер или RLIMIT_CPU) и остаётся в пуле
+            self.stats["timeouts"] += 1
+            raise TimeoutError(f"Агент {agent.get_name()}: {e}")
+        except asyncio.TimeoutError:
+            self.stats["timeouts"] += 1
+            logging.error(f"Агент {agent.get_name()} не реагирует на таймаут, процессы пула перезапускаются")
+            if self._processes is pool:
+                self.recycle(kill=True)
+            raise TimeoutError(f"Агент {agent.get_name()} не ответил за {timeout} с")
+        except BrokenProcessPool:
+            self.stats["crashed"] += 1
+            if self._processes is pool:
+                self.recycle(kill=True)
+            raise RuntimeError(
+                f"Процесс агента {agent.get_name()} завершился аварийно (возможно, превышен лимит памяти)"
+            )
+
+    def shutdown(self):
+        self.recycle(kill=True)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False)
+            self._threads = None
@@ -0,0 +1,67 @@
+# tools/_hot_reload.py
+
+import os
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+# Изменения в папках: (добавленные, изменённые, удалённые) файлы
+Changes = Tuple[List[str], List[str], List[str]]
+
+
+class FileWatcher:
+    """
+    Следит за .py-файлами в папках, периодически сравнивая mtime и размер
+    (без внешних зависимостей и inotify, работает на любой ФС).
+    Снимок делается при создании, поэтому изменения между загрузкой агентов
+    и запуском наблюдения не теряются.
+    """
+
+    def __init__(self, folders: Iterable[str], skip: Iterable[str] = ("__init__",), interval: float = 2.0):
+        self.folders = list(folders)
+        self.skip = set(skip)
+        self.interval = interval
+        self.files = self.snapshot()
+
+    def snapshot(self) -> Dict[str, Tuple[int, int]]:
+        files = {}
+        for folder in self.folders:
+            try:
+                names = os.listdir(folder)
+            except FileNotFoundError:
+                continue
+            for name in names:
+                module_name, ext = os.path.splitext(name)
+                if ext != ".py" or module_name in self.skip or module_name.startswith("."):
+                    continue
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[path] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    def poll(self) -> Changes:
+        current = self.snapshot()
+        added = [path for path in current if path not in self.files]
+        changed = [path for path in current if path in self.files and current[path] != self.files[path]]
+        removed = [path for path in self.files if path not in current]
+        self.files = current
+        return added, changed, removed
+
+    async def watch(self, on_change: Callable[[List[str], List[str], List[str]], Any]):
+        """
+        Вызывает on_change при каждом изменении. Ошибка обработчика не останавливает наблюдение.
+        """
+        while True:
+            await asyncio.sleep(self.interval)
+            added, changed, removed = self.poll()
+            if not (added or changed or removed):
+                continue
+            try:
+                result = on_change(added, changed, removed)
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                logging.error(f"Ошибка при обработке изменений файлов: {e}")
@@ -0,0 +1,92 @@
+# tools/_lifecycle.py
+
+import inspect
+import logging
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+
+class ToolLifecycle:
+    """
+    Жизненный цикл инструментов. Модуль инструмента может объявить:
+    - async def startup_<имя>() — вызывается при запуске бота;
+    - async def shutdown_<имя>() — вызывается при остановке;
+    - DEPENDS_ON = ("database", ...) — инструменты, которые должны быть запущены раньше
+      и остановлены позже этого.
+    Всё остальное инструменты делают лениво, при первом использовании.
+    """
+
+    def __init__(self):
+        self.hooks: Dict[str, Tuple[Optional[Callable], Optional[Callable]]] = {}
+        self.dependencies: Dict[str, Tuple[str, ...]] = {}
+        self.started: List[str] = []
+
+    def register(self, name: str, module: ModuleType):
+        self.hooks[name] = (getattr(module, f"startup_{name}", None), getattr(module, f"shutdown_{name}", None))
+        self.dependencies[name] = tuple(getattr(module, "DEPENDS_ON", ()))
+
+    def order(self) -> List[str]:
+        """
+        Порядок запуска: зависимости раньше зависящих от них инструментов.
+        """
+        order: List[str] = []
+        visiting = set()
+
+        def visit(name: str, path: Tuple[str, ...]):
+            if name in order:
+                return
+            if name in visiting:
+                logging.error(f"Циклическая зависимость инструментов: {' → '.join(path + (name,))}")
+                return
+            visiting.add(name)
+            for dependency in self.dependencies.get(name, ()):
+                if dependency not in self.hooks:
+                    logging.warning(f"Инструмент {name} зависит от незагруженного инструмента {dependency}")
+                    continue
+                visit(dependency, path + (name,))
+            visiting.discard(name)
+            order.append(name)
+
+        for name in self.hooks:
+            visit(name, ())
+        return order
+
+    @staticmethod
+    async def _call(hook: Callable) -> Any:
+        result = hook()
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def startup(self):
+        """
+        Запускает инструменты в порядке зависимостей. Ошибка одного инструмента
+        не мешает запуску остальных (как и при загрузке).
+        """
+        for name in self.order():
+            if name in self.started:
+                continue
+            startup, _ = self.hooks[name]
+            if startup is not None:
+                try:
+                    await self._call(startup)
+                    logging.info(f"Инструмент {name} запущен")
+                except Exception as e:
+                    logging.error(f"Не удалось запустить инструмент {name}: {e}")
+                    continue
+            self.started.append(name)
+
+    async def shutdown(self):
+        """
+        Останавливает запущенные инструменты в обратном порядке.
+        """
+        while self.started:
+            name = self.started.pop()
+            _, shutdown = self.hooks[name]
+            if shutdown is None:
+                continue
+            try:
+                await self._call(shutdown)
+                logging.info(f"Инструмент {name} остановлен")
+            except Exception as e:
+                logging.error(f"Ошибка при остановке инструмента {name}: {e}")
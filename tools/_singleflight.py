@@ -0,0 +1,38 @@
+# tools/_singleflight.py
+# Вспомогательный модуль (не инструмент): объединение одинаковых одновременных вызовов.
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Объединяет одновременные вызовы с одинаковым ключом: выполняется только первый,
+    остальные ждут его и получают тот же результат или то же исключение.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {"calls": 0, "coalesced": 0}
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        future = self._inflight.get(key)
+        if future is not None:
+            self.stats["coalesced"] += 1
+        else:
+            self.stats["calls"] += 1
+            future = asyncio.ensure_future(factory())
+            self._inflight[key] = future
+            future.add_done_callback(lambda done: self._finish(key, done))
+        # shield: отмена одного ожидающего не отменяет общий вызов для остальных
+        return await asyncio.shield(future)
+
+    def _finish(self, key: Hashable, future: asyncio.Future):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.cancelled():
+            # Исключение считается полученным, даже если все ожидающие уже отменены
+            future.exception()
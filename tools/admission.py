@@ -0,0 +1,167 @@
+# tools/admission.py
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Set, Tuple
+
+# Принятые сообщения используют эти инструменты: при остановке бота
+# очередь дорабатывается до того, как они будут закрыты
+DEPENDS_ON = ("llm_client", "send_queue", "http_client", "database", "scheduler")
+
+# Задание: (id пользователя, фабрика корутины обработки, время постановки в очередь)
+Job = Tuple[Any, Callable[[], Awaitable[Any]], float]
+
+
+class AdmissionController:
+    """
+    Допуск сообщений к обработке:
+    - в каждом чате сообщения обрабатываются строго по очереди (FIFO), поэтому ответы не перемешиваются;
+    - одновременно обрабатывается не больше ADMISSION_MAX_ACTIVE чатов;
+    - свободные места раздаются пользователям по кругу, так что активный пользователь
+      не задерживает остальных;
+    - очередь ограничена: при переполнении (общем или у одного пользователя)
+      сообщение сразу отклоняется, и бот отвечает «занят, попробуйте позже».
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("ADMISSION_ENABLED", "1").lower() in ("1", "true", "yes")
+        self.max_active = int(os.getenv("ADMISSION_MAX_ACTIVE", "32"))
+        self.max_backlog = int(os.getenv("ADMISSION_MAX_BACKLOG", "200"))
+        self.max_per_user = int(os.getenv("ADMISSION_MAX_PER_USER", "5"))
+        # Сколько секунд при остановке ждать обработки уже принятых сообщений
+        self.drain_timeout = float(os.getenv("ADMISSION_DRAIN_TIMEOUT", "30"))
+        self.busy_text = os.getenv(
+            "ADMISSION_BUSY_TEXT", "⏳ Сейчас много запросов, попробуйте, пожалуйста, чуть позже."
+        )
+
+        self._queues: Dict[Any, Deque[Job]] = {}  # chat_id -> ожидающие задания
+        self._running: Set[Any] = set()  # чаты, задание которых выполняется
+        # Пользователи, у которых есть чаты, готовые к запуску, в порядке очереди
+        self._ready: "OrderedDict[Any, Deque[Any]]" = OrderedDict()
+        self._pending_per_user: Dict[Any, int] = {}
+        # Когда пользователя обслуживали в последний раз (номер запуска)
+        self._served: "OrderedDict[Any, int]" = OrderedDict()
+        self._sequence = 0
+        self.max_users = 10000
+        self._tasks: Set[asyncio.Task] = set()
+        self.pending = 0
+        self.closed = False
+
+        self.stats = {"admitted": 0, "rejected": 0, "completed": 0, "failed": 0, "max_wait": 0.0}
+
+    @property
+    def active(self) -> int:
+        return len(self._running)
+
+    def submit(self, chat_id: Any, user_id: Any, handler: Callable[[], Awaitable[Any]]) -> bool:
+        """
+        Ставит обработку сообщения в очередь чата. Возвращает False, если очередь
+        переполнена и сообщение нужно отклонить.
+        """
+        if self.closed or self.pending >= self.max_backlog or self._pending_per_user.get(user_id, 0) >= self.max_per_user:
+            self.stats["rejected"] += 1
+            logging.warning(f"Очередь переполнена, сообщение из чата {chat_id} отклонено (в очереди {self.pending})")
+            return False
+
+        queue = self._queues.setdefault(chat_id, deque())
+        queue.append((user_id, handler, time.monotonic()))
+        self.pending += 1
+        self._pending_per_user[user_id] = self._pending_per_user.get(user_id, 0) + 1
+        self.stats["admitted"] += 1
+        if len(queue) == 1 and chat_id not in self._running:
+            self._mark_ready(chat_id)
+        self._dispatch()
+        return True
+
+    def _mark_ready(self, chat_id: Any):
+        # Чат становится в очередь пользователя, отправившего первое ожидающее сообщение
+        user_id = self._queues[chat_id][0][0]
+        self._ready.setdefault(user_id, deque()).append(chat_id)
+
+    def _next_chat(self) -> Optional[Any]:
+        """
+        Выбирает следующий чат: первым обслуживается пользователь, которого
+        дольше всех не обслуживали (при равенстве — раньше вставший в очередь).
+        """
+        if not self._ready:
+            return None
+        user_id = min(self._ready, key=lambda user: self._served.get(user, 0))
+        chats = self._ready[user_id]
+        chat_id = chats.popleft()
+        if not chats:
+            del self._ready[user_id]
+
+        self._sequence += 1
+        self._served[user_id] = self._sequence
+        self._served.move_to_end(user_id)
+        while len(self._served) > self.max_users:
+            self._served.popitem(last=False)
+        return chat_id
+
+    def _dispatch(self):
+        while len(self._running) < self.max_active:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                return
+            user_id, handler, enqueued_at = self._queues[chat_id].popleft()
+            self.pending -= 1
+            self._pending_per_user[user_id] -= 1
+            if not self._pending_per_user[user_id]:
+                del self._pending_per_user[user_id]
+            self.stats["max_wait"] = max(self.stats["max_wait"], time.monotonic() - enqueued_at)
+
+            self._running.add(chat_id)
+            task = asyncio.ensure_future(self._run(chat_id, handler))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, chat_id: Any, handler: Callable[[], Awaitable[Any]]):
+        try:
+            await handler()
+            self.stats["completed"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logging.error(f"Ошибка при обработке сообщения в чате {chat_id}: {e}")
+        finally:
+            self._running.discard(chat_id)
+            if self._queues.get(chat_id):
+                self._mark_ready(chat_id)
+            else:
+                self._queues.pop(chat_id, None)
+            self._dispatch()
+
+    async def drain(self, timeout: Optional[float] = None):
+        """
+        Перестаёт принимать сообщения и дожидается обработки уже принятых.
+        Если за timeout секунд обработка не закончилась, оставшиеся отменяются.
+        """
+        self.closed = True
+        try:
+            await asyncio.wait_for(self._wait_idle(), timeout)
+        except asyncio.TimeoutError:
+            dropped = self.pending
+            self._queues.clear()
+            self._ready.clear()
+            self._pending_per_user.clear()
+            self.pending = 0
+            logging.warning(
+                f"Обработка не завершилась за {timeout} с: отменено выполняющихся {len(self._tasks)}, "
+                f"ожидавших в очереди {dropped}"
+            )
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    async def _wait_idle(self):
+        # asyncio.wait, в отличие от gather, не отменяет задачи при истечении таймаута
+        while self._tasks:
+            await asyncio.wait(list(self._tasks))
+
+# Singleton экземпляр контроля допуска сообщений
+admission = AdmissionController()
+
+async def shutdown_admission():
+    await admission.drain(admission.drain_timeout)
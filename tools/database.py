@@ -1,15 +1,157 @@
 # tools/database.py
 
+import os
+import glob
+import zlib
+import heapq
+import asyncio
 import sqlite3
+import time
 import logging
-from typing import Optional, Tuple
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from tools._lru import TTLCache
+
+# Режимы надёжности записи (DATABASE_DURABILITY):
+# commit — вызов завершается после фиксации транзакции с его записью (по умолчанию);
+# fsync  — то же, но с synchronous=FULL: запись переживает и отключение питания;
+# async  — вызов завершается сразу после постановки в очередь (при сбое процесса
+#          последние миллисекунды записей могут потеряться), дождаться записи — flush()
+DURABILITY_MODES = ("commit", "fsync", "async")
+
+# Вставка или обновление пользователя одним запросом
+UPSERT_USER_SQL = '''
+    INSERT INTO users (user_id, completed_practices, reminder_time, reminder_description, timezone)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        completed_practices = excluded.completed_practices,
+        reminder_time = excluded.reminder_time,
+        reminder_description = excluded.reminder_description,
+        timezone = excluded.timezone
+'''
+
+# Размер записи памяти в байтах (length() для TEXT считает символы)
+MEMORY_BYTES_SQL = "length(CAST(context AS BLOB))"
+
+# Полнотекстовый индекс памяти: внешняя таблица FTS5 над memory, синхронизируется триггерами
+# (в том числе при пакетной записи и очистке). user_id индексируется как отдельная колонка,
+# чтобы поиск пересекал списки записей пользователя и слова, а не отбрасывал чужие совпадения.
+MEMORY_FTS_TABLE_SQL = '''
+    CREATE VIRTUAL TABLE memory_fts USING fts5(
+        context, user_id, content='memory', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )
+'''
+MEMORY_FTS_TRIGGERS_SQL = (
+    '''CREATE TRIGGER IF NOT EXISTS memory_fts_insert AFTER INSERT ON memory BEGIN
+        INSERT INTO memory_fts (rowid, context, user_id) VALUES (new.id, new.context, new.user_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS memory_fts_delete AFTER DELETE ON memory BEGIN
+        INSERT INTO memory_fts (memory_fts, rowid, context, user_id) VALUES ('delete', old.id, old.context, old.user_id);
+    END''',
+    '''CREATE TRIGGER IF NOT EXISTS memory_fts_update AFTER UPDATE ON memory BEGIN
+        INSERT INTO memory_fts (memory_fts, rowid, context, user_id) VALUES ('delete', old.id, old.context, old.user_id);
+        INSERT INTO memory_fts (rowid, context, user_id) VALUES (new.id, new.context, new.user_id);
+    END''',
+)
+
+
+def fts_query(text: str) -> str:
+    """
+    Запрос пользователя в синтаксисе FTS5: каждое слово в кавычках (операторы и спецсимволы
+    не интерпретируются), слова объединяются через AND. Префиксный поиск (слово*) не используется:
+    на частых словах он раскрывается в тысячи терминов и замедляет запрос в десятки раз.
+    """
+    return " ".join('"{}"'.format(word.replace('"', '""')) for word in text.split())
+
+
+class UserRecord:
+    """
+    Строка таблицы users в кэше. __slots__ вместо __dict__: запись занимает
+    в несколько раз меньше памяти, а кэш рассчитан на десятки тысяч пользователей.
+    """
+
+    __slots__ = ("user_id", "completed_practices", "reminder_time", "reminder_description", "timezone")
+
+    def __init__(self, user_id: int, completed_practices: int = 0, reminder_time: Optional[str] = None,
+                 reminder_description: Optional[str] = None, timezone: Optional[str] = None):
+        self.user_id = user_id
+        self.completed_practices = completed_practices
+        self.reminder_time = reminder_time
+        self.reminder_description = reminder_description
+        self.timezone = timezone
+
+    @classmethod
+    def from_row(cls, row: Tuple) -> "UserRecord":
+        return cls(*row)
+
+    def as_row(self) -> Tuple:
+        return (self.user_id, self.completed_practices, self.reminder_time, self.reminder_description, self.timezone)
+
+    def as_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+# Отличает «нет в кэше» от закэшированного отсутствия пользователя (None)
+_NOT_CACHED = object()
+
 
 class Database:
-    def __init__(self, db_path: str = "bot_database.db"):
-        self.connection = sqlite3.connect(db_path)
-        self.cursor = self.connection.cursor()
-        self.setup_tables()
-        logging.info(f"Подключение к базе данных {db_path} установлено.")
+    """
+    Синхронная работа с SQLite. Подключение принадлежит одному потоку;
+    из асинхронного кода используйте AsyncDatabase (синглтон database).
+    """
+
+    def __init__(self, db_path: Optional[str] = None, read_only: bool = False):
+        # Подключение открывается при запуске бота или при первом обращении, а не при импорте
+        self.db_path = db_path or os.getenv("DATABASE_PATH", "bot_database.db")
+        self.read_only = read_only
+        # Сколько секунд ждать освобождения блокировки, прежде чем вернуть «database is locked»
+        self.busy_timeout = float(os.getenv("DATABASE_BUSY_TIMEOUT", "5"))
+        self.durability = os.getenv("DATABASE_DURABILITY", "commit").lower()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._cursor: Optional[sqlite3.Cursor] = None
+        # Есть ли полнотекстовый индекс памяти (SQLite может быть собран без FTS5)
+        self.fts_enabled = False
+
+    def connect(self):
+        """
+        Открывает подключение и создаёт таблицы (если подключение ещё не открыто).
+        """
+        if self._connection is not None:
+            return
+        # check_same_thread=False только для close() из другого потока: запросы идут из одного потока.
+        # Подготовленные запросы кэшируются sqlite3 по тексту SQL (cached_statements)
+        self._connection = sqlite3.connect(
+            self.db_path, timeout=self.busy_timeout, check_same_thread=False, cached_statements=256
+        )
+        self._cursor = self._connection.cursor()
+        if not self.read_only:
+            # Свободные страницы можно вернуть ОС через incremental_vacuum (действует для новой базы,
+            # существующую переводит maintain); настройка должна предшествовать созданию таблиц
+            self._cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        # WAL: чтения не блокируют запись и наоборот; NORMAL в WAL не теряет целостность при сбое
+        self._cursor.execute("PRAGMA journal_mode=WAL")
+        self._cursor.execute("PRAGMA synchronous=FULL" if self.durability == "fsync" else "PRAGMA synchronous=NORMAL")
+        if self.read_only:
+            self._cursor.execute("PRAGMA query_only=ON")
+            self._cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'memory_fts'")
+            self.fts_enabled = self._cursor.fetchone() is not None
+        else:
+            self.setup_tables()
+        logging.info(f"Подключение к базе данных {self.db_path} установлено.")
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        self.connect()
+        return self._connection
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        self.connect()
+        return self._cursor
 
     def setup_tables(self):
         # Пример таблицы для хранения пользователей
@@ -27,45 +169,80 @@ class Database:
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 user_id INTEGER,
                 context TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                digest INTEGER DEFAULT 0
             )
         ''')
+        # digest = 1 — запись, в которую сжатием объединены старые записи (база прежней версии без колонки)
+        columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(memory)").fetchall()]
+        if "digest" not in columns:
+            self.cursor.execute("ALTER TABLE memory ADD COLUMN digest INTEGER DEFAULT 0")
+        # Последние записи пользователя читаются по индексу, а не просмотром всей таблицы
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_memory_user_time ON memory (user_id, timestamp)')
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                scope TEXT,
+                normalized TEXT,
+                response TEXT,
+                created_at REAL
+            )
+        ''')
+        # Напоминания: у пользователя их может быть несколько. next_fire_at — следующее срабатывание
+        # (unix-время UTC), индекс по нему позволяет выбирать ближайшие, не читая остальные
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reminders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                time TEXT NOT NULL,
+                timezone TEXT NOT NULL,
+                description TEXT,
+                next_fire_at INTEGER NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_next_fire ON reminders (next_fire_at, user_id)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_reminders_user ON reminders (user_id)')
         self.connection.commit()
-        logging.info("Таблицы users и memory созданы или уже существуют.")
+        self.setup_memory_search()
+        logging.info("Таблицы users, memory, reminders и llm_cache созданы или уже существуют.")
+
+    def setup_memory_search(self):
+        """
+        Создаёт полнотекстовый индекс памяти. Если записи появились раньше индекса
+        (база от прежней версии), индекс строится по ним.
+        """
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'memory_fts'")
+        exists = self.cursor.fetchone() is not None
+        try:
+            with self.connection:
+                if not exists:
+                    self.cursor.execute(MEMORY_FTS_TABLE_SQL)
+                for statement in MEMORY_FTS_TRIGGERS_SQL:
+                    self.cursor.execute(statement)
+                if not exists:
+                    self.cursor.execute("INSERT INTO memory_fts (memory_fts) VALUES ('rebuild')")
+            self.fts_enabled = True
+        except sqlite3.OperationalError as e:
+            logging.warning(f"Полнотекстовый поиск по памяти недоступен, используется LIKE: {e}")
 
     def get_user(self, user_id: int) -> Optional[Tuple]:
         self.cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
         user = self.cursor.fetchone()
-        logging.info(f"Получены данные пользователя {user_id}: {user}")
+        logging.debug(f"Получены данные пользователя {user_id}: {user}")
         return user
 
     def get_user_data(self, user_id: int) -> Optional[dict]:
         user = self.get_user(user_id)
         if user:
-            return {
-                'user_id': user[0],
-                'completed_practices': user[1],
-                'reminder_time': user[2],
-                'reminder_description': user[3],
-                'timezone': user[4]
-            }
+            return UserRecord.from_row(user).as_dict()
         return None
 
     def add_or_update_user(self, user_id: int, completed_practices: int = 0, reminder_time: Optional[str] = None, reminder_description: Optional[str] = None, timezone: Optional[str] = None):
-        if self.get_user(user_id):
-            self.cursor.execute('''
-                UPDATE users
-                SET completed_practices = ?, reminder_time = ?, reminder_description = ?, timezone = ?
-                WHERE user_id = ?
-            ''', (completed_practices, reminder_time, reminder_description, timezone, user_id))
-            logging.info(f"Обновлены данные пользователя {user_id}.")
-        else:
-            self.cursor.execute('''
-                INSERT INTO users (user_id, completed_practices, reminder_time, reminder_description, timezone)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (user_id, completed_practices, reminder_time, reminder_description, timezone))
-            logging.info(f"Добавлен новый пользователь {user_id}.")
+        # Один запрос вместо SELECT и последующего UPDATE или INSERT
+        self.cursor.execute(UPSERT_USER_SQL, (user_id, completed_practices, reminder_time, reminder_description, timezone))
         self.connection.commit()
+        logging.debug(f"Сохранены данные пользователя {user_id}.")
 
     def delete_user(self, user_id: int) -> bool:
         try:
@@ -92,9 +269,9 @@ class Database:
     def get_memory(self, user_id: int, limit: int = 5) -> list:
         try:
             self.cursor.execute('''
-                SELECT context FROM memory 
-                WHERE user_id = ? 
-                ORDER BY timestamp DESC 
+                SELECT context FROM memory
+                WHERE user_id = ?
+                ORDER BY timestamp DESC, id DESC
                 LIMIT ?''', (user_id, limit))
             results = [row[0] for row in self.cursor.fetchall()]
             logging.info(f"Получено {len(results)} записей для пользователя {user_id}")
@@ -103,6 +280,34 @@ class Database:
             logging.error(f"Ошибка при получении контекста: {e}")
             return []
 
+    def search_memory(self, user_id: int, query: str, limit: int = 5, offset: int = 0) -> List[Tuple[str, str]]:
+        """
+        Ищет записи пользователя по словам запроса. Возвращает (текст, время):
+        самые релевантные (BM25) первыми, при равной релевантности — новые.
+        """
+        try:
+            if self.fts_enabled:
+                match = fts_query(query)
+                if not match:
+                    return []
+                # Вес колонки user_id нулевой: она только отбирает записи пользователя
+                self.cursor.execute('''
+                    SELECT memory.context, memory.timestamp FROM memory_fts
+                    JOIN memory ON memory.id = memory_fts.rowid
+                    WHERE memory_fts MATCH ?
+                    ORDER BY bm25(memory_fts, 1.0, 0.0), memory.id DESC
+                    LIMIT ? OFFSET ?''', (f'user_id : "{int(user_id)}" AND context : ({match})', limit, offset))
+            else:
+                self.cursor.execute('''
+                    SELECT context, timestamp FROM memory
+                    WHERE user_id = ? AND context LIKE ?
+                    ORDER BY timestamp DESC, id DESC
+                    LIMIT ? OFFSET ?''', (user_id, f"%{query.strip()}%", limit, offset))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Ошибка при поиске в памяти пользователя {user_id}: {e}")
+            return []
+
     def clear_memory(self, user_id: int) -> bool:
         try:
             # First check if user has any memories
@@ -123,9 +328,827 @@ class Database:
             logging.error(f"Ошибка при очистке памяти пользователя {user_id}: {e}")
             return False
 
+    def save_llm_cache(self, cache_key: str, scope: str, normalized: str, response: str, created_at: float) -> bool:
+        try:
+            self.cursor.execute('''
+                INSERT OR REPLACE INTO llm_cache (cache_key, scope, normalized, response, created_at)
+                VALUES (?, ?, ?, ?, ?)''', (cache_key, scope, normalized, response, created_at))
+            self.connection.commit()
+            return True
+        except Exception as e:
+            logging.error(f"Ошибка при сохранении ответа LLM в кэш: {e}")
+            return False
+
+    def load_llm_cache(self, created_after: float, limit: int) -> list:
+        """
+        Возвращает свежие записи кэша ответов LLM (новые первыми)
+        и удаляет устаревшие.
+        """
+        try:
+            self.cursor.execute('DELETE FROM llm_cache WHERE created_at < ?', (created_after,))
+            self.connection.commit()
+            self.cursor.execute('''
+                SELECT cache_key, scope, normalized, response, created_at FROM llm_cache
+                ORDER BY created_at DESC
+                LIMIT ?''', (limit,))
+            return self.cursor.fetchall()
+        except Exception as e:
+            logging.error(f"Ошибка при загрузке кэша ответов LLM: {e}")
+            return []
+
+    def apply_batch(self, memories: List[Tuple[int, str]], users: List[Tuple]):
+        """
+        Применяет накопленные записи одной транзакцией: один commit (и один fsync) на пакет.
+        """
+        with self.connection:
+            if memories:
+                self.cursor.executemany('INSERT INTO memory (user_id, context) VALUES (?, ?)', memories)
+            if users:
+                self.cursor.executemany(UPSERT_USER_SQL, users)
+
+    def add_reminder(self, user_id: int, time_str: str, timezone: str, description: str, next_fire_at: int) -> int:
+        with self.connection:
+            self.cursor.execute('''
+                INSERT INTO reminders (user_id, time, timezone, description, next_fire_at)
+                VALUES (?, ?, ?, ?, ?)''', (user_id, time_str, timezone, description, next_fire_at))
+        return self.cursor.lastrowid
+
+    def get_reminders(self, user_id: int) -> List[Tuple]:
+        """
+        Напоминания пользователя: (id, время, часовой пояс, описание, next_fire_at), ближайшие первыми.
+        """
+        self.cursor.execute('''
+            SELECT id, time, timezone, description, next_fire_at FROM reminders
+            WHERE user_id = ? ORDER BY next_fire_at''', (user_id,))
+        return self.cursor.fetchall()
+
+    def delete_reminders(self, user_id: int, reminder_id: Optional[int] = None) -> int:
+        """
+        Удаляет напоминание пользователя (или все, если reminder_id не указан). Возвращает число удалённых.
+        """
+        with self.connection:
+            if reminder_id is None:
+                self.cursor.execute('DELETE FROM reminders WHERE user_id = ?', (user_id,))
+            else:
+                self.cursor.execute('DELETE FROM reminders WHERE user_id = ? AND id = ?', (user_id, reminder_id))
+        return self.cursor.rowcount
+
+    def load_reminders(self, after: Tuple[int, int, int], until: int, limit: int) -> List[Tuple]:
+        """
+        Ближайшие напоминания после ключа after = (next_fire_at, user_id, id) и не позже until:
+        (next_fire_at, user_id, id, время, часовой пояс, описание) по возрастанию ключа.
+        Чтение страницами по ключу идёт по индексу и не зависит от размера таблицы.
+        """
+        self.cursor.execute('''
+            SELECT next_fire_at, user_id, id, time, timezone, description FROM reminders
+            WHERE (next_fire_at, user_id, id) > (?, ?, ?) AND next_fire_at <= ?
+            ORDER BY next_fire_at, user_id, id
+            LIMIT ?''', (*after, until, limit))
+        return self.cursor.fetchall()
+
+    def claim_reminders(self, claims: List[Tuple[int, int, int]]) -> List[int]:
+        """
+        Переносит сработавшие напоминания на следующее время: claims — тройки (next_fire_at, id, прежний next_fire_at).
+        Строка меняется, только если её время не сдвинул другой процесс; возвращает id перенесённых —
+        отправлять можно только их, поэтому при нескольких воркерах напоминание уходит один раз.
+        """
+        claimed = []
+        with self.connection:
+            for next_fire_at, reminder_id, fire_at in claims:
+                self.cursor.execute(
+                    'UPDATE reminders SET next_fire_at = ? WHERE id = ? AND next_fire_at = ?',
+                    (next_fire_at, reminder_id, fire_at)
+                )
+                if self.cursor.rowcount:
+                    claimed.append(reminder_id)
+        return claimed
+
+    def migrate_user_reminders(self, next_fire: Callable[[str, str], int]) -> int:
+        """
+        Переносит напоминания из колонок users (прежний формат, одно на пользователя)
+        в таблицу reminders и очищает эти колонки, чтобы перенос не повторялся.
+        next_fire(время, часовой пояс) вычисляет первое срабатывание.
+        Перенос — одна транзакция, которая начинается с записи: воркеры, стартующие
+        одновременно, выполняют его по очереди, и второй уже ничего не находит.
+        """
+        self.connection.create_function("next_fire", 2, next_fire)
+        with self.connection:
+            self.cursor.execute('''
+                INSERT INTO reminders (user_id, time, timezone, description, next_fire_at)
+                SELECT user_id, reminder_time, COALESCE(timezone, 'UTC'), reminder_description,
+                       next_fire(reminder_time, COALESCE(timezone, 'UTC'))
+                FROM users WHERE reminder_time IS NOT NULL''')
+            migrated = self.cursor.rowcount
+            if migrated:
+                self.cursor.execute('UPDATE users SET reminder_time = NULL, reminder_description = NULL WHERE reminder_time IS NOT NULL')
+        if migrated:
+            logging.info(f"Перенесено напоминаний из таблицы users: {migrated}")
+        return migrated
+
+    def user_ids(self) -> List[int]:
+        self.cursor.execute('SELECT user_id FROM users')
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def memory_users(self) -> List[int]:
+        self.cursor.execute('SELECT DISTINCT user_id FROM memory')
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def apply_retention(self, user_id: int, expire_before: Optional[str], compact_before: Optional[str],
+                        max_rows: int, max_bytes: int) -> Dict[str, int]:
+        """
+        Применяет политику хранения к памяти пользователя одной транзакцией:
+        1. удаляет записи старше expire_before;
+        2. объединяет записи старше compact_before в дайджесты — по одному на день;
+        3. удаляет самые старые записи сверх max_rows записей или max_bytes байт (0 — без ограничения).
+        Границы времени — строки в формате timestamp ('ГГГГ-ММ-ДД ЧЧ:ММ:СС', UTC) или None.
+        Удаляемые строки сначала выбираются, затем удаляются по id: DELETE ... RETURNING
+        есть только в SQLite 3.35+.
+        """
+        report = {"expired": 0, "compacted": 0, "digests": 0, "over_quota": 0, "bytes_removed": 0}
+        with self.connection:
+            if expire_before:
+                rows = self.cursor.execute(
+                    f'SELECT id, {MEMORY_BYTES_SQL} FROM memory WHERE user_id = ? AND timestamp < ?',
+                    (user_id, expire_before)
+                ).fetchall()
+                self.cursor.executemany('DELETE FROM memory WHERE id = ?', [(row_id,) for row_id, _ in rows])
+                report["expired"] = len(rows)
+                report["bytes_removed"] += sum(size or 0 for _, size in rows)
+
+            if compact_before:
+                days = self.cursor.execute('''
+                    SELECT date(timestamp) AS day FROM memory
+                    WHERE user_id = ? AND digest = 0 AND timestamp < ?
+                    GROUP BY day HAVING COUNT(*) > 1''', (user_id, compact_before)).fetchall()
+                for day, in days:
+                    where = 'user_id = ? AND digest = 0 AND timestamp < ? AND date(timestamp) = ?'
+                    params = (user_id, compact_before, day)
+                    rows = self.cursor.execute(
+                        f'SELECT context, timestamp, {MEMORY_BYTES_SQL} FROM memory WHERE {where} ORDER BY timestamp, id',
+                        params
+                    ).fetchall()
+                    self.cursor.execute(f'DELETE FROM memory WHERE {where}', params)
+                    digest = f"Дайджест за {day}:\n" + "\n".join(f"• {context}" for context, _, _ in rows)
+                    # Время дайджеста — время последней записи, чтобы порядок памяти не менялся
+                    self.cursor.execute(
+                        'INSERT INTO memory (user_id, context, timestamp, digest) VALUES (?, ?, ?, 1)',
+                        (user_id, digest, rows[-1][1])
+                    )
+                    report["compacted"] += len(rows)
+                    report["digests"] += 1
+                    report["bytes_removed"] += sum(size or 0 for _, _, size in rows) - len(digest.encode("utf-8"))
+
+            if max_rows > 0 or max_bytes > 0:
+                rows = self.cursor.execute(f'''
+                    SELECT id, size FROM (
+                        SELECT id, {MEMORY_BYTES_SQL} AS size, ROW_NUMBER() OVER newest AS position,
+                               SUM({MEMORY_BYTES_SQL}) OVER newest AS total
+                        FROM memory WHERE user_id = ?
+                        WINDOW newest AS (ORDER BY timestamp DESC, id DESC)
+                    ) WHERE (? > 0 AND position > ?) OR (? > 0 AND total > ?)''',
+                    (user_id, max_rows, max_rows, max_bytes, max_bytes)).fetchall()
+                self.cursor.executemany('DELETE FROM memory WHERE id = ?', [(row_id,) for row_id, _ in rows])
+                report["over_quota"] = len(rows)
+                report["bytes_removed"] += sum(size or 0 for _, size in rows)
+        return report
+
+    def file_size(self) -> int:
+        """
+        Размер базы на диске вместе с WAL.
+        """
+        return sum(os.path.getsize(path) for path in (self.db_path, self.db_path + "-wal") if os.path.exists(path))
+
+    def maintain(self, vacuum_pages: int = 0, full_vacuum: bool = False) -> Dict[str, Any]:
+        """
+        Обслуживание файла базы: возвращает ОС свободные страницы (не больше vacuum_pages,
+        0 — все), обрезает WAL и обновляет статистику планировщика запросов (PRAGMA optimize).
+        База, созданная без auto_vacuum=INCREMENTAL, переводится полным VACUUM (один раз) только
+        при full_vacuum: он переписывает весь файл и блокирует запись; иначе vacuum = "full_required".
+        """
+        size_before = self.file_size()
+        free_pages = self.cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        auto_vacuum = self.cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+        vacuum = "none"
+        if auto_vacuum == 0 and free_pages and not full_vacuum:
+            vacuum = "full_required"
+        elif auto_vacuum == 0 and free_pages:
+            logging.info(
+                f"Перевод базы {self.db_path} в режим auto_vacuum=INCREMENTAL: полный VACUUM, "
+                f"{size_before} байт, свободных страниц {free_pages}"
+            )
+            started = time.perf_counter()
+            self.cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.cursor.execute("VACUUM")
+            logging.info(f"Полный VACUUM базы {self.db_path} занял {time.perf_counter() - started:.1f} с")
+            vacuum = "full"
+        elif auto_vacuum == 2 and free_pages:
+            # incremental_vacuum освобождает по странице на шаг — fetchall выполняет его целиком
+            self.cursor.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})").fetchall()
+            vacuum = "incremental"
+        self.cursor.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+        self.cursor.execute("PRAGMA optimize")
+        return {
+            "vacuum": vacuum,
+            "free_pages": free_pages,
+            "bytes_reclaimed": size_before - self.file_size(),
+        }
+
     def close(self):
-        self.connection.close()
+        if self._connection is None:
+            return
+        self._connection.close()
+        self._connection = None
+        self._cursor = None
         logging.info("Соединение с базой данных закрыто.")
 
+
+def shard_index(user_id: Any, shards: int) -> int:
+    """
+    Номер шарда пользователя (стабилен между запусками и процессами).
+    """
+    return zlib.crc32(str(user_id).encode("utf-8")) % shards
+
+
+def shard_path(db_path: str, index: int, shards: int) -> str:
+    """
+    Файл шарда: bot_database.db → bot_database.0-of-4.db. При одном шарде — сам db_path,
+    поэтому однофайловая база не меняет имени. Число шардов входит в имя, чтобы файлы
+    разных раскладок не путались и перебалансировка писала в новые файлы.
+    """
+    if shards <= 1:
+        return db_path
+    root, ext = os.path.splitext(db_path)
+    return f"{root}.{index}-of-{shards}{ext or '.db'}"
+
+
+def shard_paths(db_path: str, shards: int) -> List[str]:
+    return [shard_path(db_path, index, shards) for index in range(max(1, shards))]
+
+
+def check_shard_layout(db_path: str, shards: int):
+    """
+    Не даёт запуститься с пустой базой, если данные лежат в файлах другого числа шардов
+    (DATABASE_SHARDS изменили без перебалансировки).
+    """
+    if any(os.path.exists(path) for path in shard_paths(db_path, shards)):
+        return
+    root, ext = os.path.splitext(db_path)
+    found = glob.glob(f"{glob.escape(root)}.*-of-*{glob.escape(ext or '.db')}")
+    if os.path.exists(db_path):
+        found.append(db_path)
+    if found:
+        raise RuntimeError(
+            f"База данных разбита не на DATABASE_SHARDS={shards} шардов (найдены {', '.join(sorted(found))}). "
+            f"Перенесите данные: python rebalance_shards.py --to {shards}"
+        )
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища бота. Реализации: AsyncDatabase — один файл SQLite (по умолчанию)
+    и ShardedDatabase — пользователи распределены по нескольким файлам (DATABASE_SHARDS).
+    Все методы — корутины; данные одного пользователя целиком лежат в одном шарде.
+    """
+
+    @abstractmethod
+    async def connect(self):
+        pass
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def flush(self):
+        pass
+
+    @abstractmethod
+    async def scan(self, func: Callable[["Database"], Any]) -> List[Any]:
+        """
+        Выполняет чтение func на каждом шарде и возвращает список результатов
+        (для запросов по всем пользователям: администрирование, рассылки).
+        """
+
+    @abstractmethod
+    async def get_user(self, user_id: int) -> Optional[Tuple]:
+        pass
+
+    @abstractmethod
+    async def get_user_data(self, user_id: int) -> Optional[dict]:
+        pass
+
+    @abstractmethod
+    async def add_or_update_user(self, user_id: int, completed_practices: int = 0, reminder_time: Optional[str] = None, reminder_description: Optional[str] = None, timezone: Optional[str] = None):
+        pass
+
+    @abstractmethod
+    async def delete_user(self, user_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def save_memory(self, user_id: int, context: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def get_memory(self, user_id: int, limit: int = 5) -> list:
+        pass
+
+    @abstractmethod
+    async def search_memory(self, user_id: int, query: str, limit: int = 5, offset: int = 0) -> List[Tuple[str, str]]:
+        pass
+
+    @abstractmethod
+    async def clear_memory(self, user_id: int) -> bool:
+        pass
+
+    @abstractmethod
+    async def save_llm_cache(self, cache_key: str, scope: str, normalized: str, response: str, created_at: float) -> bool:
+        pass
+
+    @abstractmethod
+    async def load_llm_cache(self, created_after: float, limit: int) -> list:
+        pass
+
+    @abstractmethod
+    async def apply_retention(self, user_id: int, expire_before: Optional[str], compact_before: Optional[str],
+                              max_rows: int, max_bytes: int) -> Dict[str, int]:
+        pass
+
+    @abstractmethod
+    async def maintain(self, vacuum_pages: int = 0, full_vacuum: bool = False) -> Dict[str, Any]:
+        pass
+
+    @abstractmethod
+    async def add_reminder(self, user_id: int, time_str: str, timezone: str, description: str, next_fire_at: int) -> int:
+        pass
+
+    @abstractmethod
+    async def get_reminders(self, user_id: int) -> List[Tuple]:
+        pass
+
+    @abstractmethod
+    async def delete_reminders(self, user_id: int, reminder_id: Optional[int] = None) -> int:
+        pass
+
+    @abstractmethod
+    async def load_reminders(self, after: Tuple[int, int, int], until: int, limit: int) -> List[Tuple]:
+        pass
+
+    @abstractmethod
+    async def claim_reminders(self, claims: List[Tuple[int, int, int, int]]) -> Set[Tuple[int, int]]:
+        """
+        claims — четвёрки (user_id, id, прежний next_fire_at, новый next_fire_at).
+        Возвращает (user_id, id) напоминаний, которые перенёс этот вызов.
+        """
+
+    @abstractmethod
+    async def migrate_user_reminders(self, next_fire: Callable[[str, str], int]) -> int:
+        pass
+
+    async def user_ids(self) -> List[int]:
+        """
+        Все пользователи из таблицы users (например, для рассылки).
+        """
+        return [user_id for part in await self.scan(lambda db: db.user_ids()) for user_id in part]
+
+    async def memory_users(self) -> List[int]:
+        return [user_id for part in await self.scan(lambda db: db.memory_users()) for user_id in part]
+
+
+class AsyncDatabase(StorageBackend):
+    """
+    Асинхронный фасад над Database с теми же методами, чтобы запросы к SQLite
+    не блокировали цикл событий:
+    - все записи выполняет один поток-писатель со своим подключением
+      (писатель в SQLite всё равно один, а так записи не ждут блокировку друг друга);
+    - чтения — пул потоков, у каждого своё подключение только для чтения;
+    - WAL и busy_timeout: чтения идут параллельно с записью;
+    - групповая фиксация: save_memory и add_or_update_user копятся до DATABASE_BATCH_WINDOW_MS
+      или DATABASE_BATCH_SIZE записей и применяются одной транзакцией (executemany).
+      Остальные записи сначала отправляют накопленный пакет, поэтому порядок записей сохраняется;
+    - кэш строк users (LRU, DATABASE_USER_CACHE_SIZE записей): чтения пользователя обходятся
+      без запроса, а add_or_update_user и delete_user обновляют кэш сразу (write-through).
+      Время жизни записи (DATABASE_USER_CACHE_TTL) ограничивает расхождение между процессами супервизора.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("DATABASE_PATH", "bot_database.db")
+        self.readers = int(os.getenv("DATABASE_READERS", "4"))
+        self.batch_window = float(os.getenv("DATABASE_BATCH_WINDOW_MS", "5")) / 1000
+        self.batch_size = int(os.getenv("DATABASE_BATCH_SIZE", "100"))
+        self.durability = os.getenv("DATABASE_DURABILITY", "commit").lower()
+        if self.durability not in DURABILITY_MODES:
+            logging.warning(f"Неизвестный DATABASE_DURABILITY={self.durability}, используется commit")
+            self.durability = "commit"
+        self._writer: Optional[ThreadPoolExecutor] = None
+        self._reader_pool: Optional[ThreadPoolExecutor] = None
+        # Подключение в процессе: _writer публикуется только после создания таблиц
+        self._ready: Optional[asyncio.Future] = None
+        self._local = threading.local()
+        self._databases: List[Database] = []
+        self._lock = threading.Lock()
+
+        # Записи, ожидающие пакета: (тип, параметры, future вызывающего)
+        self._pending: List[Tuple[str, Tuple, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._last_batch: Optional[asyncio.Future] = None
+        self.stats = {"batches": 0, "batched_writes": 0, "max_batch": 0, "failed_batches": 0}
+        # Время последней записи пользователя (time.monotonic) — по нему обслуживание базы ждёт простоя
+        self.last_write_at = 0.0
+
+        # user_id -> UserRecord, None — пользователя нет в базе
+        self.user_cache = TTLCache(
+            int(os.getenv("DATABASE_USER_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("DATABASE_USER_CACHE_TTL", "300"))
+        )
+        self.user_cache_stats = {"hits": 0, "misses": 0}
+
+    def _thread_database(self, read_only: bool) -> Database:
+        # Своё подключение у каждого потока: писателя и каждого читателя
+        db = getattr(self._local, "database", None)
+        if db is None:
+            db = Database(self.db_path, read_only=read_only)
+            db.connect()
+            self._local.database = db
+            with self._lock:
+                self._databases.append(db)
+        return db
+
+    async def _call(self, read_only: bool, func: Callable[[Database], Any]) -> Any:
+        if self._writer is None:
+            await self.connect()
+        executor = self._reader_pool if read_only else self._writer
+        return await asyncio.get_running_loop().run_in_executor(
+            executor, lambda: func(self._thread_database(read_only))
+        )
+
+    async def _read(self, func: Callable[[Database], Any]) -> Any:
+        return await self._call(True, func)
+
+    async def _write(self, func: Callable[[Database], Any]) -> Any:
+        # Накопленный пакет уходит писателю раньше этой записи
+        self._submit_batch()
+        return await self._call(False, func)
+
+    async def _enqueue(self, kind: str, params: Tuple) -> Any:
+        """
+        Ставит запись в пакет и ждёт его фиксации (в режиме async — не ждёт).
+        """
+        if self._writer is None:
+            await self.connect()
+        self.last_write_at = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((kind, params, future))
+        if len(self._pending) >= self.batch_size:
+            self._submit_batch()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._submit_batch)
+        if self.durability == "async":
+            return True
+        return await future
+
+    def _submit_batch(self) -> Optional[asyncio.Future]:
+        """
+        Отправляет накопленные записи писателю. Возвращает future последнего
+        отправленного пакета: писатель выполняет задания по очереди, поэтому
+        после него зафиксированы и все предыдущие.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        if not self._pending or self._writer is None:
+            return self._last_batch
+        batch, self._pending = self._pending, []
+        memories = [params for kind, params, _ in batch if kind == "memory"]
+        users = [params for kind, params, _ in batch if kind == "user"]
+
+        self.stats["batches"] += 1
+        self.stats["batched_writes"] += len(batch)
+        self.stats["max_batch"] = max(self.stats["max_batch"], len(batch))
+        done = asyncio.get_running_loop().run_in_executor(
+            self._writer, lambda: self._thread_database(False).apply_batch(memories, users)
+        )
+        done.add_done_callback(lambda result: self._finish_batch(batch, result))
+        self._last_batch = done
+        return done
+
+    def _finish_batch(self, batch: List[Tuple[str, Tuple, asyncio.Future]], result: asyncio.Future):
+        error = None if result.cancelled() else result.exception()
+        if error is not None:
+            self.stats["failed_batches"] += 1
+            logging.error(f"Ошибка при записи пакета из {len(batch)} изменений: {error}")
+        for kind, params, future in batch:
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(True)
+            elif kind == "memory":
+                future.set_result(False)  # save_memory сообщает об ошибке результатом, как и раньше
+            else:
+                # В кэше уже новая версия, которая не записалась — следующее чтение пойдёт в базу
+                self.user_cache.pop(params[0])
+                future.set_exception(error)
+        if self.durability == "async":
+            # Никто не ждёт эти future — не оставляем «неполученных» исключений
+            for _, _, future in batch:
+                if not future.cancelled():
+                    future.exception()
+
+    async def flush(self):
+        """
+        Дожидается фиксации всех поставленных записей (для чтения своих записей в режиме async).
+        """
+        last = self._submit_batch()
+        if last is not None:
+            await asyncio.wait([last])
+
+    async def scan(self, func: Callable[[Database], Any]) -> List[Any]:
+        return [await self._read(func)]
+
+    async def connect(self):
+        """
+        Запускает поток-писатель и пул читателей. Таблицы создаёт писатель до первых чтений:
+        одновременные вызовы ждут одно и то же подключение, а запросы начинают выполняться
+        только после того, как схема готова.
+        """
+        if self._writer is not None:
+            return
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(self._open())
+        # shield: отмена одного из ожидающих не прерывает подключение для остальных
+        await asyncio.shield(self._ready)
+
+    async def _open(self):
+        writer = ThreadPoolExecutor(1, thread_name_prefix="db-writer")
+        readers = ThreadPoolExecutor(self.readers, thread_name_prefix="db-reader")
+        try:
+            await asyncio.get_running_loop().run_in_executor(writer, lambda: self._thread_database(False))
+        except Exception:
+            writer.shutdown(wait=False)
+            readers.shutdown(wait=False)
+            self._ready = None  # Следующий вызов попробует подключиться заново
+            raise
+        self._writer, self._reader_pool = writer, readers
+
+    async def _get_user_record(self, user_id: int) -> Optional[UserRecord]:
+        cached = self.user_cache.get(user_id, _NOT_CACHED)
+        if cached is not _NOT_CACHED:
+            self.user_cache_stats["hits"] += 1
+            return cached
+        self.user_cache_stats["misses"] += 1
+        row = await self._read(lambda db: db.get_user(user_id))
+        record = UserRecord.from_row(row) if row else None
+        # Пока шёл запрос, запись могла обновить кэш — более свежие данные не перезаписываем
+        if user_id not in self.user_cache:
+            self.user_cache.set(user_id, record)
+        return record
+
+    async def get_user(self, user_id: int) -> Optional[Tuple]:
+        record = await self._get_user_record(user_id)
+        return record.as_row() if record else None
+
+    async def get_user_data(self, user_id: int) -> Optional[dict]:
+        record = await self._get_user_record(user_id)
+        return record.as_dict() if record else None
+
+    async def add_or_update_user(self, user_id: int, completed_practices: int = 0, reminder_time: Optional[str] = None, reminder_description: Optional[str] = None, timezone: Optional[str] = None):
+        record = UserRecord(user_id, completed_practices, reminder_time, reminder_description, timezone)
+        self.user_cache.set(user_id, record)
+        await self._enqueue("user", record.as_row())
+
+    async def delete_user(self, user_id: int) -> bool:
+        self.user_cache.set(user_id, None)
+        return await self._write(lambda db: db.delete_user(user_id))
+
+    def user_cache_metrics(self) -> Dict[str, float]:
+        """
+        Попадания и промахи кэша пользователей.
+        """
+        hits, misses = self.user_cache_stats["hits"], self.user_cache_stats["misses"]
+        return {
+            "size": len(self.user_cache),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    async def save_memory(self, user_id: int, context: str) -> bool:
+        return await self._enqueue("memory", (user_id, context))
+
+    async def get_memory(self, user_id: int, limit: int = 5) -> list:
+        return await self._read(lambda db: db.get_memory(user_id, limit))
+
+    async def search_memory(self, user_id: int, query: str, limit: int = 5, offset: int = 0) -> List[Tuple[str, str]]:
+        return await self._read(lambda db: db.search_memory(user_id, query, limit, offset))
+
+    async def clear_memory(self, user_id: int) -> bool:
+        return await self._write(lambda db: db.clear_memory(user_id))
+
+    async def save_llm_cache(self, cache_key: str, scope: str, normalized: str, response: str, created_at: float) -> bool:
+        return await self._write(lambda db: db.save_llm_cache(cache_key, scope, normalized, response, created_at))
+
+    async def load_llm_cache(self, created_after: float, limit: int) -> list:
+        # Удаляет устаревшие записи, поэтому выполняется писателем
+        return await self._write(lambda db: db.load_llm_cache(created_after, limit))
+
+    async def apply_retention(self, user_id: int, expire_before: Optional[str], compact_before: Optional[str],
+                              max_rows: int, max_bytes: int) -> Dict[str, int]:
+        return await self._write(
+            lambda db: db.apply_retention(user_id, expire_before, compact_before, max_rows, max_bytes)
+        )
+
+    async def maintain(self, vacuum_pages: int = 0, full_vacuum: bool = False) -> Dict[str, Any]:
+        return await self._write(lambda db: db.maintain(vacuum_pages, full_vacuum))
+
+    async def add_reminder(self, user_id: int, time_str: str, timezone: str, description: str, next_fire_at: int) -> int:
+        return await self._write(lambda db: db.add_reminder(user_id, time_str, timezone, description, next_fire_at))
+
+    async def get_reminders(self, user_id: int) -> List[Tuple]:
+        return await self._read(lambda db: db.get_reminders(user_id))
+
+    async def delete_reminders(self, user_id: int, reminder_id: Optional[int] = None) -> int:
+        return await self._write(lambda db: db.delete_reminders(user_id, reminder_id))
+
+    async def load_reminders(self, after: Tuple[int, int, int], until: int, limit: int) -> List[Tuple]:
+        return await self._read(lambda db: db.load_reminders(after, until, limit))
+
+    async def claim_reminders(self, claims: List[Tuple[int, int, int, int]]) -> Set[Tuple[int, int]]:
+        if not claims:
+            return set()
+        owners = {reminder_id: user_id for user_id, reminder_id, _, _ in claims}
+        claimed = await self._write(lambda db: db.claim_reminders(
+            [(next_fire_at, reminder_id, fire_at) for _, reminder_id, fire_at, next_fire_at in claims]
+        ))
+        return {(owners[reminder_id], reminder_id) for reminder_id in claimed}
+
+    async def migrate_user_reminders(self, next_fire: Callable[[str, str], int]) -> int:
+        migrated = await self._write(lambda db: db.migrate_user_reminders(next_fire))
+        if migrated:
+            self.user_cache.clear()  # В закэшированных строках users остались перенесённые напоминания
+        return migrated
+
+    async def close(self):
+        """
+        Дожидается уже поставленных запросов и закрывает подключения.
+        """
+        if self._ready is not None and not self._ready.done():
+            await asyncio.wait({self._ready})
+        if self._writer is None:
+            return
+        await self.flush()
+        writer, readers = self._writer, self._reader_pool
+        self._writer = self._reader_pool = None
+        self._ready = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, writer.shutdown)
+        await loop.run_in_executor(None, readers.shutdown)
+        with self._lock:
+            databases, self._databases = self._databases, []
+        for db in databases:
+            db.close()
+        self._local = threading.local()
+
+class ShardedDatabase(StorageBackend):
+    """
+    Пользователи распределены по DATABASE_SHARDS файлам SQLite по хешу user_id.
+    Каждый шард — отдельный AsyncDatabase со своим писателем, читателями, пакетами
+    и кэшем пользователей, поэтому записи разных шардов не ждут друг друга.
+    Данные, не привязанные к пользователю (кэш ответов LLM), хранятся в шарде 0.
+    Запросы по всем пользователям (scan, user_ids) выполняются на шардах параллельно.
+    Число шардов меняется только офлайн: python rebalance_shards.py --to N.
+    """
+
+    def __init__(self, db_path: Optional[str] = None, shards: Optional[int] = None):
+        self.db_path = db_path or os.getenv("DATABASE_PATH", "bot_database.db")
+        self.shard_count = shards or int(os.getenv("DATABASE_SHARDS", "1"))
+        self.shards = [AsyncDatabase(path) for path in shard_paths(self.db_path, self.shard_count)]
+        # DATABASE_USER_CACHE_SIZE — общий предел для всех шардов
+        for shard in self.shards:
+            shard.user_cache.maxsize = max(1, shard.user_cache.maxsize // self.shard_count)
+
+    def shard(self, user_id: Any) -> AsyncDatabase:
+        return self.shards[shard_index(user_id, self.shard_count)]
+
+    @property
+    def last_write_at(self) -> float:
+        return max(shard.last_write_at for shard in self.shards)
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        stats: Dict[str, int] = {}
+        for shard in self.shards:
+            for key, value in shard.stats.items():
+                stats[key] = max(stats.get(key, 0), value) if key == "max_batch" else stats.get(key, 0) + value
+        return stats
+
+    def user_cache_metrics(self) -> Dict[str, float]:
+        metrics = [shard.user_cache_metrics() for shard in self.shards]
+        hits, misses = sum(m["hits"] for m in metrics), sum(m["misses"] for m in metrics)
+        return {
+            "size": sum(m["size"] for m in metrics),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    async def connect(self):
+        check_shard_layout(self.db_path, self.shard_count)
+        await asyncio.gather(*(shard.connect() for shard in self.shards))
+
+    async def close(self):
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    async def flush(self):
+        await asyncio.gather(*(shard.flush() for shard in self.shards))
+
+    async def scan(self, func: Callable[[Database], Any]) -> List[Any]:
+        return list(await asyncio.gather(*(shard._read(func) for shard in self.shards)))
+
+    async def get_user(self, user_id: int) -> Optional[Tuple]:
+        return await self.shard(user_id).get_user(user_id)
+
+    async def get_user_data(self, user_id: int) -> Optional[dict]:
+        return await self.shard(user_id).get_user_data(user_id)
+
+    async def add_or_update_user(self, user_id: int, completed_practices: int = 0, reminder_time: Optional[str] = None, reminder_description: Optional[str] = None, timezone: Optional[str] = None):
+        await self.shard(user_id).add_or_update_user(user_id, completed_practices, reminder_time, reminder_description, timezone)
+
+    async def delete_user(self, user_id: int) -> bool:
+        return await self.shard(user_id).delete_user(user_id)
+
+    async def save_memory(self, user_id: int, context: str) -> bool:
+        return await self.shard(user_id).save_memory(user_id, context)
+
+    async def get_memory(self, user_id: int, limit: int = 5) -> list:
+        return await self.shard(user_id).get_memory(user_id, limit)
+
+    async def search_memory(self, user_id: int, query: str, limit: int = 5, offset: int = 0) -> List[Tuple[str, str]]:
+        return await self.shard(user_id).search_memory(user_id, query, limit, offset)
+
+    async def clear_memory(self, user_id: int) -> bool:
+        return await self.shard(user_id).clear_memory(user_id)
+
+    async def save_llm_cache(self, cache_key: str, scope: str, normalized: str, response: str, created_at: float) -> bool:
+        return await self.shards[0].save_llm_cache(cache_key, scope, normalized, response, created_at)
+
+    async def load_llm_cache(self, created_after: float, limit: int) -> list:
+        return await self.shards[0].load_llm_cache(created_after, limit)
+
+    async def apply_retention(self, user_id: int, expire_before: Optional[str], compact_before: Optional[str],
+                              max_rows: int, max_bytes: int) -> Dict[str, int]:
+        return await self.shard(user_id).apply_retention(user_id, expire_before, compact_before, max_rows, max_bytes)
+
+    async def maintain(self, vacuum_pages: int = 0, full_vacuum: bool = False) -> Dict[str, Any]:
+        reports = await asyncio.gather(*(shard.maintain(vacuum_pages, full_vacuum) for shard in self.shards))
+        vacuums = {report["vacuum"] for report in reports}
+        return {
+            "vacuum": next((mode for mode in ("full", "full_required", "incremental") if mode in vacuums), "none"),
+            "free_pages": sum(report["free_pages"] for report in reports),
+            "bytes_reclaimed": sum(report["bytes_reclaimed"] for report in reports),
+        }
+
+    async def add_reminder(self, user_id: int, time_str: str, timezone: str, description: str, next_fire_at: int) -> int:
+        return await self.shard(user_id).add_reminder(user_id, time_str, timezone, description, next_fire_at)
+
+    async def get_reminders(self, user_id: int) -> List[Tuple]:
+        return await self.shard(user_id).get_reminders(user_id)
+
+    async def delete_reminders(self, user_id: int, reminder_id: Optional[int] = None) -> int:
+        return await self.shard(user_id).delete_reminders(user_id, reminder_id)
+
+    async def load_reminders(self, after: Tuple[int, int, int], until: int, limit: int) -> List[Tuple]:
+        # Каждый шард отдаёт свои ближайшие limit записей; общие ближайшие — первые limit из слияния
+        parts = await self.scan(lambda db: db.load_reminders(after, until, limit))
+        return list(heapq.merge(*parts))[:limit]
+
+    async def claim_reminders(self, claims: List[Tuple[int, int, int, int]]) -> Set[Tuple[int, int]]:
+        by_shard: Dict[int, List[Tuple[int, int, int, int]]] = {}
+        for claim in claims:
+            by_shard.setdefault(shard_index(claim[0], self.shard_count), []).append(claim)
+        parts = await asyncio.gather(*(self.shards[index].claim_reminders(part) for index, part in by_shard.items()))
+        return set().union(*parts)
+
+    async def migrate_user_reminders(self, next_fire: Callable[[str, str], int]) -> int:
+        return sum(await asyncio.gather(*(shard.migrate_user_reminders(next_fire) for shard in self.shards)))
+
+
+def create_database() -> StorageBackend:
+    """
+    Хранилище по настройкам: один файл (по умолчанию) или DATABASE_SHARDS шардов.
+    """
+    if int(os.getenv("DATABASE_SHARDS", "1")) > 1:
+        return ShardedDatabase()
+    return AsyncDatabase()
+
+
 # Singleton экземпляр базы данных
-database = Database()
+database = create_database()
+
+async def startup_database():
+    if isinstance(database, AsyncDatabase):
+        check_shard_layout(database.db_path, 1)
+    await database.connect()
+
+async def shutdown_database():
+    await database.close()
@@ -1,25 +1,57 @@
 # tools/http_client.py
 
+import copy
 import aiohttp
 import asyncio
 from typing import Any, Dict, Optional
 
+from tools._singleflight import SingleFlight
+
 class HTTPClient:
     def __init__(self):
-        self.session = aiohttp.ClientSession()
+        # Сессия создаётся при первом запросе, внутри работающего цикла событий
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Одновременные одинаковые запросы выполняются один раз
+        self.single_flight = SingleFlight()
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    @staticmethod
+    def _request_key(method: str, url: str, payload: Optional[Dict[str, Any]]) -> tuple:
+        items = tuple(sorted((str(k), str(v)) for k, v in (payload or {}).items()))
+        return (method, url, items)
 
     async def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        async with self.session.get(url, params=params) as response:
-            response.raise_for_status()
-            return await response.json()
+        async def request():
+            async with self.session.get(url, params=params) as response:
+                response.raise_for_status()
+                return await response.json()
+
+        # У каждого ожидающего своя копия ответа: изменения одного не видны остальным
+        return copy.deepcopy(await self.single_flight.do(self._request_key("GET", url, params), request))
+
+    async def post(self, url: str, data: Optional[Dict[str, Any]] = None, coalesce: bool = False) -> Dict[str, Any]:
+        """
+        POST-запрос. Объединять одинаковые запросы можно только для идемпотентных
+        методов API, поэтому это включается явно через coalesce=True.
+        """
+        async def request():
+            async with self.session.post(url, json=data) as response:
+                response.raise_for_status()
+                return await response.json()
 
-    async def post(self, url: str, data: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
-        async with self.session.post(url, json=data) as response:
-            response.raise_for_status()
-            return await response.json()
+        if not coalesce:
+            return await request()
+        return copy.deepcopy(await self.single_flight.do(self._request_key("POST", url, data), request))
 
     async def close(self):
-        await self.session.close()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
 
 # Создаем экземпляр HTTPClient
 http_client = HTTPClient()
@@ -0,0 +1,272 @@
+# tools/json_parser.py
+
+import os
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+# JSON-схема ответа ReAct-итерации для режима структурированного вывода
+RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "reasoning": {"type": "string"},
+        "response": {"type": "string"},
+        "agent_calls": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "agent": {"type": "string"},
+                    "args": {"type": "string"},
+                    "id": {"type": "string"},
+                    # Имя агента или id вызова (строка), номер вызова в agent_calls (число) или список таких значений
+                    "depends_on": {
+                        "anyOf": [
+                            {"type": "string"},
+                            {"type": "integer"},
+                            {"type": "array", "items": {"anyOf": [{"type": "string"}, {"type": "integer"}]}},
+                        ]
+                    },
+                },
+                "required": ["agent", "args"],
+            },
+        },
+    },
+    "required": ["reasoning", "response", "agent_calls"],
+}
+
+_FENCE_RE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+
+
+def strip_fences(text: str) -> str:
+    """
+    Убирает обёртку ```json ... ```, если она есть.
+    """
+    match = _FENCE_RE.search(text)
+    return match.group(1).strip() if match else text.strip()
+
+
+def remove_trailing_commas(text: str) -> str:
+    """
+    Удаляет запятые перед } и ] (вне строк).
+    """
+    result = []
+    in_string = escape = False
+    i = 0
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char == ',':
+            j = i + 1
+            while j < len(text) and text[j].isspace():
+                j += 1
+            if j < len(text) and text[j] in '}]':
+                i += 1
+                continue
+        result.append(char)
+        i += 1
+    return "".join(result)
+
+
+def json_objects(text: str) -> List[str]:
+    """
+    Возвращает все сбалансированные {...} фрагменты верхнего уровня, от длинных к коротким.
+    """
+    spans = []
+    depth = 0
+    start = None
+    in_string = escape = False
+    for i, char in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif char == '\\':
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            if depth:
+                in_string = True
+        elif char == '{':
+            if depth == 0:
+                start = i
+            depth += 1
+        elif char == '}' and depth:
+            depth -= 1
+            if depth == 0:
+                spans.append(text[start:i + 1])
+    return sorted(spans, key=len, reverse=True)
+
+
+class AgentCallsStreamParser:
+    """
+    Инкрементальный разбор ответа LLM: по мере поступления текста
+    возвращает каждый объект из массива agent_calls, как только он закрыт.
+    Каждый объект разбирается json.loads, поэтому результат совпадает
+    с соответствующим элементом json.loads всего ответа.
+    """
+
+    def __init__(self, key: str = "agent_calls"):
+        self.key = key
+        self.buffer = ""
+        self.calls: List[Dict[str, Any]] = []
+        self._pos = 0
+        # Стек открытых контейнеров: [тип '{' или '[', последний ключ, ожидается ли ключ]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._call_start: Optional[int] = None
+
+    def _in_calls_array(self) -> bool:
+        """
+        Проверяет, что вершина стека — массив agent_calls в объекте верхнего уровня.
+        """
+        return (
+            len(self._stack) == 2
+            and self._stack[0][0] == '{'
+            and self._stack[0][1] == self.key
+            and self._stack[1][0] == '['
+        )
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Добавляет очередной фрагмент ответа и возвращает вызовы, завершённые в нём.
+        """
+        self.buffer += chunk
+        buffer = self.buffer
+        found = []
+
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._on_string(buffer[self._string_start:i])
+            elif char == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif char in '{[':
+                if char == '{' and self._in_calls_array():
+                    self._call_start = i
+                self._stack.append([char, None, char == '{'])
+            elif char in '}]':
+                if self._stack:
+                    self._stack.pop()
+                if char == '}' and self._call_start is not None and self._in_calls_array():
+                    fragment = buffer[self._call_start:i + 1]
+                    try:
+                        call = json.loads(fragment)
+                    except json.JSONDecodeError:
+                        # Тот же ремонт, что и для всего ответа (см. JSONParser.loads)
+                        try:
+                            call = json.loads(remove_trailing_commas(fragment))
+                        except json.JSONDecodeError:
+                            call = None
+                    if isinstance(call, dict):
+                        self.calls.append(call)
+                        found.append(call)
+                    self._call_start = None
+            elif char == ',' and self._stack and self._stack[-1][0] == '{':
+                self._stack[-1][2] = True
+            i += 1
+
+        self._pos = i
+        return found
+
+    def _on_string(self, raw: str):
+        frame = self._stack[-1] if self._stack else None
+        if frame and frame[0] == '{' and frame[2]:
+            try:
+                frame[1] = json.loads('"' + raw + '"')
+            except json.JSONDecodeError:
+                frame[1] = raw
+            frame[2] = False
+
+
+class JSONParser:
+    """
+    Разбор JSON-ответов LLM: строгий json.loads, а при ошибке — локальный ремонт
+    (снятие ```-обёртки, удаление висячих запятых, поиск самого большого JSON-объекта),
+    чтобы не тратить на повторный запрос целую итерацию ReAct.
+    """
+
+    def __init__(self):
+        # Запускать вызовы агентов, не дожидаясь конца ответа LLM
+        self.early_dispatch = os.getenv("GPT_EARLY_DISPATCH", "1").lower() in ("1", "true", "yes")
+        # Структурированный вывод API: "" (выключен), "json_object" или "json_schema"
+        self.response_format_mode = os.getenv("GPT_RESPONSE_FORMAT", "").lower()
+
+        # strict — разобрано сразу, repaired — спасено ремонтом (сэкономленные итерации), failed — не разобрано
+        self.stats = {"strict": 0, "repaired": 0, "failed": 0}
+
+    def response_format(self) -> Optional[Dict[str, Any]]:
+        """
+        Возвращает параметр response_format для chat.completions или None.
+        """
+        if self.response_format_mode == "json_object":
+            return {"type": "json_object"}
+        if self.response_format_mode == "json_schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": "react_step", "schema": RESPONSE_SCHEMA, "strict": False},
+            }
+        return None
+
+    def repair(self, text: str) -> Optional[Any]:
+        """
+        Пытается разобрать повреждённый JSON. Возвращает объект или None.
+        """
+        stripped = strip_fences(text)
+        candidates = [stripped, remove_trailing_commas(stripped)]
+        for fragment in json_objects(stripped):
+            candidates.extend([fragment, remove_trailing_commas(fragment)])
+        for candidate in candidates:
+            try:
+                data = json.loads(candidate)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                return data
+        return None
+
+    def loads(self, text: str) -> Any:
+        """
+        Разбирает ответ LLM: сначала строго, затем с ремонтом.
+        Если не помог и ремонт, бросает исходную json.JSONDecodeError.
+        """
+        try:
+            data = json.loads(text)
+            self.stats["strict"] += 1
+            return data
+        except json.JSONDecodeError as error:
+            data = self.repair(text)
+            if data is None:
+                self.stats["failed"] += 1
+                raise error
+            self.stats["repaired"] += 1
+            logging.info(f"Ответ LLM исправлен локально, повторный запрос не нужен (всего: {self.stats['repaired']})")
+            return data
+
+    def agent_calls_parser(self) -> AgentCallsStreamParser:
+        """
+        Возвращает новый инкрементальный парсер agent_calls для одного ответа.
+        """
+        return AgentCallsStreamParser()
+
+# Singleton экземпляр парсера
+json_parser = JSONParser()
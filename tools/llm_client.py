@@ -0,0 +1,107 @@
+# tools/llm_client.py
+
+import os
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI
+
+
+class LLMClientPool:
+    """
+    Пул долгоживущих клиентов LLM, ключом служит пара (base_url, model).
+    Каждый клиент держит собственный пул HTTP-соединений с keep-alive,
+    поэтому TLS-рукопожатие выполняется один раз, а не на каждом запросе.
+    """
+
+    def __init__(self):
+        self.api_key = os.getenv("GPT_API_KEY")
+        # Базовый URL и модель по умолчанию (если не заданы, используются дефолтные)
+        self.base_url = os.getenv("GPT_BASE_URL", "https://api.openai.com/v1")
+        self.model = os.getenv("GPT_MODEL", "gpt-3.5-turbo")
+
+        # Параметры пула соединений и таймаутов
+        self.max_connections = int(os.getenv("GPT_MAX_CONNECTIONS", "100"))
+        self.max_keepalive_connections = int(os.getenv("GPT_MAX_KEEPALIVE_CONNECTIONS", "20"))
+        self.keepalive_expiry = float(os.getenv("GPT_KEEPALIVE_EXPIRY", "60"))
+        self.connect_timeout = float(os.getenv("GPT_CONNECT_TIMEOUT", "10"))
+        self.timeout = float(os.getenv("GPT_TIMEOUT", "120"))
+        self.max_retries = int(os.getenv("GPT_MAX_RETRIES", "2"))
+        # Общий предел одновременных запросов к LLM для всех пользователей
+        self.max_concurrent_requests = int(os.getenv("GPT_MAX_CONCURRENT_REQUESTS", "16"))
+
+        self._clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.stats = {"requests": 0, "waiting": 0, "max_waiting": 0}
+
+    def get_client(self, base_url: Optional[str] = None, model: Optional[str] = None) -> AsyncOpenAI:
+        """
+        Возвращает клиента для пары (base_url, model), создавая его при первом обращении.
+        """
+        key = (base_url or self.base_url, model or self.model)
+        client = self._clients.get(key)
+        if client is None:
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_keepalive_connections,
+                    keepalive_expiry=self.keepalive_expiry,
+                ),
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout),
+            )
+            client = AsyncOpenAI(
+                api_key=self.api_key,
+                base_url=key[0],
+                max_retries=self.max_retries,
+                http_client=http_client,
+            )
+            self._clients[key] = client
+            logging.info(f"Создан клиент LLM для {key[0]} ({key[1]})")
+        return client
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Занимает одно из GPT_MAX_CONCURRENT_REQUESTS мест для запроса к LLM;
+        при всплеске нагрузки запросы ждут своей очереди, а не открываются все сразу.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+        if self._semaphore.locked():
+            self.stats["waiting"] += 1
+            self.stats["max_waiting"] = max(self.stats["max_waiting"], self.stats["waiting"])
+            try:
+                await self._semaphore.acquire()
+            finally:
+                self.stats["waiting"] -= 1
+        else:
+            await self._semaphore.acquire()
+        self.stats["requests"] += 1
+        try:
+            yield
+        finally:
+            self._semaphore.release()
+
+    async def close(self):
+        """
+        Закрывает все клиенты и их пулы соединений.
+        """
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                await client.close()
+            except Exception as e:
+                logging.error(f"Ошибка при закрытии клиента LLM: {e}")
+        if clients:
+            logging.info(f"Закрыто клиентов LLM: {len(clients)}")
+
+# Singleton экземпляр пула клиентов LLM
+llm_client = LLMClientPool()
+
+# Асинхронная функция для корректного закрытия пула при завершении программы
+async def shutdown_llm_client():
+    await llm_client.close()
@@ -0,0 +1,166 @@
+# tools/memory_retention.py
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, Optional
+
+# Задача ставится в планировщик, работает с базой
+DEPENDS_ON = ("database", "scheduler")
+
+# Счётчики отчёта, которые суммируются по пользователям
+RETENTION_COUNTERS = ("expired", "compacted", "digests", "over_quota", "bytes_removed")
+
+
+def timestamp_before(seconds: float) -> Optional[str]:
+    """
+    Граница «старше seconds секунд» в формате колонки timestamp (UTC); None, если seconds <= 0.
+    """
+    if seconds <= 0:
+        return None
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - seconds))
+
+
+class MemoryRetention:
+    """
+    Хранение памяти пользователей (таблица memory), фоновая задача планировщика.
+    Удаление и сжатие записей включаются только явно — по умолчанию память не трогается:
+    - записи старше MEMORY_TTL_DAYS дней удаляются;
+    - записи старше MEMORY_COMPACT_AFTER_DAYS дней объединяются в дайджесты (один на день);
+    - у пользователя остаются только самые новые записи в пределах
+      MEMORY_MAX_ROWS_PER_USER записей и MEMORY_MAX_BYTES_PER_USER байт;
+    - когда бот простаивает (нет сообщений в обработке и записей в базу MEMORY_IDLE_SECONDS секунд),
+      освободившееся место возвращается ОС (incremental VACUUM) и выполняется PRAGMA optimize.
+      Базу, созданную без auto_vacuum=INCREMENTAL, переводит только полный VACUUM — он выполняется
+      лишь при MEMORY_FULL_VACUUM=1, иначе в лог пишется предупреждение;
+    - при нескольких воркерах (BOT_WORKERS) задача ставится только в воркере 0.
+    Каждый пользователь обрабатывается отдельной короткой транзакцией, поэтому
+    записи бота не ждут, пока пройдёт вся таблица. Квоты применяются при каждом
+    запуске (раз в MEMORY_RETENTION_INTERVAL секунд), а не при каждой записи.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("MEMORY_RETENTION_ENABLED", "1").lower() in ("1", "true", "yes")
+        self.interval = float(os.getenv("MEMORY_RETENTION_INTERVAL", "3600"))
+        # 0 — без ограничения: сохранённая пользователями память удаляется только по явной настройке
+        self.ttl = float(os.getenv("MEMORY_TTL_DAYS", "0")) * 86400
+        self.compact_after = float(os.getenv("MEMORY_COMPACT_AFTER_DAYS", "0")) * 86400
+        self.max_rows = int(os.getenv("MEMORY_MAX_ROWS_PER_USER", "0"))
+        self.max_bytes = int(os.getenv("MEMORY_MAX_BYTES_PER_USER", "0"))
+        self.idle_seconds = float(os.getenv("MEMORY_IDLE_SECONDS", "30"))
+        # Сколько страниц возвращать ОС за один запуск (0 — все), чтобы обслуживание было коротким
+        self.vacuum_pages = int(os.getenv("MEMORY_VACUUM_PAGES", "2000"))
+        # Полный VACUUM переписывает весь файл и блокирует запись — только с явного согласия
+        self.full_vacuum = os.getenv("MEMORY_FULL_VACUUM", "0").lower() in ("1", "true", "yes")
+        # Номер воркера задаёт супервизор; один процесс — воркер 0
+        self.primary = os.getenv("BOT_WORKER_INDEX", "0") == "0"
+        # Сколько ждать простоя после прохода по пользователям, прежде чем отложить обслуживание
+        self.idle_wait = self.interval / 2
+
+        self.database: Any = None
+        self.scheduler: Any = None
+        self.admission: Any = None
+        self._running = False
+        self._full_vacuum_warned = False
+        self.last_report: Optional[Dict[str, Any]] = None
+        self.stats = {"runs": 0, "maintenance_runs": 0, "bytes_reclaimed": 0, **{key: 0 for key in RETENTION_COUNTERS}}
+
+    def attach(self, database: Any, scheduler: Any = None, admission: Any = None):
+        """
+        Подключает базу, планировщик и (для определения простоя) admission. Задача
+        ставится в планировщик при запуске бота.
+        """
+        self.database = database
+        self.scheduler = scheduler
+        self.admission = admission
+
+    def schedule(self):
+        if not (self.enabled and self.database and self.scheduler):
+            return
+        if not self.primary:
+            # Проходы из нескольких процессов дублировали бы работу и спорили за блокировку записи
+            logging.info("Хранение памяти: задачу выполняет воркер 0")
+            return
+        self.scheduler.add_job(
+            self.run, "interval", seconds=self.interval, id="memory_retention",
+            replace_existing=True, max_instances=1, coalesce=True
+        )
+        if not self.has_policy():
+            logging.info("Хранение памяти: сроки и квоты не заданы, записи не удаляются (только обслуживание файла базы)")
+        logging.info(f"Хранение памяти: задача запускается раз в {self.interval:.0f} с")
+
+    def has_policy(self) -> bool:
+        return self.ttl > 0 or self.compact_after > 0 or self.max_rows > 0 or self.max_bytes > 0
+
+    def is_idle(self) -> bool:
+        if self.admission is not None and (self.admission.active or self.admission.pending):
+            return False
+        last_write_at = getattr(self.database, "last_write_at", 0.0)
+        return time.monotonic() - last_write_at >= self.idle_seconds
+
+    async def wait_idle(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while not self.is_idle():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(min(5.0, self.idle_seconds or 1.0))
+        return True
+
+    async def run(self) -> Optional[Dict[str, Any]]:
+        """
+        Один проход: политика хранения для каждого пользователя, затем обслуживание
+        базы в простое. Возвращает отчёт (он же сохраняется в last_report).
+        """
+        if self._running or self.database is None:
+            return None
+        self._running = True
+        try:
+            started = time.perf_counter()
+            report: Dict[str, Any] = {key: 0 for key in RETENTION_COUNTERS}
+            expire_before = timestamp_before(self.ttl)
+            compact_before = timestamp_before(self.compact_after)
+            users = await self.database.memory_users() if self.has_policy() else []
+            for user_id in users:
+                result = await self.database.apply_retention(
+                    user_id, expire_before, compact_before, self.max_rows, self.max_bytes
+                )
+                for key in RETENTION_COUNTERS:
+                    report[key] += result[key]
+            report["users"] = len(users)
+            report["retention_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+            if await self.wait_idle(self.idle_wait):
+                maintenance_started = time.perf_counter()
+                report.update(await self.database.maintain(self.vacuum_pages, self.full_vacuum))
+                if report["vacuum"] == "full_required" and not self._full_vacuum_warned:
+                    self._full_vacuum_warned = True
+                    logging.warning(
+                        "Хранение памяти: база создана без auto_vacuum=INCREMENTAL, свободное место не "
+                        "возвращается ОС. Однократный полный VACUUM включается MEMORY_FULL_VACUUM=1"
+                    )
+                report["maintenance_ms"] = round((time.perf_counter() - maintenance_started) * 1000, 1)
+                self.stats["maintenance_runs"] += 1
+                self.stats["bytes_reclaimed"] += report["bytes_reclaimed"]
+            else:
+                report["vacuum"] = "skipped"
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+            self.stats["runs"] += 1
+            for key in RETENTION_COUNTERS:
+                self.stats[key] += report[key]
+            self.last_report = report
+            logging.info("Хранение памяти: " + ", ".join(f"{key}={value}" for key, value in report.items()))
+            return report
+        except Exception as e:
+            logging.error(f"Ошибка при обслуживании памяти: {e}")
+            return None
+        finally:
+            self._running = False
+
+
+# Singleton экземпляр хранения памяти
+memory_retention = MemoryRetention()
+
+async def startup_memory_retention():
+    memory_retention.schedule()
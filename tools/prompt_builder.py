@@ -0,0 +1,191 @@
+# tools/prompt_builder.py
+
+import os
+import re
+import json
+import math
+import logging
+from typing import Any, Dict, List, Tuple
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken необязателен: без него токены оцениваются эвристикой
+    tiktoken = None
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]")
+
+
+class PromptBuilder:
+    """
+    Собирает промпты ReAct-цикла в пределах бюджета токенов:
+    убирает служебные поля контекста, дедуплицирует и обрезает результаты агентов
+    (старые — в первую очередь) и сворачивает прошлые итерации в короткие записи.
+    """
+
+    # Служебные поля контекста, которые не должны попадать в промпт
+    BOOKKEEPING_KEYS = {"calls_history", "progress_history", "last_reasoning", "result_iterations", "call_memo"}
+
+    def __init__(self):
+        self.budget = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+        # Максимум токенов на один результат агента до общего сжатия
+        self.result_tokens = int(os.getenv("PROMPT_RESULT_TOKENS", "800"))
+        self.min_result_tokens = 40
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                logging.warning(f"Не удалось загрузить кодировку tiktoken, используем оценку: {e}")
+
+        self.stats = {"prompts": 0, "compacted": 0, "tokens_before": 0, "tokens_after": 0}
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Считает токены локально: через tiktoken, если он установлен, иначе оценкой
+        (~4 символа на токен для латиницы и ~3 для кириллицы, знак препинания — токен).
+        """
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        tokens = 0
+        for word in _WORD_RE.findall(text):
+            tokens += math.ceil(len(word) / (4 if word.isascii() else 3))
+        return tokens
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """
+        Обрезает текст примерно до max_tokens токенов.
+        """
+        tokens = self.count_tokens(text)
+        if tokens <= max_tokens:
+            return text
+        keep = max(1, int(len(text) * max_tokens / tokens))
+        return text[:keep].rstrip() + " …[обрезано]"
+
+    def _results(self, context: Dict[str, Any]) -> List[Tuple[str, str, int]]:
+        """
+        Возвращает результаты агентов (ключ, текст, номер итерации) от новых к старым.
+        """
+        iterations = context.get("result_iterations", {})
+        results = [
+            (key, str(value), iterations.get(key, 0))
+            for key, value in context.items()
+            if key not in self.BOOKKEEPING_KEYS and key != "error"
+        ]
+        results.sort(key=lambda item: item[2], reverse=True)
+        return results
+
+    def _compact_results(self, context: Dict[str, Any], budget: int) -> Dict[str, str]:
+        """
+        Дедуплицирует результаты и обрезает их, пока они не уложатся в budget токенов.
+        Сначала сжимаются результаты прошлых итераций, затем все.
+        """
+        results = self._results(context)
+        latest = results[0][2] if results else 0
+
+        texts: Dict[str, str] = {}
+        caps: Dict[str, int] = {}
+        seen: Dict[str, str] = {}
+        for key, value, _ in results:
+            if value in seen:
+                texts[key] = f"(совпадает с результатом {seen[value]})"
+            else:
+                seen[value] = key
+                caps[key] = self.result_tokens
+                texts[key] = self.truncate(value, self.result_tokens)
+
+        values = {key: value for key, value, _ in results}
+        iterations = {key: iteration for key, _, iteration in results}
+        for only_old in (True, False):
+            cap = self.result_tokens
+            while sum(self.count_tokens(text) for text in texts.values()) > budget and cap > self.min_result_tokens:
+                cap //= 2
+                for key in caps:
+                    if only_old and iterations[key] == latest:
+                        continue
+                    caps[key] = min(caps[key], cap)
+                    texts[key] = self.truncate(values[key], caps[key])
+
+        # Порядок — как в контексте (хронологический)
+        return {key: texts[key] for key in context if key in texts}
+
+    def _history(self, context: Dict[str, Any]) -> List[str]:
+        """
+        Сворачивает прошлые итерации в короткие записи: какие агенты вызывались и с каким итогом.
+        """
+        records = []
+        progress_history = context.get("progress_history", [])
+        for index, calls in enumerate(context.get("calls_history", [])):
+            names = ", ".join(
+                f"{call.get('agent', '')}({self.truncate(str(call.get('args', '')), 10)})"
+                for call in calls if isinstance(call, dict)
+            ) if isinstance(calls, list) else ""
+            record = f"#{index + 1}: {names or 'без вызовов'}"
+            if index < len(progress_history):
+                progress = progress_history[index]
+                record += f" → успешно {progress.get('successful_calls', 0)}, ошибок {progress.get('failed_calls', 0)}"
+            records.append(record)
+        return records
+
+    def _report(self, kind: str, before: str, after: str) -> str:
+        tokens_before = self.count_tokens(before)
+        tokens_after = self.count_tokens(after)
+        self.stats["prompts"] += 1
+        self.stats["tokens_before"] += tokens_before
+        self.stats["tokens_after"] += tokens_after
+        if tokens_after < tokens_before:
+            self.stats["compacted"] += 1
+        logging.info(f"Промпт ({kind}): {tokens_before} → {tokens_after} токенов (бюджет {self.budget})")
+        return after
+
+    def iteration_prompt(self, user_message: str, context: Dict[str, Any]) -> str:
+        """
+        Промпт очередной итерации: задача, краткая история и сжатые результаты агентов.
+        """
+        before = [user_message]
+        filtered = {k: v for k, v in context.items() if k not in self.BOOKKEEPING_KEYS}
+        if filtered:
+            before.append("\nПредыдущие результаты:")
+            before.extend(f"\nРезультат от {k}:\n{v}" for k, v in filtered.items() if k != "error")
+        if "error" in context:
+            before.append(f"\nПредыдущая ошибка:\n{context['error']}")
+
+        parts = [user_message]
+        history = self._history(context)
+        if history:
+            parts.append("\nВыполненные итерации:\n" + "\n".join(history))
+        fixed = self.count_tokens("\n".join(parts)) + self.count_tokens(str(context.get("error", "")))
+        results = self._compact_results(context, max(0, self.budget - fixed))
+        if results:
+            parts.append("\nПредыдущие результаты:")
+            parts.extend(f"\nРезультат от {k}:\n{v}" for k, v in results.items())
+        if "error" in context:
+            parts.append(f"\nПредыдущая ошибка:\n{context['error']}")
+
+        return self._report("итерация", "\n".join(before), "\n".join(parts))
+
+    def final_prompt(self, user_message: str, context: Dict[str, Any]) -> str:
+        """
+        Промпт финального ответа: вместо полного дампа контекста — сжатые результаты,
+        ошибка и краткая история итераций.
+        """
+        tail = "Пожалуйста, сформируй финальный ответ, учитывая все полученные результаты и ошибки."
+        before = (
+            f"Задача: {user_message}\n\n"
+            f"Контекст выполнения:\n{json.dumps(context, ensure_ascii=False, indent=2, default=str)}\n\n"
+            f"{tail}"
+        )
+
+        compact: Dict[str, Any] = {"history": self._history(context)}
+        if "error" in context:
+            compact["error"] = context["error"]
+        fixed = self.count_tokens(user_message + tail + json.dumps(compact, ensure_ascii=False))
+        compact["results"] = self._compact_results(context, max(0, self.budget - fixed))
+        after = (
+            f"Задача: {user_message}\n\n"
+            f"Контекст выполнения:\n{json.dumps(compact, ensure_ascii=False)}\n\n"
+            f"{tail}"
+        )
+        return self._report("финальный ответ", before, after)
+
+# Singleton экземпляр сборщика промптов
+prompt_builder = PromptBuilder()
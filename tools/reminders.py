@@ -0,0 +1,271 @@
+# tools/reminders.py
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+# Напоминания хранятся в базе, а сообщения уходят через очередь отправки
+DEPENDS_ON = ("database", "send_queue")
+
+# Ключ после любого реального: «загружено всё до момента until включительно»
+_KEY_MAX = 2 ** 62
+
+# Запись в куче: (next_fire_at, user_id, id, время, часовой пояс, описание) — как строка load_reminders
+Entry = Tuple[int, int, int, str, str, str]
+
+
+def parse_timezone(timezone: Optional[str]) -> ZoneInfo:
+    try:
+        return ZoneInfo(timezone or "UTC")
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo("UTC")
+
+
+def next_fire_time(time_str: str, timezone: str, after: Optional[float] = None) -> int:
+    """
+    Ближайшее после after (unix-время) наступление ЧЧ:ММ по местному времени пояса timezone.
+    Следующий день считается по календарю пояса, поэтому при переходе на летнее время
+    напоминание срабатывает в то же местное время, а не сдвигается на час.
+    """
+    after = time.time() if after is None else after
+    zone = parse_timezone(timezone)
+    hours, minutes = map(int, time_str.split(":"))
+    day = datetime.fromtimestamp(after, zone).date()
+    while True:
+        fire_at = datetime(day.year, day.month, day.day, hours, minutes, tzinfo=zone).timestamp()
+        if fire_at > after:
+            return int(fire_at)
+        day += timedelta(days=1)
+
+
+class ReminderEngine:
+    """
+    Ежедневные напоминания с хранением в таблице reminders (переживают перезапуск).
+    Все напоминания обслуживает один цикл событий с кучей по времени срабатывания:
+    - в памяти только ближайшие — срабатывающие в пределах REMINDER_HORIZON секунд и не больше
+      REMINDER_MAX_LOADED штук; остальные читаются из базы по индексу next_fire_at, когда подходит время.
+      Память и нагрузка не зависят от общего числа напоминаний;
+    - после срабатывания next_fire_at переносится на следующий день одним пакетом
+      (до отправки: при сбое напоминание будет пропущено, но не продублировано).
+      Перенос условный — строка меняется, только если её время ещё прежнее, — поэтому
+      при нескольких воркерах (BOT_WORKERS) напоминание отправляет только один из них;
+    - пропущенные во время простоя бота напоминания отправляются, если опоздание не больше
+      REMINDER_MISFIRE_GRACE секунд, иначе переносятся на следующее срабатывание.
+    """
+
+    def __init__(self):
+        self.horizon = int(os.getenv("REMINDER_HORIZON", "3600"))
+        self.max_loaded = int(os.getenv("REMINDER_MAX_LOADED", "10000"))
+        self.misfire_grace = int(os.getenv("REMINDER_MISFIRE_GRACE", "3600"))
+        self.max_in_flight = int(os.getenv("REMINDER_MAX_IN_FLIGHT", "500"))
+
+        self.database: Any = None
+        self.bot: Any = None
+        self.send_queue: Any = None
+
+        self._heap: List[Entry] = []
+        # (user_id, id) -> запись в куче; удалённые напоминания remove убирает и отсюда, и из кучи
+        self._loaded: Dict[Tuple[int, int], Entry] = {}
+        # Всё с ключом не больше _cursor уже загружено (или сработало)
+        self._cursor: Tuple[int, int, int] = (-1, 0, 0)
+        self._lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._task: Optional[asyncio.Task] = None
+        self._sending: Set[asyncio.Task] = set()
+        self.stats = {"fired": 0, "missed": 0, "failed": 0, "claimed_elsewhere": 0, "refills": 0, "max_lag": 0.0}
+
+    def attach(self, database: Any, bot: Any, send_queue: Any = None):
+        self.database = database
+        self.bot = bot
+        self.send_queue = send_queue
+
+    @property
+    def loaded(self) -> int:
+        return len(self._loaded)
+
+    async def start(self):
+        """
+        Переносит напоминания прежнего формата и запускает цикл.
+        """
+        if self.database is None or (self._task is not None and not self._task.done()):
+            return
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_in_flight)
+        await self.database.migrate_user_reminders(next_fire_time)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+
+    async def add(self, user_id: int, time_str: str, description: str, timezone: str) -> Tuple[int, int]:
+        """
+        Создаёт напоминание. Возвращает его id и время первого срабатывания (unix-время).
+        """
+        fire_at = next_fire_time(time_str, timezone)
+        if self._lock is None:
+            return await self.database.add_reminder(user_id, time_str, timezone, description, fire_at), fire_at
+        # Под блокировкой подгрузки: запись либо попадает в прочитанную страницу, либо видна здесь по _cursor
+        async with self._lock:
+            reminder_id = await self.database.add_reminder(user_id, time_str, timezone, description, fire_at)
+            self._push((fire_at, user_id, reminder_id, time_str, timezone, description))
+        return reminder_id, fire_at
+
+    async def remove(self, user_id: int, reminder_id: Optional[int] = None) -> int:
+        """
+        Удаляет напоминание пользователя (или все). Возвращает число удалённых.
+        """
+        if self._lock is None:
+            return await self.database.delete_reminders(user_id, reminder_id)
+        # Под блокировкой подгрузки, как и add: иначе страница, прочитанная до удаления, вернула бы напоминание в кучу
+        async with self._lock:
+            deleted = await self.database.delete_reminders(user_id, reminder_id)
+            removed = {key for key in self._loaded if key[0] == user_id and reminder_id in (None, key[1])}
+            for key in removed:
+                del self._loaded[key]
+            if removed:
+                self._heap = [entry for entry in self._heap if (entry[1], entry[2]) not in removed]
+                heapq.heapify(self._heap)
+                self._wakeup.set()  # Освободилось место в окне
+        return deleted
+
+    async def user_reminders(self, user_id: int) -> List[Tuple]:
+        return await self.database.get_reminders(user_id)
+
+    def _push(self, entry: Entry):
+        # В кучу попадают только записи, которые подгрузка уже миновала, остальные она прочитает сама
+        if entry[:3] > self._cursor:
+            return
+        key = (entry[1], entry[2])
+        if key in self._loaded:
+            return
+        self._loaded[key] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _refill(self):
+        """
+        Подгружает из базы ближайшие напоминания — до горизонта и не больше max_loaded в памяти.
+        """
+        async with self._lock:
+            until = int(time.time()) + self.horizon
+            while self.loaded < self.max_loaded and self._cursor < (until, _KEY_MAX, _KEY_MAX):
+                limit = self.max_loaded - self.loaded
+                rows = await self.database.load_reminders(self._cursor, until, limit)
+                self.stats["refills"] += 1
+                # Курсор сдвигается до _push: записи страницы должны оказаться «позади» него
+                self._cursor = tuple(rows[-1][:3]) if len(rows) == limit else (until, _KEY_MAX, _KEY_MAX)
+                for row in rows:
+                    self._push(tuple(row))
+
+    def _next_refill_at(self) -> float:
+        # Всё до горизонта загружено — подгружать, когда время подходит к его границе
+        if self._cursor[1] == _KEY_MAX:
+            return self._cursor[0] - self.horizon // 2
+        # Окно заполнено раньше горизонта — подгружать, когда срабатывания освободят половину места
+        return 0.0 if self.loaded < self.max_loaded // 2 else float("inf")
+
+    async def _run(self):
+        while True:
+            try:
+                # Сбрасывается до расчёта ожидания: напоминание, добавленное после этого, разбудит цикл
+                self._wakeup.clear()
+                if time.time() >= self._next_refill_at():
+                    await self._refill()
+                await self._fire_due()
+                wake_at = self._next_refill_at()
+                if self._heap:
+                    wake_at = min(wake_at, self._heap[0][0])
+                delay = wake_at - time.time()
+                if delay > 0:
+                    # Не wait_for: в Python < 3.12 он теряет отмену, если событие установлено одновременно с ней,
+                    # и stop() ждал бы цикл вечно
+                    waiter = asyncio.ensure_future(self._wakeup.wait())
+                    try:
+                        await asyncio.wait({waiter}, timeout=min(delay, self.horizon))
+                    finally:
+                        waiter.cancel()
+                else:
+                    await asyncio.sleep(0)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Ошибка в цикле напоминаний: {e}")
+                await asyncio.sleep(1)
+
+    async def _fire_due(self):
+        now = time.time()
+        due: List[Entry] = []
+        while self._heap and self._heap[0][0] <= now:
+            entry = heapq.heappop(self._heap)
+            key = (entry[1], entry[2])
+            if self._loaded.get(key) is not entry:
+                continue  # Удалено или уже заменено
+            del self._loaded[key]
+            due.append(entry)
+        if not due:
+            return
+
+        claims = []
+        for fire_at, user_id, reminder_id, time_str, timezone, description in due:
+            claims.append((user_id, reminder_id, fire_at, next_fire_time(time_str, timezone, max(now, fire_at))))
+        # Напоминание отправляет тот процесс, который первым перенёс его строку; у остальных оно просто выпадает из окна
+        claimed = await self.database.claim_reminders(claims)
+        next_fire = {(user_id, reminder_id): next_fire_at for user_id, reminder_id, _, next_fire_at in claims}
+        due = [entry for entry in due if entry[1:3] in claimed]
+        self.stats["claimed_elsewhere"] += len(claims) - len(due)
+        for entry in due:
+            self._push((next_fire[entry[1:3]],) + entry[1:])
+
+        for fire_at, user_id, _, _, _, description in due:
+            lag = now - fire_at
+            if lag > self.misfire_grace:
+                self.stats["missed"] += 1
+                continue
+            self.stats["max_lag"] = max(self.stats["max_lag"], lag)
+            # Число одновременных отправок ограничено: цикл ждёт, если очередь отправки не успевает
+            await self._slots.acquire()
+            task = asyncio.ensure_future(self._send(user_id, description))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+
+    async def _send(self, user_id: int, description: str):
+        try:
+            text = "Это ваше ежедневное напоминание!"
+            if description:
+                text += f"\nОписание: {description}"
+            if self.send_queue is not None:
+                # Напоминания пропускают вперёд ответы пользователям и не превышают лимиты Telegram
+                await self.send_queue.send(
+                    user_id, lambda: self.bot.send_message(user_id, text), priority=self.send_queue.BULK
+                )
+            else:
+                await self.bot.send_message(user_id, text)
+            self.stats["fired"] += 1
+        except Exception as e:
+            self.stats["failed"] += 1
+            logging.error(f"Не удалось отправить напоминание пользователю {user_id}: {e}")
+        finally:
+            self._slots.release()
+
+
+# Singleton экземпляр движка напоминаний
+reminders = ReminderEngine()
+
+async def startup_reminders():
+    await reminders.start()
+
+async def shutdown_reminders():
+    await reminders.stop()
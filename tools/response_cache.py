@@ -0,0 +1,248 @@
+# tools/response_cache.py
+
+import os
+import re
+import json
+import asyncio
+import time
+import zlib
+import random
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from tools._lru import TTLCache
+
+# Сохранённые записи загружаются из базы при запуске
+DEPENDS_ON = ("database",)
+
+# Параметры MinHash/LSH: 64 хеш-функции, 16 полос по 4 строки
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+_PRIME = (1 << 61) - 1
+_rng = random.Random(20240101)
+_PERMUTATIONS = [(_rng.randrange(1, _PRIME), _rng.randrange(0, _PRIME)) for _ in range(NUM_PERMUTATIONS)]
+
+
+def normalize_message(text: str) -> str:
+    """
+    Приводит сообщение к каноническому виду: нижний регистр, ё → е,
+    без пунктуации и лишних пробелов.
+    """
+    text = text.lower().replace("ё", "е")
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+
+def shingles(text: str, n: int = 3) -> Set[str]:
+    """
+    Возвращает множество символьных n-грамм текста.
+    """
+    if len(text) <= n:
+        return {text}
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+def minhash(items: Set[str]) -> List[int]:
+    """
+    Вычисляет MinHash-сигнатуру множества n-грамм.
+    """
+    hashes = [zlib.crc32(item.encode("utf-8")) for item in items]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def plan_arguments(response: str) -> Set[str]:
+    """
+    Слова аргументов вызовов агентов (agent_calls) из закэшированного ответа LLM.
+    Ответ без вызовов (или не JSON) аргументов не содержит.
+    """
+    try:
+        calls = json.loads(response).get("agent_calls", [])
+    except (ValueError, AttributeError):
+        return set()
+    words: Set[str] = set()
+    for call in calls if isinstance(calls, list) else []:
+        if not isinstance(call, dict):
+            continue
+        args = call.get("args", "")
+        if not isinstance(args, str):
+            args = json.dumps(args, ensure_ascii=False)
+        words.update(normalize_message(args).split())
+    return words
+
+
+class ResponseCache:
+    """
+    Двухуровневый кэш ответов LLM на первое сообщение пользователя:
+    - точное совпадение по (модель, хеш системного промпта, нормализованное сообщение);
+    - почти-дубликаты: MinHash/LSH по символьным n-граммам с порогом сходства Жаккара;
+      план подходит, только если все слова аргументов его вызовов агентов есть в новом сообщении.
+    Оба уровня — LRU с временем жизни записей. Записи можно сохранять в Database.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("LLM_CACHE_ENABLED", "1").lower() in ("1", "true", "yes")
+        self.near_enabled = os.getenv("LLM_CACHE_NEAR", "1").lower() in ("1", "true", "yes")
+        self.persist = os.getenv("LLM_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("LLM_CACHE_TTL", "3600"))
+        self.near_ttl = float(os.getenv("LLM_CACHE_NEAR_TTL", "600"))
+        self.maxsize = int(os.getenv("LLM_CACHE_SIZE", "10000"))
+        self.near_maxsize = int(os.getenv("LLM_CACHE_NEAR_SIZE", "5000"))
+        self.near_threshold = float(os.getenv("LLM_CACHE_NEAR_THRESHOLD", "0.65"))
+        # Длинные сообщения почти никогда не повторяются, не тратим на них сигнатуры
+        self.near_max_length = 500
+
+        self._exact = TTLCache(self.maxsize, self.ttl)
+        # key -> (scope, normalized, shingles, слова аргументов, response); bucket -> set(key)
+        self._near = TTLCache(self.near_maxsize, self.near_ttl, on_evict=self._forget_near)
+        self._buckets: Dict[Tuple[str, int, int], Set[str]] = {}
+        self._bands: Dict[str, List[Tuple[str, int, int]]] = {}
+        self.database = None
+        self._saving: Set[asyncio.Task] = set()
+
+        self.stats = {"exact_hits": 0, "near_hits": 0, "misses": 0, "stores": 0, "skipped": 0}
+
+    @staticmethod
+    def scope(model: str, system_prompt: str) -> str:
+        """
+        Область кэша: ответы разных моделей и системных промптов не смешиваются.
+        """
+        prompt_hash = hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{model}:{prompt_hash}"
+
+    @staticmethod
+    def _key(scope: str, normalized: str) -> str:
+        return hashlib.sha256(f"{scope}\n{normalized}".encode("utf-8")).hexdigest()
+
+    def attach_database(self, database):
+        """
+        Подключает постоянное хранилище (сохранённые записи загружает load_persisted при запуске).
+        """
+        self.database = database
+
+    async def load_persisted(self):
+        """
+        Прогревает кэш записями из базы данных.
+        """
+        if not (self.persist and self.database):
+            return
+        now = time.time()
+        rows = await self.database.load_llm_cache(now - self.ttl, self.maxsize)
+        # Записи идут от новых к старым — добавляем в обратном порядке, чтобы сохранить LRU
+        for cache_key, scope, normalized, response, created_at in reversed(rows):
+            age = now - created_at
+            self._exact.set(cache_key, response, ttl=self.ttl - age)
+            if self.near_enabled and age < self.near_ttl:
+                self._store_near(cache_key, scope, normalized, response, ttl=self.near_ttl - age)
+        logging.info(f"Кэш ответов LLM: загружено записей из базы данных: {len(rows)}")
+
+    def get(self, message: str, model: str, system_prompt: str) -> Optional[str]:
+        """
+        Ищет ответ сначала по точному совпадению, затем среди почти-дубликатов.
+        """
+        if not self.enabled:
+            return None
+        scope = self.scope(model, system_prompt)
+        normalized = normalize_message(message)
+
+        response = self._exact.get(self._key(scope, normalized))
+        if response is not None:
+            self.stats["exact_hits"] += 1
+            return response
+
+        if self.near_enabled and normalized and len(normalized) <= self.near_max_length:
+            response = self._lookup_near(scope, normalized)
+            if response is not None:
+                self.stats["near_hits"] += 1
+                return response
+
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, message: str, model: str, system_prompt: str, response: str):
+        """
+        Сохраняет ответ в оба уровня кэша (и в базу данных, если она подключена).
+        """
+        if not self.enabled:
+            return
+        scope = self.scope(model, system_prompt)
+        normalized = normalize_message(message)
+        cache_key = self._key(scope, normalized)
+
+        self._exact.set(cache_key, response)
+        if self.near_enabled and normalized and len(normalized) <= self.near_max_length:
+            self._store_near(cache_key, scope, normalized, response)
+        if self.persist and self.database:
+            # Запись в базу выполняется в фоне и не задерживает ответ
+            task = asyncio.ensure_future(
+                self.database.save_llm_cache(cache_key, scope, normalized, response, time.time())
+            )
+            self._saving.add(task)
+            task.add_done_callback(self._saving.discard)
+        self.stats["stores"] += 1
+
+    def skip(self):
+        """
+        Отмечает ответ, который нельзя кэшировать (например, план с агентом времени).
+        """
+        self.stats["skipped"] += 1
+
+    def _band_keys(self, scope: str, signature: List[int]) -> List[Tuple[str, int, int]]:
+        return [
+            (scope, band, hash(tuple(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS])))
+            for band in range(LSH_BANDS)
+        ]
+
+    def _store_near(self, cache_key: str, scope: str, normalized: str, response: str, ttl: Optional[float] = None):
+        grams = shingles(normalized)
+        self._forget_near(cache_key, None)
+        bands = self._band_keys(scope, minhash(grams))
+        for band_key in bands:
+            self._buckets.setdefault(band_key, set()).add(cache_key)
+        self._bands[cache_key] = bands
+        self._near.set(cache_key, (scope, normalized, grams, plan_arguments(response), response), ttl=ttl)
+
+    def _forget_near(self, cache_key: str, value: Any):
+        for band_key in self._bands.pop(cache_key, []):
+            bucket = self._buckets.get(band_key)
+            if bucket is not None:
+                bucket.discard(cache_key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def _lookup_near(self, scope: str, normalized: str) -> Optional[str]:
+        grams = shingles(normalized)
+        words = set(normalized.split())
+        numbers = re.findall(r"\d+", normalized)
+        candidates = set()
+        for band_key in self._band_keys(scope, minhash(grams)):
+            candidates.update(self._buckets.get(band_key, ()))
+
+        best, best_score = None, self.near_threshold
+        for cache_key in candidates:
+            entry = self._near.get(cache_key)
+            if entry is None:
+                continue
+            _, cached_text, cached_grams, arguments, response = entry
+            # Сообщения, различающиеся числами («2+2» и «2+3»), не считаются дубликатами
+            if re.findall(r"\d+", cached_text) != numbers:
+                continue
+            # План для Рима не годится для Парижа: аргументы вызовов должны быть в новом сообщении
+            if not arguments <= words:
+                continue
+            score = len(grams & cached_grams) / len(grams | cached_grams)
+            if score >= best_score:
+                best, best_score = response, score
+        return best
+
+# Singleton экземпляр кэша ответов LLM
+response_cache = ResponseCache()
+
+async def startup_response_cache():
+    await response_cache.load_persisted()
+
+async def shutdown_response_cache():
+    # Дописываем в базу ответы, сохранение которых ещё не закончилось
+    if response_cache._saving:
+        await asyncio.gather(*list(response_cache._saving), return_exceptions=True)
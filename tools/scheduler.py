@@ -1,9 +1,37 @@
 # tools/scheduler.py
 
+import asyncio
+
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
-scheduler = AsyncIOScheduler()
-scheduler.start()
+
+class LazyAsyncIOScheduler(AsyncIOScheduler):
+    """
+    Планировщик, который запускается при старте бота или при добавлении первой
+    задачи внутри цикла событий, а не при импорте: иначе он привязывается
+    к циклу, в котором бот не работает.
+    """
+
+    def ensure_started(self):
+        if self.running:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # Вне цикла событий задачи ждут startup_scheduler
+        self.start()
+
+    def add_job(self, *args, **kwargs):
+        job = super().add_job(*args, **kwargs)
+        self.ensure_started()
+        return job
+
+
+scheduler = LazyAsyncIOScheduler()
+
+async def startup_scheduler():
+    scheduler.ensure_started()
 
 async def shutdown_scheduler():
-    scheduler.shutdown()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
@@ -0,0 +1,278 @@
+# tools/send_queue.py
+
+import os
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from aiogram.exceptions import TelegramRetryAfter
+
+
+class TokenBucket:
+    """
+    Корзина токенов: rate токенов в секунду, не больше capacity за раз.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: Optional[float] = None) -> float:
+        """
+        Сколько секунд осталось до появления токена (0 — токен есть).
+        """
+        now = time.monotonic() if now is None else now
+        self._refill(now)
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """
+        Останавливает выдачу токенов (например, по retry_after от Telegram).
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class SendQueue:
+    """
+    Общая очередь исходящих сообщений Telegram:
+    - глобальный лимит (около 30 сообщений в секунду) и лимиты каждого чата — корзины токенов;
+    - приоритеты: ответы пользователям отправляются раньше правок потокового предпросмотра,
+      а те — раньше напоминаний и рассылок;
+    - при 429 (retry_after) чат ставится на паузу, а сообщение — обратно в очередь;
+    - очередь ограничена: при переполнении отправитель ждёт свободного места.
+    """
+
+    # Приоритеты (меньше — важнее)
+    INTERACTIVE = 0
+    PREVIEW = 5  # Промежуточные правки потокового ответа
+    BULK = 10
+
+    def __init__(self):
+        self.global_rate = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+        self.chat_rate = float(os.getenv("SEND_CHAT_RATE", "1"))
+        self.chat_burst = float(os.getenv("SEND_CHAT_BURST", "3"))
+        self.group_rate = float(os.getenv("SEND_GROUP_RATE", "0.33"))  # ~20 сообщений в минуту
+        self.max_size = int(os.getenv("SEND_QUEUE_SIZE", "1000"))
+        self.max_retries = int(os.getenv("SEND_MAX_RETRIES", "3"))
+        # Сколько close() ждёт отправки оставшихся сообщений, прежде чем отказаться от них
+        self.close_timeout = float(os.getenv("SEND_CLOSE_TIMEOUT", "10"))
+        self.max_chats = 10000
+
+        self._global = TokenBucket(self.global_rate, self.global_rate)
+        self._chats: "OrderedDict[int, TokenBucket]" = OrderedDict()
+        # (приоритет, порядковый номер, задание); отложенные — (время готовности, номер, задание)
+        self._queue: List[Tuple[int, int, Dict[str, Any]]] = []
+        self._deferred: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._counter = itertools.count()
+        # Создаются один раз: отправители, ждущие места, не должны остаться на старом объекте при перезапуске
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._worker: Optional[asyncio.Task] = None
+        self._sending: set = set()
+
+        self.stats = {"sent": 0, "failed": 0, "retries": 0, "max_depth": 0, "latency_total": 0.0, "max_latency": 0.0}
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue) + len(self._deferred)
+
+    def metrics(self) -> Dict[str, float]:
+        """
+        Глубина очереди и задержка отправки (от постановки в очередь до ответа Telegram).
+        """
+        sent = self.stats["sent"]
+        return {
+            "depth": self.depth,
+            "in_flight": len(self._sending),
+            "sent": sent,
+            "failed": self.stats["failed"],
+            "retries": self.stats["retries"],
+            "max_depth": self.stats["max_depth"],
+            "avg_latency": self.stats["latency_total"] / sent if sent else 0.0,
+            "max_latency": self.stats["max_latency"],
+        }
+
+    def _chat_bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Отрицательный id — группа или канал, там лимиты строже
+            if chat_id < 0:
+                bucket = TokenBucket(self.group_rate, 1)
+            else:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            self._chats[chat_id] = bucket
+        self._chats.move_to_end(chat_id)
+        while len(self._chats) > self.max_chats:
+            self._chats.popitem(last=False)
+        return bucket
+
+    def _start(self):
+        if self._worker is not None and self._worker.done() and not self._worker.cancelled():
+            error = self._worker.exception()
+            if error is not None:
+                logging.error(f"Очередь отправки остановилась с ошибкой, перезапускаем: {error}")
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+            self._wakeup.set()  # Новый цикл сразу разбирает накопленные задания
+
+    async def send(
+        self,
+        chat_id: int,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int = INTERACTIVE
+    ) -> Any:
+        """
+        Ставит отправку в очередь и возвращает её результат (например, Message).
+        factory — функция, создающая корутину отправки; при повторе вызывается заново.
+        """
+        self._start()
+        async with self._space:
+            await self._space.wait_for(lambda: self.depth < self.max_size)
+
+        job = {
+            "chat_id": chat_id,
+            "factory": factory,
+            "priority": priority,
+            "future": asyncio.get_running_loop().create_future(),
+            "enqueued_at": time.monotonic(),
+            "attempts": 0,
+        }
+        heapq.heappush(self._queue, (priority, next(self._counter), job))
+        self.stats["max_depth"] = max(self.stats["max_depth"], self.depth)
+        # Пока отправитель ждал места, цикл мог остановиться (close) — запускаем заново
+        self._start()
+        self._wakeup.set()
+        return await job["future"]
+
+    async def _run(self):
+        while True:
+            now = time.monotonic()
+            while self._deferred and self._deferred[0][0] <= now:
+                _, _, job = heapq.heappop(self._deferred)
+                heapq.heappush(self._queue, (job["priority"], next(self._counter), job))
+
+            if not self._queue:
+                self._wakeup.clear()
+                timeout = self._deferred[0][0] - now if self._deferred else None
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            wait = self._global.delay(now)
+            if wait > 0:
+                await asyncio.sleep(wait)
+                continue
+
+            _, _, job = heapq.heappop(self._queue)
+            if job["future"].done():
+                # Ожидавший отменил отправку (например, устаревшую правку предпросмотра) — лимиты не тратим
+                await self._notify_space()
+                continue
+            bucket = self._chat_bucket(job["chat_id"])
+            chat_wait = bucket.delay(now)
+            if chat_wait > 0:
+                # Чат исчерпал свой лимит — откладываем, не задерживая остальные чаты
+                heapq.heappush(self._deferred, (now + chat_wait, next(self._counter), job))
+                continue
+
+            self._global.take()
+            bucket.take()
+            task = asyncio.ensure_future(self._deliver(job))
+            self._sending.add(task)
+            task.add_done_callback(self._sending.discard)
+            await self._notify_space()
+
+    async def _notify_space(self):
+        async with self._space:
+            self._space.notify_all()
+
+    async def _deliver(self, job: Dict[str, Any]):
+        future = job["future"]
+        job["attempts"] += 1
+        try:
+            result = await job["factory"]()
+        except asyncio.CancelledError:
+            # Отправку прервал close() — отправитель получает ошибку, а не ждёт вечно
+            if not future.done():
+                future.set_exception(RuntimeError("Очередь отправки остановлена"))
+            raise
+        except TelegramRetryAfter as e:
+            if job["attempts"] > self.max_retries:
+                self.stats["failed"] += 1
+                if not future.done():
+                    future.set_exception(e)
+                return
+            logging.warning(f"Лимит Telegram для чата {job['chat_id']}, повтор через {e.retry_after} с")
+            self.stats["retries"] += 1
+            self._chat_bucket(job["chat_id"]).pause(e.retry_after)
+            heapq.heappush(self._deferred, (time.monotonic() + e.retry_after, next(self._counter), job))
+            self._wakeup.set()
+            return
+        except Exception as e:
+            self.stats["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+            return
+
+        latency = time.monotonic() - job["enqueued_at"]
+        self.stats["sent"] += 1
+        self.stats["latency_total"] += latency
+        self.stats["max_latency"] = max(self.stats["max_latency"], latency)
+        if not future.done():
+            future.set_result(result)
+
+    async def close(self, timeout: Optional[float] = None):
+        """
+        Дожидается отправки поставленных сообщений (не дольше timeout, по умолчанию
+        SEND_CLOSE_TIMEOUT секунд) и останавливает очередь. Не отправленные к этому
+        времени сообщения завершаются ошибкой у отправителей.
+        """
+        deadline = time.monotonic() + (self.close_timeout if timeout is None else timeout)
+        while (self.depth or self._sending) and time.monotonic() < deadline:
+            if self.depth:
+                self._start()  # Без работающего цикла очередь не опустеет
+            await asyncio.sleep(0.05)
+
+        dropped = [job for _, _, job in self._queue + self._deferred]
+        self._queue, self._deferred = [], []
+        for task in list(self._sending):
+            task.cancel()
+        if dropped or self._sending:
+            logging.warning(f"Очередь отправки остановлена, не отправлено сообщений: {len(dropped) + len(self._sending)}")
+        for job in dropped:
+            if not job["future"].done():
+                job["future"].set_exception(RuntimeError("Очередь отправки остановлена"))
+        if self._sending:
+            await asyncio.gather(*list(self._sending), return_exceptions=True)
+        if self._worker:
+            self._worker.cancel()
+            self._worker = None
+        await self._notify_space()
+
+# Singleton экземпляр очереди исходящих сообщений
+send_queue = SendQueue()
+
+async def shutdown_send_queue():
+    await send_queue.close()
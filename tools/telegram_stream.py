@@ -0,0 +1,272 @@
+# tools/telegram_stream.py
+
+import os
+import re
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Union
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+from aiogram.types import Message
+
+# Максимальная длина текста одного сообщения Telegram
+MESSAGE_LIMIT = 4096
+
+
+# Сколько символов в конце буфера перечитывается при поиске начала поля: его заголовок
+# ("key" : ") мог прийти не целиком
+_SEARCH_OVERLAP = 256
+_SPECIAL = re.compile(r'["\\]')
+_ESCAPES = {'n': '\n', 't': '\t', 'r': '\r', 'b': '\b', 'f': '\f'}
+
+
+class PartialString:
+    """
+    Достаёт значение строкового поля key из незавершённого JSON, который растёт по мере генерации.
+    Позиция разбора сохраняется между вызовами feed, поэтому каждый новый фрагмент
+    ответа разбирается один раз, а не вместе со всем накопленным буфером.
+    """
+
+    def __init__(self, key: str):
+        self._pattern = re.compile(r'"%s"\s*:\s*"' % re.escape(key))
+        self.reset()
+
+    def reset(self):
+        self._length = 0
+        self._search_from = 0
+        self._pos: Optional[int] = None
+        self._parts: List[str] = []
+        self._done = False
+
+    @property
+    def value(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, buffer: str) -> bool:
+        """
+        Разбирает новую часть buffer (buffer — весь ответ, полученный к этому моменту).
+        Возвращает True, если поле уже началось.
+        """
+        if len(buffer) < self._length:
+            self.reset()  # Новый ответ
+        self._length = len(buffer)
+        if self._pos is None:
+            match = self._pattern.search(buffer, self._search_from)
+            if not match:
+                self._search_from = max(0, len(buffer) - _SEARCH_OVERLAP)
+                return False
+            self._pos = match.end()
+        if not self._done:
+            self._scan(buffer)
+        return True
+
+    def _scan(self, buffer: str):
+        i, end = self._pos, len(buffer)
+        while i < end:
+            match = _SPECIAL.search(buffer, i)
+            if match is None:
+                self._parts.append(buffer[i:])
+                i = end
+                break
+            if match.start() > i:
+                self._parts.append(buffer[i:match.start()])
+            i = match.start()
+            if buffer[i] == '"':
+                self._done = True
+                break
+            # Экранированный символ: если он пришёл не целиком, ждём следующего фрагмента
+            if i + 1 >= end:
+                break
+            escaped = buffer[i + 1]
+            if escaped == 'u':
+                if i + 6 > end:
+                    break
+                try:
+                    self._parts.append(chr(int(buffer[i + 2:i + 6], 16)))
+                except ValueError:
+                    self._done = True
+                    break
+                i += 6
+                continue
+            self._parts.append(_ESCAPES.get(escaped, escaped))
+            i += 2
+        self._pos = i
+
+
+def extract_partial_string(buffer: str, key: str) -> Optional[str]:
+    """
+    Достаёт значение строкового поля key из незавершённого JSON.
+    Возвращает уже полученную часть строки или None, если поле ещё не началось.
+    """
+    reader = PartialString(key)
+    return reader.value if reader.feed(buffer) else None
+
+
+class StreamingMessage:
+    """
+    Сообщение, которое отправляется сразу (заглушкой) и затем
+    постепенно редактируется по мере поступления текста.
+    """
+
+    def __init__(self, streamer: "TelegramStreamer", source: Message):
+        self.streamer = streamer
+        self.source = source
+        self.chat_id = source.chat.id
+        self.sent: Optional[Message] = None
+        self._shown = ""
+        self._pending: Optional[str] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    async def start(self, placeholder: str):
+        """
+        Отправляет заглушку, которую затем будем редактировать.
+        """
+        self.streamer.reserve_slot(self.chat_id)
+        self.sent = await self.streamer.send(self.chat_id, lambda: self.source.answer(placeholder, parse_mode=None))
+        self._shown = placeholder
+
+    def update(self, text: Union[str, Callable[[], str]]):
+        """
+        Запоминает новый текст; редактирование выполняется в фоне
+        не чаще, чем позволяет лимит чата. Промежуточные версии текста пропускаются.
+        text может быть функцией без аргументов: тогда текст собирается, только когда
+        подошло время правки, а не на каждый фрагмент ответа.
+        """
+        if self._closed or not text or self.sent is None:
+            return
+        self._pending = text
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+
+    async def _flush(self):
+        while self._pending is not None and not self._closed:
+            await self.streamer.wait_slot(self.chat_id)
+            pending, self._pending = self._pending, None
+            text = (pending() if callable(pending) else pending)[:MESSAGE_LIMIT]
+            if text and text != self._shown:
+                # Промежуточный текст может содержать незакрытые теги, поэтому без разметки
+                await self._edit(text, preview=True, parse_mode=None)
+
+    async def _edit(self, text: str, preview: bool = False, **kwargs) -> bool:
+        for _ in range(2):
+            try:
+                await self.streamer.send(self.chat_id, lambda: self.sent.edit_text(text, **kwargs), preview=preview)
+                self._shown = text
+                return True
+            except TelegramRetryAfter as e:
+                logging.warning(f"Лимит редактирования в чате {self.chat_id}, ждём {e.retry_after} с")
+                self.streamer.reserve_slot(self.chat_id, delay=e.retry_after)
+                await asyncio.sleep(e.retry_after)
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    self._shown = text
+                    return True
+                logging.warning(f"Не удалось отредактировать сообщение в чате {self.chat_id}: {e}")
+                return False
+            except Exception as e:
+                logging.error(f"Ошибка при редактировании сообщения в чате {self.chat_id}: {e}")
+                return False
+        return False
+
+    async def finish(self, text: str):
+        """
+        Заменяет содержимое сообщения финальным текстом.
+        Длинный ответ дробится: остаток отправляется отдельными сообщениями.
+        """
+        self._closed = True
+        self._pending = None
+        if self._flush_task and not self._flush_task.done():
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+
+        text = text or "…"
+        chunks = [text[i:i + MESSAGE_LIMIT] for i in range(0, len(text), MESSAGE_LIMIT)]
+        if self.sent is None:
+            for chunk in chunks:
+                await self._answer(chunk)
+            return
+
+        await self.streamer.wait_slot(self.chat_id)
+        if not await self._edit(chunks[0]):
+            # Финальный текст мог не пройти разметку — показываем как есть
+            if not await self._edit(chunks[0], parse_mode=None):
+                await self._answer(chunks[0], parse_mode=None)
+        for chunk in chunks[1:]:
+            await self._answer(chunk)
+
+    async def _answer(self, text: str, **kwargs):
+        await self.streamer.send(self.chat_id, lambda: self.source.answer(text, **kwargs))
+
+
+class TelegramStreamer:
+    """
+    Потоковый вывод ответов: отправляет заглушку и обновляет её через
+    edit_message_text с учётом лимитов Telegram на редактирование в каждом чате.
+    Все отправки и правки идут через общую очередь исходящих сообщений (send_queue), если она подключена:
+    заглушка, финальный текст и его продолжения — с приоритетом ответа, промежуточные правки — ниже.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("BOT_STREAMING", "0").lower() in ("1", "true", "yes")
+        self.placeholder = os.getenv("BOT_STREAMING_PLACEHOLDER", "⏳ Думаю...")
+        # Минимальный интервал между правками одного чата (в группах лимиты строже)
+        self.private_interval = float(os.getenv("BOT_STREAMING_INTERVAL", "1.0"))
+        self.group_interval = float(os.getenv("BOT_STREAMING_GROUP_INTERVAL", "3.0"))
+        self.max_chats = 10000
+        self._next_slot: "OrderedDict[int, float]" = OrderedDict()
+        self.send_queue: Any = None
+
+    def attach(self, send_queue: Any):
+        self.send_queue = send_queue
+
+    async def send(self, chat_id: int, factory: Callable[[], Awaitable[Any]], preview: bool = False) -> Any:
+        """
+        Выполняет отправку или правку через очередь исходящих сообщений (без неё — сразу).
+        Отмена ожидания снимает ещё не отправленную правку с очереди.
+        """
+        if self.send_queue is None:
+            return await factory()
+        priority = self.send_queue.PREVIEW if preview else self.send_queue.INTERACTIVE
+        return await self.send_queue.send(chat_id, factory, priority=priority)
+
+    # Извлечение поля из незавершённого JSON-ответа LLM для предпросмотра
+    extract_field = staticmethod(extract_partial_string)
+    partial_field = PartialString
+
+    def _interval(self, chat_id: int) -> float:
+        return self.private_interval if chat_id > 0 else self.group_interval
+
+    def reserve_slot(self, chat_id: int, delay: float = 0.0) -> float:
+        """
+        Резервирует ближайшее разрешённое время отправки в чат и возвращает,
+        сколько секунд до него осталось.
+        """
+        now = time.monotonic()
+        slot = max(now + delay, self._next_slot.get(chat_id, now))
+        self._next_slot[chat_id] = slot + self._interval(chat_id)
+        self._next_slot.move_to_end(chat_id)
+        while len(self._next_slot) > self.max_chats:
+            self._next_slot.popitem(last=False)
+        return slot - now
+
+    async def wait_slot(self, chat_id: int):
+        wait = self.reserve_slot(chat_id)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    async def start(self, message: Message, placeholder: Optional[str] = None) -> StreamingMessage:
+        """
+        Отправляет заглушку в ответ на message и возвращает объект для её обновления.
+        """
+        stream = StreamingMessage(self, message)
+        await stream.start(placeholder or self.placeholder)
+        return stream
+
+# Singleton экземпляр потокового вывода
+telegram_stream = TelegramStreamer()